@@ -0,0 +1,166 @@
+"""
+MongoDB Atlas asyncio API
+~~~~~~~~~~~~~~~~~~~~~~~~~
+
+An asyncio front end to the AtlasAPI for programs that run inside an
+event loop. Each call is handed to a bounded pool of worker threads that
+share the pooled, authenticated AtlasAPI session, so at most
+`max_concurrency` requests are in flight at once and the event loop is
+never blocked. The methods return the same AtlasProject and AtlasCluster
+objects as the synchronous API.
+
+Author:joe@joedrumgoole.com
+"""
+import asyncio
+import copy
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncGenerator, Dict
+
+from atlascli.atlasapi import AtlasAPI
+from atlascli.atlascluster import AtlasCluster
+from atlascli.atlasorganization import AtlasOrganization
+from atlascli.atlasproject import AtlasProject
+from atlascli.errors import AtlasInitialisationError
+from atlascli.singleflight import AsyncSingleFlight
+
+
+class AsyncAtlasAPI:
+
+    def __init__(self, api: AtlasAPI = None, max_concurrency: int = 10):
+        """
+        :param api: the synchronous AtlasAPI to run requests with. If None one is
+        created with a connection pool large enough for `max_concurrency` requests.
+        :param max_concurrency: the maximum number of requests in flight at once
+        """
+        if max_concurrency < 1:
+            raise AtlasInitialisationError("'max_concurrency' must be at least 1")
+
+        self._log = logging.getLogger(__name__)
+        self._max_concurrency = max_concurrency
+        self._owns_api = api is None  # close() only closes an api we created
+        if api:
+            self._api = api
+        else:
+            self._api = AtlasAPI(pool_maxsize=max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency,
+                                            thread_name_prefix="atlascli")
+        self._semaphore = None  # created on first use so it binds to the running loop
+        self._single_flight = AsyncSingleFlight()
+
+    @property
+    def api(self) -> AtlasAPI:
+        return self._api
+
+    def authenticate(self, public_key: str = None, private_key: str = None):
+        self._api.authenticate(public_key, private_key)
+
+    def is_authenticated(self):
+        return self._api.is_authenticated()
+
+    async def _run(self, func, *args, **kwargs):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._max_concurrency)
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    async def _coalesce(self, func, *args, **kwargs):
+        #
+        # Identical reads in flight at the same time share one call and one
+        # worker thread. The followers share a snapshot of the result, taken
+        # before the coroutine that made the call can modify it, and each
+        # gets its own copy of that. kwargs may hold dicts such as headers so
+        # they are keyed by their repr.
+        #
+        key = (func.__name__, args, repr(sorted(kwargs.items())))
+        result, shared = await self._single_flight.do(key, lambda: self._run(func, *args, **kwargs),
+                                                      share=copy.deepcopy)
+        if shared:
+            return copy.deepcopy(result)
+        return result
+
+    def coalesce_stats(self):
+        return self._single_flight.stats()
+
+    async def close(self):
+        #
+        # Waiting for the workers to finish blocks, so wait in another thread
+        #
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, functools.partial(self._executor.shutdown, wait=True))
+        if self._owns_api:
+            self._api.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def get(self, resource, **kwargs) -> Dict:
+        return await self._coalesce(self._api.get, resource, **kwargs)
+
+    async def atlas_get(self, resource=None, **kwargs) -> Dict:
+        return await self._coalesce(self._api.atlas_get, resource, **kwargs)
+
+    async def get_resource_by_item(self, resource) -> AsyncGenerator[Dict, None]:
+        self._log.debug(f"get_resource_by_item({resource})")
+
+        listing = self._api.record_listing(resource)
+        doc = await self.atlas_get(resource)
+        self._api.record_page(listing, doc)
+        for i in self._api.get_results(doc):
+            yield i
+        next_link = AtlasAPI.next_link(doc)
+
+        while next_link:
+            doc = await self.get(next_link)
+            self._api.record_page(listing, doc)
+            for i in self._api.get_results(doc):
+                yield i
+            next_link = AtlasAPI.next_link(doc)
+
+    async def get_this_organization(self) -> AtlasOrganization:
+        return await self._coalesce(self._api.get_this_organization)
+
+    #
+    # Project Methods
+    #
+
+    async def get_projects(self) -> AsyncGenerator[AtlasProject, None]:
+        async for project in self.get_resource_by_item("/groups"):
+            yield AtlasProject(project)
+
+    async def get_one_project(self, project_id: str) -> AtlasProject:
+        return await self._coalesce(self._api.get_one_project, project_id)
+
+    #
+    # Cluster Methods
+    #
+
+    async def get_clusters(self, project_id: str) -> AsyncGenerator[AtlasCluster, None]:
+        async for cluster in self.get_resource_by_item(f"/groups/{project_id}/clusters"):
+            yield AtlasCluster(project_id, cluster["name"], cluster)
+
+    async def get_one_cluster(self, project_id: str, cluster_name: str) -> AtlasCluster:
+        return await self._coalesce(self._api.get_one_cluster, project_id, cluster_name)
+
+    async def create_cluster(self, project_id: str, name: str, config: Dict) -> AtlasCluster:
+        return await self._run(self._api.create_cluster, project_id, name, config)
+
+    async def modify_cluster(self, c: AtlasCluster, modifications: Dict) -> AtlasCluster:
+        return await self._run(self._api.modify_cluster, c, modifications)
+
+    async def pause_cluster(self, c: AtlasCluster) -> AtlasCluster:
+        return await self._run(self._api.pause_cluster, c)
+
+    async def resume_cluster(self, c: AtlasCluster) -> AtlasCluster:
+        return await self._run(self._api.resume_cluster, c)
+
+    async def delete_cluster(self, c: AtlasCluster) -> Dict:
+        return await self._run(self._api.delete_cluster, c)
+
+    def __repr__(self):
+        return f"AsyncAtlasAPI(api={self._api!r}, max_concurrency={self._max_concurrency})"
@@ -11,24 +11,66 @@ more clusters.
 Author:joe@joedrumgoole.com
 """
 import logging
+import math
 import pprint
 import random
+import re
 import string
-from functools import lru_cache
-from typing import Generator, Dict
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError, wait, FIRST_COMPLETED
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Generator, Dict, Iterable, List, Union, Tuple
 
 import requests
-from requests.auth import HTTPDigestAuth
+from requests.adapters import HTTPAdapter
 
+from atlascli import serializer
+from atlascli.atlasauth import AtlasDigestAuth
 from atlascli.atlascluster import AtlasCluster
 from atlascli.atlaskey import AtlasKey
 from atlascli.atlasorganization import AtlasOrganization
 from atlascli.atlasproject import AtlasProject
+from atlascli.batch import Operation, OpResult
+from atlascli.deadline import Deadline
+from atlascli.instrumentation import RequestEvent, RequestHook, call_hooks, endpoint_template
+from atlascli.ratelimiter import RateLimiter
+from atlascli.retrypolicy import RetryPolicy, CircuitBreaker
+from atlascli.singleflight import SingleFlight
+from atlascli.jsonstream import iter_results
+from atlascli.transport import Transport, RequestsTransport
+from atlascli.ttlcache import TTLCache
 from atlascli.errors import AtlasError, AtlasInitialisationError, AtlasGetError, AtlasPostError, AtlasPatchError, \
-    AtlasDeleteError
+    AtlasDeleteError, AtlasDeadlineExceededError
+
+
+class Listing:
+    """
+    One listing of a paged resource, see AtlasAPI.record_listing()
+    """
+
+    __slots__ = ("endpoint", "round_trips")
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.round_trips = 0
+
+    def __repr__(self):
+        return f"Listing(endpoint={self.endpoint!r}, round_trips={self.round_trips})"
 
 
 class AtlasAPI:
+    #
+    # An AtlasAPI can be shared by any number of threads. The session's
+    # connection pool, the rate limiter, the retry policy, the circuit
+    # breaker, the cache and the digest auth state all have their own locks,
+    # the listing stats and hooks are guarded by self._lock, and everything
+    # else is fixed once the constructor returns. Every caller of a GET,
+    # coalesced or not, gets a document of its own. Resources returned by
+    # the get_one_cached_* methods are shared between callers so treat them
+    # as read only.
+    #
 
     SITE_URL = "https://cloud.mongodb.com"
     API_URL = f"/api/atlas/v1.0"
@@ -37,53 +79,462 @@ class AtlasAPI:
     ATLAS_HEADERS = {"Accept"       : "application/json",
                      "Content-Type" : "application/json"}
 
-    def __init__(self, page_size: int = 100):
+    ACCEPT_ENCODING = "gzip, deflate"
+    STREAM_CHUNK_SIZE = 64 * 1024  # bytes read at a time when streaming a page
+
+    MIN_PAGE_SIZE = 1
+    MAX_PAGE_SIZE = 500
+    AUTO_PAGE_SIZE = "auto"  # MAX_PAGE_SIZE for listings, MIN_PAGE_SIZE for existence checks
+
+    PROJECT_ID_RE = re.compile(r"/groups/([0-9a-fA-F]{24})")
+
+    DEFAULT_TIMEOUT = (3.05, 30)  # (connect, read) seconds
+
+    def __init__(self,
+                 page_size: Union[int, str] = 100,
+                 pool_connections: int = 4,
+                 pool_maxsize: int = 10,
+                 pool_block: bool = False,
+                 keep_alive: bool = True,
+                 page_workers: int = 1,
+                 rate_limiter: RateLimiter = None,
+                 max_throttle_retries: int = 5,
+                 retry_policy: RetryPolicy = None,
+                 circuit_breaker: CircuitBreaker = None,
+                 timeout: Union[float, Tuple[float, float]] = DEFAULT_TIMEOUT,
+                 cache_size: int = 500,
+                 cache_ttl: float = 60.0,
+                 coalesce: bool = True,
+                 stream_pages: bool = False,
+                 transport: Transport = None,
+                 site_url: str = None,
+                 hooks: List[RequestHook] = None):
+        """
+        :param page_size: number of items requested per page when listing resources,
+        or "auto" to request the largest page for listings and the smallest page
+        when we only need the first item
+        :param pool_connections: number of per-host connection pools to cache
+        :param pool_maxsize: maximum number of connections kept open to a single host
+        :param pool_block: if True block when a host pool is exhausted instead of
+        opening an extra, unpooled connection
+        :param keep_alive: if False every request asks the server to close the connection
+        :param page_workers: default number of pages get_resource_by_item fetches
+        concurrently. 1 follows the 'next' links one page at a time.
+        :param rate_limiter: limits the rate at which requests are sent. The default
+        limiter has no rate limit but still honours Retry-After.
+        :param max_throttle_retries: how many times a request that gets a
+        429 Too Many Requests response is resent before we give up
+        :param retry_policy: how server errors and dropped connections are retried
+        :param circuit_breaker: fails requests fast while Atlas is unavailable
+        :param timeout: socket timeout for every request in seconds, either a single
+        value or a (connect, read) tuple
+        :param cache_size: the maximum number of resources kept by the get_one_cached_* methods
+        :param cache_ttl: seconds a cached resource is served before it is fetched again
+        :param coalesce: if True, identical GETs made concurrently from several threads
+        share a single request
+        :param stream_pages: if True get_resource_by_item decodes each page as it
+        arrives and yields items before the whole page has been read
+        :param transport: sends the requests. The default is a pooled requests.Session
+        built from the pool_* and keep_alive arguments, which are ignored if a
+        transport is supplied.
+        :param site_url: the Atlas site to talk to. Defaults to SITE_URL.
+        :param hooks: RequestHooks called before and after every request
+        """
         self._auth = None
         self._log = logging.getLogger(__name__)
         self._page_size = page_size
 
-        if self._page_size < 1 or self._page_size > 500 :
-            raise AtlasInitialisationError("'page_size' must be between 1 and 500")
+        if self._page_size != AtlasAPI.AUTO_PAGE_SIZE:
+            if type(self._page_size) is not int or \
+                    self._page_size < AtlasAPI.MIN_PAGE_SIZE or self._page_size > AtlasAPI.MAX_PAGE_SIZE:
+                raise AtlasInitialisationError(f"'page_size' must be between {AtlasAPI.MIN_PAGE_SIZE} and "
+                                               f"{AtlasAPI.MAX_PAGE_SIZE} or '{AtlasAPI.AUTO_PAGE_SIZE}'")
+
+        self._lock = threading.Lock()  # guards the listing stats and the hooks
+        self._listing_stats: Dict[str, Dict[str, int]] = {}
+
+        if pool_connections < 1 or pool_maxsize < 1:
+            raise AtlasInitialisationError("'pool_connections' and 'pool_maxsize' must be at least 1")
+
+        if page_workers < 1:
+            raise AtlasInitialisationError("'page_workers' must be at least 1")
+
+        self._page_workers = page_workers
+        self._stream_pages = stream_pages
+        self._hooks = list(hooks) if hooks else []
+        if rate_limiter:
+            self._rate_limiter = rate_limiter
+        else:
+            self._rate_limiter = RateLimiter()
+        self._max_throttle_retries = max_throttle_retries
+        self._timeout = timeout
+        self._cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self._coalesce = coalesce
+        self._single_flight = SingleFlight()
+        if retry_policy:
+            self._retry_policy = retry_policy
+        else:
+            self._retry_policy = RetryPolicy()
+        if circuit_breaker:
+            self._circuit_breaker = circuit_breaker
+        else:
+            self._circuit_breaker = CircuitBreaker()
+        self._pool_connections = pool_connections
+        self._pool_maxsize = pool_maxsize
+        if site_url:
+            self.ATLAS_BASE_URL = f"{site_url.rstrip('/')}{AtlasAPI.API_URL}"
+        if transport:
+            self._session = None
+            self._transport = transport
+        else:
+            self._session = AtlasAPI.make_session(pool_connections=pool_connections,
+                                                  pool_maxsize=pool_maxsize,
+                                                  pool_block=pool_block,
+                                                  keep_alive=keep_alive)
+            self._transport = RequestsTransport(self._session)
+
+    @staticmethod
+    def make_session(pool_connections: int = 4,
+                     pool_maxsize: int = 10,
+                     pool_block: bool = False,
+                     keep_alive: bool = True) -> requests.Session:
+        """
+        Build a requests.Session whose connections are pooled and reused across
+        calls so that we only pay the TCP and TLS handshake once per connection.
+
+        `pool_connections` is the number of hosts we keep pools for and
+        `pool_maxsize` is the per host connection limit.
+        """
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_connections,
+                              pool_maxsize=pool_maxsize,
+                              pool_block=pool_block)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        # Large pages compress well so ask for gzip explicitly. The body is
+        # decompressed as it is read, including when it is streamed.
+        session.headers["Accept-Encoding"] = AtlasAPI.ACCEPT_ENCODING
+        if not keep_alive:
+            session.headers["Connection"] = "close"
+        return session
+
+    def close(self):
+        """
+        Close all pooled connections. The API object should not be used after
+        it has been closed.
+        """
+        self._transport.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
 
     def authenticate(self, public_key: str = None, private_key: str = None):
-        if public_key is None or private_key is None:
+        """
+        Authenticate with an Atlas programmatic key. `public_key` may also be
+        an AtlasKey. If no key is supplied it is read from the environment.
+        """
+        if isinstance(public_key, AtlasKey):
+            key = public_key
+        elif public_key is None or private_key is None:
             key = AtlasKey.get_from_env()
-        self._auth = HTTPDigestAuth(key.public_key, key.private_key)
+        else:
+            key = AtlasKey(public_key, private_key)
+        self._auth = AtlasDigestAuth(key.public_key, key.private_key)
 
     def is_authenticated(self):
         return self._auth is not None
 
+    @property
+    def page_size(self) -> Union[int, str]:
+        return self._page_size
+
+    def page_size_for(self, bulk: bool = True) -> int:
+        """
+        The number of items to request per page.
+
+        :param bulk: True when listing a whole resource, False when we only need
+        the first item (e.g. to check something exists)
+        """
+        if self._page_size == AtlasAPI.AUTO_PAGE_SIZE:
+            return AtlasAPI.MAX_PAGE_SIZE if bulk else AtlasAPI.MIN_PAGE_SIZE
+        return self._page_size
+
+    def record_listing(self, resource: str) -> "Listing":
+        """
+        Count a listing of `resource` in listing_stats(). Call it before the
+        first page is requested and record_page() with the Listing it returns
+        for each page that arrives.
+        """
+        endpoint = endpoint_template(resource)
+        with self._lock:
+            stats = self._listing_stats.setdefault(endpoint, {"listings": 0, "round_trips": 0, "items": 0,
+                                                              "max_round_trips": 0})
+            stats["listings"] += 1
+        return Listing(endpoint)
+
+    def record_page(self, listing: "Listing", doc: Dict, items: int = None):
+        if items is None:
+            items = len(doc.get("results", []))
+        with self._lock:
+            stats = self._listing_stats[listing.endpoint]
+            listing.round_trips += 1
+            stats["round_trips"] += 1
+            stats["items"] += items
+            stats["max_round_trips"] = max(stats["max_round_trips"], listing.round_trips)
+
+    def listing_stats(self) -> Dict[str, Dict[str, Union[int, float]]]:
+        """
+        Per endpoint listing statistics, e.g. for /groups/{id}/clusters: how
+        many times the endpoint was listed, how many round trips (pages) and
+        items that took in total, and the most and mean round trips a single
+        listing took.
+        """
+        with self._lock:
+            return {k: dict(v, mean_round_trips=v["round_trips"] / v["listings"])
+                    for k, v in self._listing_stats.items()}
+
+    @property
+    def challenges_saved(self) -> int:
+        """
+        The number of digest challenge round trips avoided by signing
+        requests with a cached server nonce.
+        """
+        auth = self._auth
+        if auth is None:
+            return 0
+        return auth.challenges_saved
+
     def set_logging_level(self, level):
         self._log.setLevel(level)
 
+    @property
+    def rate_limiter(self) -> RateLimiter:
+        return self._rate_limiter
+
+    @property
+    def transport(self) -> Transport:
+        return self._transport
+
+    @property
+    def timeout(self) -> Union[float, Tuple[float, float]]:
+        return self._timeout
+
+    @property
+    def cache(self) -> TTLCache:
+        return self._cache
+
+    def cache_stats(self) -> Dict:
+        return self._cache.stats()
+
+    def coalesce_stats(self) -> Dict:
+        """
+        :return: the number of GETs sent, the number that were served by
+        sharing a concurrent identical GET, and the number in flight now
+        """
+        return self._single_flight.stats()
+
+    def _invalidate(self, url: str, descendants: bool = True):
+        #
+        # A mutation succeeded so drop any cached copy of the resource it
+        # changed and, for a PATCH or DELETE, of anything beneath it.
+        #
+        resource = url.split("?", 1)[0]
+        if resource.startswith(self.ATLAS_BASE_URL):
+            resource = resource[len(self.ATLAS_BASE_URL):]
+        if descendants:
+            self._cache.invalidate_prefix(resource)
+        else:
+            self._cache.invalidate(resource)
+
+    @property
+    def retry_policy(self) -> RetryPolicy:
+        return self._retry_policy
+
+    @property
+    def circuit_breaker(self) -> CircuitBreaker:
+        return self._circuit_breaker
+
+    @staticmethod
+    def project_id_from_url(url: str):
+        """
+        :return: the project ID in an Atlas resource URL or None if there isn't one
+        """
+        m = AtlasAPI.PROJECT_ID_RE.search(url)
+        if m:
+            return m.group(1)
+        return None
+
+    @staticmethod
+    def retry_after_seconds(r: requests.Response, default: float) -> float:
+        """
+        Parse the Retry-After header of a response, which is either a number of
+        seconds or an HTTP date.
+        """
+        value = r.headers.get("Retry-After")
+        if value is None:
+            return default
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            when = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return default
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=timezone.utc)
+        return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+    #
+    # The hook list is replaced rather than modified so a request that is
+    # calling the hooks on another thread keeps the list it started with.
+    #
+
+    def add_hook(self, hook: RequestHook):
+        with self._lock:
+            self._hooks = self._hooks + [hook]
+
+    def remove_hook(self, hook: RequestHook):
+        with self._lock:
+            hooks = list(self._hooks)
+            hooks.remove(hook)
+            self._hooks = hooks
+
+    def _send(self, method: str, url: str, idempotent: bool = False, deadline: Deadline = None,
+              **kwargs) -> requests.Response:
+        #
+        # Time the request, including any retries, and tell the hooks about it
+        #
+        hooks = self._hooks
+        event = RequestEvent(method, url, endpoint_template(url, self.ATLAS_BASE_URL))
+        call_hooks(hooks, "before_request", event)
+        start = time.perf_counter()
+        try:
+            r = self._send_attempts(method, url, idempotent, deadline, event, **kwargs)
+            event.status = r.status_code
+            if "Content-Length" in r.headers:
+                event.bytes = int(r.headers["Content-Length"])
+            elif not kwargs.get("stream"):
+                event.bytes = len(r.content)
+            return r
+        except Exception as e:
+            event.error = e
+            raise
+        finally:
+            event.latency = time.perf_counter() - start
+            call_hooks(hooks, "after_request", event)
+
+    def _send_attempts(self, method: str, url: str, idempotent: bool, deadline: Deadline, event: RequestEvent,
+                       **kwargs) -> requests.Response:
+        #
+        # Every request goes through here. We wait for the rate limiter, then
+        # fail fast if the circuit breaker is open. A request that takes the
+        # circuit breaker's trial slot and ends without a success or failure
+        # to record gives the slot back. If the server still
+        # says 429 we back off for Retry-After seconds (or an exponential
+        # default) and try again. Server errors and dropped connections are
+        # retried according to the retry policy if the request is safe to repeat.
+        # If there is a deadline every wait and timeout is clipped to it.
+        #
+        project_id = AtlasAPI.project_id_from_url(url)
+        auth = self._auth  # authenticate() may swap the key on another thread
+        throttled = 0
+        attempt = 0
+        self._retry_policy.record_request()
+        while True:
+            timeout = self._timeout
+            if deadline:
+                deadline.check(f"{method} {url}")
+            self._rate_limiter.acquire(project_id, timeout=deadline.remaining() if deadline else None)
+            if deadline:
+                timeout = deadline.clip(timeout)
+            self._circuit_breaker.before_request()
+            try:
+                r = self._transport.request(method, url, auth=auth, timeout=timeout, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                self._circuit_breaker.record_failure()
+                if not self._retry_policy.should_retry(method, attempt, idempotent=idempotent):
+                    raise
+                delay = self._retry_policy.delay(attempt)
+                if deadline and not deadline.allows(delay):
+                    raise AtlasDeadlineExceededError(f"{method} {url} failed with '{e}' and there is no time "
+                                                     f"left before the deadline to retry") from e
+                attempt += 1
+                event.retries += 1
+                self._log.debug(f"{method} {url} failed with '{e}', retrying in {delay:.2f}s "
+                                f"({attempt}/{self._retry_policy.max_retries})")
+                self._retry_policy.sleep(delay)
+                continue
+            except BaseException:
+                self._circuit_breaker.release_trial()
+                raise
+
+            if r.status_code == 429:
+                self._circuit_breaker.record_success()
+                if throttled >= self._max_throttle_retries:
+                    return r
+                delay = AtlasAPI.retry_after_seconds(r, default=2 ** throttled)
+                if deadline and not deadline.allows(delay):
+                    return r
+                throttled += 1
+                event.throttled += 1
+                self._log.debug(f"{method} {url} throttled, retrying in {delay:.2f}s ({throttled}/"
+                                f"{self._max_throttle_retries})")
+                r.close()  # release the connection, the body may not have been read
+                self._rate_limiter.retry_after(delay, project_id)
+                continue
+
+            if r.status_code >= 500:
+                self._circuit_breaker.record_failure()
+                if self._retry_policy.should_retry(method, attempt, status=r.status_code, idempotent=idempotent):
+                    delay = self._retry_policy.delay(attempt)
+                    if deadline and not deadline.allows(delay):
+                        return r
+                    attempt += 1
+                    event.retries += 1
+                    self._log.debug(f"{method} {url} returned {r.status_code}, retrying in {delay:.2f}s "
+                                    f"({attempt}/{self._retry_policy.max_retries})")
+                    r.close()
+                    self._retry_policy.sleep(delay)
+                    continue
+                return r
+
+            self._circuit_breaker.record_success()
+            return r
+
     @staticmethod
     def random_name(prefix="ATLASCLI"):
         return prefix +''.join(random.choices(string.ascii_uppercase + string.digits, k=5))
 
-    def post(self, resource, data):
+    def post(self, resource, data, deadline: Deadline = None):
         self._log.debug(f"post({resource}, {data})")
 
         if not self.is_authenticated():
             raise AtlasError("You have not authenticated your Atlas API key")
 
+        #print(f"requests.post(url={resource}, data={data}, headers={self.ATLAS_HEADERS}, auth={self._auth})")
+        #print("printing data")
+        #pprint.pprint(data)
+        r = self._send("POST", resource,
+                       deadline=deadline,
+                       json=data,
+                       #json=json.dumps(data),
+                       headers=self.ATLAS_HEADERS)
         try:
-            #print(f"requests.post(url={resource}, data={data}, headers={self.ATLAS_HEADERS}, auth={self._auth})")
-            #print("printing data")
-            #pprint.pprint(data)
-            r = requests.post(url=resource,
-                              json=data,
-                              #json=json.dumps(data),
-                              headers=self.ATLAS_HEADERS,
-                              auth=self._auth)
             #print(r.url)
             r.raise_for_status()
 
         except requests.exceptions.HTTPError as e:
-            error = pprint.pformat(r.json())
+            error = pprint.pformat(serializer.loads(r.content))
             raise AtlasPostError(error)
-        return r.json()
+        self._invalidate(resource, descendants=False)
+        return serializer.loads(r.content)
 
-    def get(self, resource, headers=None, page_num=1, items_per_page=100):
+    def get(self, resource, headers=None, page_num=1, items_per_page=None, include_count=False,
+            deadline: Deadline = None):
         self._log.debug(f"get({resource})")
         # Need to use the raw URL when getting linked data
 
@@ -91,84 +542,254 @@ class AtlasAPI:
         if not self.is_authenticated():
             raise AtlasError("You have not authenticated your Atlas API key")
 
-        args =""
+        resource = self._page_url(resource, page_num, items_per_page, include_count)
+
+        def fetch():
+            r = self._send("GET", resource, headers=headers, deadline=deadline)
+            try:
+                r.raise_for_status()
+            except requests.exceptions.HTTPError as e:
+                error = pprint.pformat(serializer.loads(r.content))
+                raise AtlasGetError(error)
+            return r.content
+
+        if not self._coalesce:
+            return serializer.loads(fetch())
+
+        #
+        # Identical GETs in flight at the same time share one request. They
+        # share the body as it came off the wire and each caller decodes its
+        # own document, as the model classes modify the documents they wrap.
+        #
+        key = (resource, tuple(sorted(headers.items())) if headers else None)
+        try:
+            content, _ = self._single_flight.do(key, fetch, timeout=deadline.remaining() if deadline else None)
+        except TimeoutError:
+            raise AtlasDeadlineExceededError(f"GET {resource} did not complete within the "
+                                             f"{deadline.seconds}s deadline")
+        return serializer.loads(content)
+
+    def _page_url(self, resource, page_num=1, items_per_page=None, include_count=False) -> str:
+        #
+        # Add the paging parameters to a URL unless they are already there,
+        # as they are in the 'next' links Atlas returns.
+        #
+        if items_per_page is None:
+            items_per_page = self.page_size_for()
+
+        args = []
         if "itemsPerPage" not in resource:
-            args=args+f"?itemsPerPage={items_per_page}"
-
+            args.append(f"itemsPerPage={items_per_page}")
         if "pageNum" not in resource:
-            if len(args) > 0 :
-                args = args + "&"
-            args=args+f"pageNum={page_num}"
+            args.append(f"pageNum={page_num}")
 
-        resource = resource + args
+        if include_count and "includeCount" not in resource:
+            args.append("includeCount=true")
 
-        try:
-            r = requests.get(resource,
-                             headers=headers,
-                             auth=self._auth)
-            r.raise_for_status()
-        except requests.exceptions.HTTPError as e:
-            error = pprint.pformat(r.json())
-            raise AtlasGetError(error)
-        return r.json()
+        if args:
+            separator = "&" if "?" in resource else "?"
+            resource = resource + separator + "&".join(args)
+        return resource
+
+    def get_streamed(self, resource, envelope: Dict = None, page_num=1, items_per_page=None,
+                     include_count=False, deadline: Deadline = None):
+        """
+        Like get() but yield the items of the page's `results` array as they are
+        decoded instead of returning the whole page. Streamed GETs are never
+        coalesced.
 
-    def atlas_post(self, resource, data):
-        return self.post(resource=f"{self.ATLAS_BASE_URL}{resource}", data=data)
+        :param envelope: if supplied, receives the other top level fields of the
+        page, e.g. `links` and `totalCount`. It is only complete once every item
+        has been consumed.
+        """
+        self._log.debug(f"get_streamed({resource})")
+
+        if not self.is_authenticated():
+            raise AtlasError("You have not authenticated your Atlas API key")
 
-    def atlas_get(self,resource=None, page_num=1, items_per_page=100):
+        if envelope is None:
+            envelope = {}
+        resource = self._page_url(resource, page_num, items_per_page, include_count)
+        r = self._send("GET", resource, deadline=deadline, stream=True)
+        try:
+            try:
+                r.raise_for_status()
+            except requests.exceptions.HTTPError as e:
+                error = pprint.pformat(serializer.loads(r.content))
+                raise AtlasGetError(error)
+            try:
+                yield from iter_results(r.iter_content(chunk_size=self.STREAM_CHUNK_SIZE), envelope)
+            except KeyError:
+                raise AtlasGetError(f"No 'results' field in '{envelope}'")
+        finally:
+            r.close()
+
+    def atlas_post(self, resource, data, deadline: Deadline = None):
+        return self.post(resource=f"{self.ATLAS_BASE_URL}{resource}", data=data, deadline=deadline)
+
+    def atlas_get(self,resource=None, page_num=1, items_per_page=None, include_count=False,
+                  deadline: Deadline = None):
         if resource is None:
             resource = ""
-        return self.get(f"{self.ATLAS_BASE_URL}{resource}", items_per_page=items_per_page, page_num=page_num)
+        return self.get(f"{self.ATLAS_BASE_URL}{resource}", items_per_page=items_per_page, page_num=page_num,
+                        include_count=include_count, deadline=deadline)
 
-    def atlas_patch(self, resource, data):
+    def atlas_patch(self, resource, data, idempotent=False, deadline: Deadline = None):
         self._log.debug(f"atlas_patch({resource}, {data})")
-        return self.patch(f"{self.ATLAS_BASE_URL}{resource}", data)
+        return self.patch(f"{self.ATLAS_BASE_URL}{resource}", data, idempotent=idempotent, deadline=deadline)
 
-    def atlas_delete(self, resource):
+    def atlas_delete(self, resource, deadline: Deadline = None):
         self._log.debug(f"atlas_delete({resource})")
-        return self.delete(f"{self.ATLAS_BASE_URL}{resource}")
+        return self.delete(f"{self.ATLAS_BASE_URL}{resource}", deadline=deadline)
 
-    def patch(self, resource, patch_doc):
+    def patch(self, resource, patch_doc, idempotent=False, deadline: Deadline = None):
+        """
+        :param idempotent: True if the patch can safely be resent if it fails,
+        e.g. setting `paused`. Idempotent patches are retried on server errors.
+        """
         if not self.is_authenticated():
             raise AtlasError("You have not authenticated your Atlas API key")
+        p = self._send("PATCH", f"{resource}",
+                       idempotent=idempotent,
+                       deadline=deadline,
+                       json=patch_doc,
+                       headers=self.ATLAS_HEADERS)
         try:
-            p = requests.patch(f"{resource}",
-                               json=patch_doc,
-                               headers=self.ATLAS_HEADERS,
-                               auth=self._auth
-                               )
             p.raise_for_status()
         except requests.exceptions.HTTPError as e:
-            error = pprint.pformat(p.json())
+            error = pprint.pformat(serializer.loads(p.content))
             raise AtlasPatchError(error)
-        return p.json()
+        self._invalidate(resource)
+        return serializer.loads(p.content)
 
-    def delete(self, resource):
+    def delete(self, resource, deadline: Deadline = None):
         self._log.debug(f"delete({resource})")
         if not self.is_authenticated():
             raise AtlasError("You have not authenticated your Atlas API key")
+        d = self._send("DELETE", f"{resource}", headers=self.ATLAS_HEADERS, deadline=deadline)
         try:
-            d = requests.delete(f"{resource}", headers=self.ATLAS_HEADERS, auth=self._auth)
             d.raise_for_status()
         except requests.exceptions.HTTPError as e:
-            raise AtlasDeleteError(e, d.json()["detail"])
+            raise AtlasDeleteError(e, serializer.loads(d.content)["detail"])
 
-        return d.json()
+        self._invalidate(resource)
+        return serializer.loads(d.content)
 
-    def get_resource_by_item(self, resource):
+    def get_resource_by_item(self, resource, page_workers: int = None, items_per_page: int = None,
+                             deadline: Deadline = None, stream: bool = None):
+        """
+        Yield each item of a paged resource in page order.
+
+        :param resource: the resource to list e.g. "/groups"
+        :param page_workers: the number of pages to fetch concurrently. Defaults to
+        the `page_workers` the API was created with.
+        :param items_per_page: the page size to request. Defaults to `page_size_for()`.
+        :param deadline: the whole listing must complete before this deadline
+        :param stream: decode each page incrementally so that memory use is bounded
+        by the size of one item rather than one page. Defaults to the `stream_pages`
+        the API was created with. Streaming is sequential so page_workers is ignored.
+        """
+        if page_workers is None:
+            page_workers = self._page_workers
 
-        self._log.debug(f"get_resource_by_item({resource})")
+        if stream is None:
+            stream = self._stream_pages
 
-        doc = self.atlas_get(resource)
-        yield from self._get_results(doc)
-        links = doc['links']
-        last_link = links[-1]
+        if items_per_page is None:
+            items_per_page = self.page_size_for()
+
+        listing = self.record_listing(resource)
+
+        if stream:
+            yield from self._get_resource_by_item_streamed(resource, listing, items_per_page, deadline)
+            return
+
+        if page_workers > 1:
+            yield from self._get_resource_by_item_parallel(resource, listing, page_workers, items_per_page,
+                                                           deadline)
+            return
+
+        self._log.debug(f"get_resource_by_item({resource})")
 
-        while "rel" in last_link and "next" == last_link["rel"]:
-            doc = self.get(last_link["href"])
-            yield from self._get_results(doc)
-            links = doc['links']
-            last_link = links[-1]
+        doc = self.atlas_get(resource, items_per_page=items_per_page, deadline=deadline)
+        self.record_page(listing, doc)
+        yield from self.get_results(doc)
+        next_link = self.next_link(doc)
+
+        while next_link:
+            doc = self.get(next_link, deadline=deadline)
+            self.record_page(listing, doc)
+            yield from self.get_results(doc)
+            next_link = self.next_link(doc)
+
+    def _get_resource_by_item_streamed(self, resource, listing: "Listing", items_per_page: int,
+                                       deadline: Deadline = None):
+        self._log.debug(f"_get_resource_by_item_streamed({resource})")
+        link = self._page_url(f"{self.ATLAS_BASE_URL}{resource}", items_per_page=items_per_page)
+        while link:
+            envelope = {}
+            items = 0
+            for item in self.get_streamed(link, envelope, deadline=deadline):
+                items += 1
+                yield item
+            self.record_page(listing, envelope, items=items)
+            link = self.next_link(envelope)
+
+    def _get_resource_by_item_parallel(self, resource, listing: "Listing", page_workers: int, items_per_page: int,
+                                       deadline: Deadline = None):
+        #
+        # Read totalCount from the first page and then fetch pages 2..n
+        # concurrently. At most 2 * page_workers pages are requested ahead of
+        # the page being consumed, and pages are yielded in page order. If the
+        # deadline passes while we wait for a page the outstanding pages are
+        # cancelled.
+        #
+        self._log.debug(f"_get_resource_by_item_parallel({resource}, page_workers={page_workers})")
+
+        doc = self.atlas_get(resource, items_per_page=items_per_page, include_count=True, deadline=deadline)
+        self.record_page(listing, doc)
+        yield from self.get_results(doc)
+
+        if "totalCount" not in doc:
+            # No count so fall back to following the links
+            next_link = self.next_link(doc)
+            while next_link:
+                doc = self.get(next_link, deadline=deadline)
+                self.record_page(listing, doc)
+                yield from self.get_results(doc)
+                next_link = self.next_link(doc)
+            return
+
+        page_count = math.ceil(doc["totalCount"] / items_per_page)
+        if page_count <= 1:
+            return
+
+        def fetch(n):
+            return self.atlas_get(resource, page_num=n, items_per_page=items_per_page, deadline=deadline)
+
+        page_nums = iter(range(2, page_count + 1))
+        pending = []
+        executor = ThreadPoolExecutor(max_workers=page_workers, thread_name_prefix="atlascli-page")
+        try:
+            for page_num in page_nums:
+                pending.append(executor.submit(fetch, page_num))
+                if len(pending) >= 2 * page_workers:
+                    break
+            while pending:
+                try:
+                    doc = pending.pop(0).result(timeout=deadline.remaining() if deadline else None)
+                except FutureTimeoutError:
+                    raise AtlasDeadlineExceededError(f"listing {resource} did not complete within the "
+                                                     f"{deadline.seconds}s deadline")
+                page_num = next(page_nums, None)
+                if page_num is not None:
+                    pending.append(executor.submit(fetch, page_num))
+                self.record_page(listing, doc)
+                yield from self.get_results(doc)
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
 
     def get_resource_by_page(self, resource):
         """
@@ -178,7 +799,6 @@ class AtlasAPI:
         """
         self._log.debug(f"get_resource_by_page({resource})")
         results = None
-        next_link = None
 
         doc = self.atlas_get(resource)
 
@@ -187,18 +807,26 @@ class AtlasAPI:
         else:
             raise AtlasGetError(f"No 'results' field in '{doc}'")
 
+        return results, self.next_link(doc)
+
+    @staticmethod
+    def next_link(doc):
+        """
+        :return: the URL of the next page of a paged result or None on the last page
+        """
         links = doc['links']
+        if len(links) == 0:
+            return None
         last_link = links[-1]
-        # print(links)
-        # print(last_link)
         if "rel" in last_link and "next" == last_link["rel"]:
-            next_link = last_link["href"]
+            return last_link["href"]
         else:
-            next_link = None
-
-        return results, next_link
+            return None
 
-    def _get_results(self, doc):
+    def get_results(self, doc):
+        """
+        Yield the items of one page of a paged resource.
+        """
         if 'results' in doc:
             for i in doc["results"]:
                 yield i
@@ -223,7 +851,7 @@ class AtlasAPI:
         "https://cloud.mongodb.com/api/atlas/v1.0/orgs"
         :return: list of AtlasOrganisations as a generator
         """
-        for org in self.get_resource_by_item("/orgs"):
+        for org in self.get_resource_by_item("/orgs", items_per_page=self.page_size_for(bulk=False)):
             return AtlasOrganization(org)
 
     def get_this_organization(self) -> AtlasOrganization:
@@ -233,12 +861,11 @@ class AtlasAPI:
 
         :return: AtlasOrganization
         """
-        for org in self.get_resource_by_item("/orgs"):
+        for org in self.get_resource_by_item("/orgs", items_per_page=self.page_size_for(bulk=False)):
             return AtlasOrganization(org)
 
-    @lru_cache(maxsize=500)
-    def get_one_cached_organization(self, org_id:str)->Dict:
-        return AtlasOrganization(self.get(f"/orgs/{org_id}"))
+    def get_one_cached_organization(self, org_id:str) -> AtlasOrganization:
+        return self._cache.get_or_load(f"/orgs/{org_id}", lambda: self.get_one_organization(org_id))
 
     def get_one_organization(self, org_id:str)->dict:
         return AtlasOrganization(self.atlas_get(f"/orgs/{org_id}"))
@@ -247,7 +874,7 @@ class AtlasAPI:
         return AtlasOrganization(self.atlas_post(f"/orgs", { "name" : name}))
 
     def delete_organization(self, name):
-        return self.delete(f"/orgs/{name}")
+        return self.atlas_delete(f"/orgs/{name}")
 
     #
     # Project Methods
@@ -274,8 +901,8 @@ class AtlasAPI:
         """
         return self.atlas_delete(f"/groups/{project_id}")
 
-    def get_projects(self) -> Generator[dict, None, None]:
-        for project in self.get_resource_by_item(f"/groups"):
+    def get_projects(self, deadline: Deadline = None) -> Generator[dict, None, None]:
+        for project in self.get_resource_by_item(f"/groups", deadline=deadline):
             yield AtlasProject(project)
 
     def get_one_project(self, project_id)-> AtlasProject:
@@ -288,9 +915,8 @@ class AtlasAPI:
         """
         return AtlasProject(self.atlas_get(f"/groups/{project_id}"))
 
-    @lru_cache(maxsize=500)
     def get_one_cached_project(self, project_id) -> AtlasProject:
-        return AtlasProject(self.atlas_get(f"/groups/{project_id}"))
+        return self._cache.get_or_load(f"/groups/{project_id}", lambda: self.get_one_project(project_id))
 
     def get_project_ids(self) -> Generator[str, None, None]:
         for project in self.get_resource_by_item(f"/groups"):
@@ -312,16 +938,28 @@ class AtlasAPI:
                             name=name,
                             cluster_config=created_cluster)
 
-    def get_clusters(self, project_id) -> Generator[str, None, None]:
-        for cluster in self.get_resource_by_item(f"/groups/{project_id}/clusters"):
+    def get_clusters(self, project_id, deadline: Deadline = None) -> Generator[str, None, None]:
+        for cluster in self.get_resource_by_item(f"/groups/{project_id}/clusters", deadline=deadline):
             yield AtlasCluster(project_id, cluster["name"], cluster)
 
-    def delete_cluster(self, c: AtlasCluster) -> Dict:
+    def get_cluster_summaries(self, deadline: Deadline = None) -> Generator[Dict, None, None]:
+        """
+        GET /api/atlas/v1.0/clusters
+        https://docs.atlas.mongodb.com/reference/api/all-clusters/
+
+        Yield one document per project the key can see, holding the project's
+        `groupId`, `groupName` and a `clusters` array with a summary (name,
+        availability, node count, versions etc.) of each of its clusters.
+        The summaries are not full cluster documents.
+        """
+        yield from self.get_resource_by_item("/clusters", deadline=deadline)
+
+    def delete_cluster(self, c: AtlasCluster, deadline: Deadline = None) -> Dict:
         """
         DELETE /api/atlas/v1.0/groups/{GROUP-ID}/clusters/{CLUSTER-NAME}
         https://docs.atlas.mongodb.com/reference/api/clusters-delete-one/
         """
-        return self.atlas_delete(f"/groups/{c.project_id}/clusters/{c.name}")
+        return self.atlas_delete(f"/groups/{c.project_id}/clusters/{c.name}", deadline=deadline)
 
     def modify_cluster(self, c: AtlasCluster, modifications: Dict) -> AtlasCluster:
         """
@@ -335,26 +973,108 @@ class AtlasAPI:
         result = self.atlas_patch(f"/groups/{c.project_id}/clusters/{c.name}", data=modifications)
         return AtlasCluster(c.project_id, c.name, result)
 
-    @lru_cache(maxsize=500)
-    def get_one_cached_cluster(self, project_id: str, cluster_name: str):
-        return self.get_one_cluster(project_id, cluster_name)
+    def get_one_cached_cluster(self, project_id: str, cluster_name: str) -> AtlasCluster:
+        return self._cache.get_or_load(self.cluster_url(project_id, cluster_name),
+                                       lambda: self.get_one_cluster(project_id, cluster_name))
 
-    def get_one_cluster(self, project_id: str, cluster_name: str) -> AtlasCluster:
-        result = self.atlas_get(self.cluster_url(project_id, cluster_name))
+    def get_one_cluster(self, project_id: str, cluster_name: str, deadline: Deadline = None) -> AtlasCluster:
+        result = self.atlas_get(self.cluster_url(project_id, cluster_name), deadline=deadline)
         return AtlasCluster(project_id, result["name"], result)
 
-    def pause_cluster(self, c: AtlasCluster) -> AtlasCluster:
+    def pause_cluster(self, c: AtlasCluster, deadline: Deadline = None) -> AtlasCluster:
         pause_doc = {"paused": True}
-        result = self.atlas_patch(f"/groups/{c.project_id}/clusters/{c.name}", pause_doc)
+        result = self.atlas_patch(f"/groups/{c.project_id}/clusters/{c.name}", pause_doc, idempotent=True,
+                                  deadline=deadline)
         return AtlasCluster(c.project_id, c.name, result)
 
-    def resume_cluster(self, c: AtlasCluster) -> AtlasCluster:
+    def resume_cluster(self, c: AtlasCluster, deadline: Deadline = None) -> AtlasCluster:
         pause_doc = {"paused": False}
-        result = self.atlas_patch(f"/groups/{c.project_id}/clusters/{c.name}", pause_doc)
+        result = self.atlas_patch(f"/groups/{c.project_id}/clusters/{c.name}", pause_doc, idempotent=True,
+                                  deadline=deadline)
         return AtlasCluster(c.project_id, c.name, result)
 
+    def execute_many(self, ops: Iterable[Union[Operation, Callable[[], Any]]], max_workers: int = None,
+                     deadline: Deadline = None) -> List[OpResult]:
+        """
+        Run a batch of operations concurrently. Every request still goes through
+        the rate limiter, retry policy and circuit breaker. A failed operation does
+        not stop the others, its exception is returned in its OpResult.
+
+        :param ops: Operations, or callables taking no arguments e.g.
+        `lambda: api.get_one_cluster(project_id, name)`
+        :param max_workers: the most operations run at once. Defaults to `pool_maxsize`
+        so that each running operation has a pooled connection.
+        :param deadline: Operations not complete by the deadline fail with
+        AtlasDeadlineExceededError. Callables are not given the deadline, one
+        still running when it passes is left to finish in the background.
+        :return: an OpResult for each operation, in the same order as `ops`
+        """
+        results = list(self.execute_many_iter(ops, max_workers=max_workers, deadline=deadline))
+        results.sort(key=lambda r: r.index)
+        return results
+
+    def execute_many_iter(self, ops: Iterable[Union[Operation, Callable[[], Any]]], max_workers: int = None,
+                          deadline: Deadline = None) -> Generator[OpResult, None, None]:
+        """
+        Like execute_many() but yield each OpResult as soon as its operation
+        completes, so results arrive out of order. OpResult.index is the
+        operation's position in `ops`. Operations are taken from `ops` as
+        workers become free so `ops` may be a generator. If the caller stops
+        early the operations that have not started are cancelled.
+        """
+        if max_workers is None:
+            max_workers = self._pool_maxsize
+        if max_workers < 1:
+            raise ValueError("'max_workers' must be at least 1")
+
+        def run(index, op):
+            start = time.perf_counter()
+            try:
+                if isinstance(op, Operation):
+                    result = op.run(self, deadline=deadline)
+                else:
+                    result = op()
+                return OpResult(index, op, result=result, latency=time.perf_counter() - start)
+            except Exception as e:
+                return OpResult(index, op, error=e, latency=time.perf_counter() - start)
+
+        ops = enumerate(ops)
+        pending = {}  # future: (index, operation)
+        executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="atlascli-batch")
+        try:
+            # Keep the workers busy without reading every operation up front
+            for index, op in ops:
+                pending[executor.submit(run, index, op)] = (index, op)
+                if len(pending) >= 2 * max_workers:
+                    break
+            while pending:
+                done, _ = wait(pending, timeout=deadline.remaining() if deadline else None,
+                               return_when=FIRST_COMPLETED)
+                if not done:
+                    break
+                for future in done:
+                    del pending[future]
+                    op = next(ops, None)
+                    if op is not None:
+                        pending[executor.submit(run, *op)] = op
+                for future in done:
+                    yield future.result()
+            #
+            # The deadline has passed. The operations still running, and
+            # those that have not started, fail without being waited for.
+            #
+            for index, op in [*pending.values(), *ops]:
+                error = AtlasDeadlineExceededError(f"operation {index} did not complete within the "
+                                                   f"{deadline.seconds}s deadline")
+                yield OpResult(index, op, error=error)
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
+
     def __repr__(self):
-        return f"AtlasAPI(page_size={self._page_size})"
+        return f"AtlasAPI(page_size={self._page_size}, pool_connections={self._pool_connections}, " \
+               f"pool_maxsize={self._pool_maxsize}, page_workers={self._page_workers})"
 
 
 
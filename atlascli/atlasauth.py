@@ -0,0 +1,116 @@
+"""
+Atlas API authentication
+~~~~~~~~~~~~~~~~~~~~~~~~
+
+Atlas programmatic keys use HTTP Digest authentication. A naive digest
+client sends every request twice: once to collect the server challenge
+(a 401 carrying the realm and nonce) and once more with the computed
+digest. AtlasDigestAuth keeps the last challenge and signs each new request
+up front with an incrementing nonce count, so the challenge round trip is
+only paid when the server has no nonce for us yet or rejects a stale one.
+
+requests' HTTPDigestAuth keeps the challenge and nonce count per thread,
+so every thread that shares an AtlasDigestAuth pays its own challenge round
+trip. Here the challenge and nonce count are shared by all threads and
+updated under a lock, so each request gets a unique nonce count whichever
+thread sends it and one challenge serves them all.
+
+Author:joe@joedrumgoole.com
+"""
+import threading
+
+from requests.auth import HTTPDigestAuth
+
+
+class AtlasDigestAuth(HTTPDigestAuth):
+
+    def __init__(self, public_key: str, private_key: str):
+        super().__init__(public_key, private_key)
+        self._lock = threading.Lock()
+        self._chal = {}             # the last challenge any thread received
+        self._last_nonce = ""
+        self._nonce_count = 0
+        self._challenges = 0        # 401 challenge round trips we actually made
+        self._preemptive = 0        # requests signed before they were sent
+        self._challenges_saved = 0  # preemptively signed requests the server accepted
+
+    @property
+    def challenges(self) -> int:
+        return self._challenges
+
+    @property
+    def preemptive(self) -> int:
+        return self._preemptive
+
+    @property
+    def challenges_saved(self) -> int:
+        return self._challenges_saved
+
+    def reset(self):
+        """
+        Forget the cached challenge so the next request is challenged again.
+        """
+        with self._lock:
+            self._chal = {}
+            self._last_nonce = ""
+            self._nonce_count = 0
+        self._thread_local.__dict__.clear()
+
+    def build_digest_header(self, method, url):
+        #
+        # super() reads the challenge and nonce count from the thread local
+        # state and bumps the count. Load the shared state into it first and
+        # store the result back, all under the lock, so no two requests are
+        # signed with the same nonce count. A challenge this thread has just
+        # received (see handle_401) replaces the shared one.
+        #
+        local = self._thread_local
+        with self._lock:
+            if getattr(local, "new_challenge", False):
+                local.new_challenge = False
+                self._chal = local.chal
+            elif self._chal:
+                local.chal = self._chal
+            else:
+                return None  # reset() by another thread, let the server challenge us
+            local.last_nonce = self._last_nonce
+            local.nonce_count = self._nonce_count
+            header = super().build_digest_header(method, url)
+            self._last_nonce = local.last_nonce
+            self._nonce_count = local.nonce_count
+        return header
+
+    def __call__(self, r):
+        self.init_per_thread_state()
+        with self._lock:
+            has_nonce = bool(self._last_nonce)
+        # super() only signs the request up front if it has a nonce
+        self._thread_local.last_nonce = "shared" if has_nonce else ""
+        r = super().__call__(r)
+        self._thread_local.signed = has_nonce and "Authorization" in r.headers
+        if self._thread_local.signed:
+            with self._lock:
+                self._preemptive += 1
+        return r
+
+    def handle_401(self, r, **kwargs):
+        if r.status_code == 401:
+            if "digest" in r.headers.get("www-authenticate", "").lower() and \
+                    self._thread_local.num_401_calls < 2:
+                # super() parses the challenge then calls build_digest_header()
+                self._thread_local.new_challenge = True
+                with self._lock:
+                    self._challenges += 1
+        elif getattr(self._thread_local, "signed", False):
+            with self._lock:
+                self._challenges_saved += 1
+        return super().handle_401(r, **kwargs)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"challenges": self._challenges,
+                    "preemptive": self._preemptive,
+                    "challenges_saved": self._challenges_saved}
+
+    def __repr__(self):
+        return f"AtlasDigestAuth(challenges={self._challenges}, challenges_saved={self._challenges_saved})"
@@ -12,6 +12,7 @@ from atlascli.clusterid import ClusterID
 
 class AtlasCluster(AtlasResource):
 
+    __slots__ = ("_project_id",)
 
     @classmethod
     def default_single_region_cluster(cls):
@@ -86,22 +87,22 @@ class AtlasCluster(AtlasResource):
         return f"{pprint.pformat(self.resource)}"
 
     def status(self) -> str:
-        if self.resource["stateName"] == "REPAIRING":
+        if self.state == "REPAIRING":
             if self.is_paused():
                 return f"{Fore.LIGHTRED_EX}pausing...{Fore.RESET}"
             else:
                 return f"{Fore.LIGHTRED_EX}resuming...{Fore.RESET}"
-        elif self.resource["stateName"] == "CREATING":
+        elif self.state == "CREATING":
             return f"{Fore.LIGHTRED_EX}creating...{Fore.RESET}"
-        elif self.resource["stateName"] == "DELETING":
+        elif self.state == "DELETING":
             return f"{Fore.LIGHTRED_EX}deleting...{Fore.RESET}"
-        elif self.resource["stateName"] == "IDLE":
+        elif self.state == "IDLE":
             if self.is_paused():
                 return f"{Fore.LIGHTBLUE_EX}paused{Fore.RESET}"
             else:
                 return f"{Fore.RED}running{Fore.RESET}"
         else:
-            return f"{self.resource['stateName']}"
+            return f"{self.state}"
 
     @property
     def state(self):
@@ -113,6 +114,9 @@ class AtlasCluster(AtlasResource):
     def instance_size(self):
         return self.resource["providerSettings"]["instanceSizeName"]
 
+    def region(self):
+        return self.resource["providerSettings"].get("regionName")
+
     def pretty_instance_size(self):
         return f"{Fore.LIGHTWHITE_EX}{self.instance_size()}{Fore.RESET}"
 
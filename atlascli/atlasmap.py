@@ -1,5 +1,8 @@
 import itertools
-from typing import Dict, List, Generator
+import logging
+import sqlite3
+import threading
+from typing import Callable, Dict, List, Generator, Optional, Tuple
 
 from atlascli.atlasapi import AtlasAPI
 from atlascli.atlascluster import AtlasCluster
@@ -7,6 +10,12 @@ from atlascli.atlaskey import AtlasKey
 from atlascli.atlasorganization import AtlasOrganization
 from atlascli.atlasproject import AtlasProject
 from atlascli.clusterid import ClusterID
+from atlascli.compactcluster import ClusterDocuments, CompactCluster
+from atlascli.deadline import Deadline
+from atlascli.errors import AtlasGetError
+from atlascli.inventorycache import InventoryCache
+from atlascli.inventoryindex import InventoryIndex
+from atlascli import serializer
 
 
 class AtlasMap:
@@ -17,19 +26,111 @@ class AtlasMap:
     # Each project can have multiple clusters.
     # Each cluster represents a group of machines/nodes. Clusters may be sharded.
     #
+    # The projects and clusters live in an InventoryIndex, which keeps hash
+    # indexes by ID and by name so every lookup is O(1).
+    #
+    # The clusters are loaded lazily. Asking for the clusters of one project
+    # fetches just that project, once. Only a lookup that needs the whole
+    # organization, e.g. by cluster name alone, populates the map, and it
+    # fetches every project again because those fetched on their own may
+    # have changed since.
+    #
+    # In compact mode the map holds CompactClusters, which keep only the
+    # fields the CLI lists, and at most max_documents full cluster documents.
+    # The others are read back from the cache, or Atlas, when they are used.
+    # A cluster is compacted once its document has been saved to the cache.
+    # Populating saves and compacts each project as its clusters arrive, so
+    # it holds no more than the documents of the projects being fetched.
+    #
+    # A map can be shared between threads. Populating it builds a new index
+    # on the side and swaps it in under self._lock, so a reader sees either
+    # the old inventory or the new one, never a mix. self._populate_lock
+    # lets one thread populate at a time, concurrent calls that find the map
+    # empty populate it once. self._lock is only held to swap an index in,
+    # so a cluster can be refreshed while the map is being populated.
+    #
 
-    def __init__(self, org: AtlasOrganization = None, api: AtlasAPI = None, populate: bool = False):
+    DEFAULT_WORKERS = 1  # projects whose clusters are fetched concurrently
+    DEFAULT_MAX_AGE = 300.0  # seconds an inventory in the cache is used for
+    DEFAULT_MAX_STALE = 86400.0  # seconds the CLI answers from a stale inventory while it is refreshed
+    CHANGE_FIELDS = ("stateName", "paused", "mongoDBVersion", "diskSizeGB", "providerSettings")
+    # the cluster fields refresh_changed() compares to decide a cluster has changed
+    DEFAULT_MAX_DOCUMENTS = 1000  # full cluster documents a compact map keeps resident
+
+    def __init__(self, org: AtlasOrganization = None, api: AtlasAPI = None, populate: bool = False,
+                 workers: int = DEFAULT_WORKERS,
+                 progress: Callable[[AtlasProject, int, int], None] = None,
+                 org_wide: bool = False,
+                 cache: InventoryCache = None,
+                 max_age: float = DEFAULT_MAX_AGE,
+                 max_stale: float = None,
+                 compact: bool = False,
+                 max_documents: int = DEFAULT_MAX_DOCUMENTS,
+                 on_stale: Callable[["AtlasMap"], None] = None):
+        """
+        :param workers: how many projects populate_cluster_map() fetches the
+        clusters of at the same time. 1 fetches them one project at a time.
+        :param progress: called as progress(project, done, total) each time
+        populate_cluster_map() has fetched the clusters of a project
+        :param org_wide: if True populate_cluster_map() first asks Atlas for
+        the org wide cluster summary and skips the projects it shows have no
+        clusters. If the key may not read the summary every project is fetched.
+        :param cache: where the inventory of `org` is saved each time it is
+        populated and read from instead of Atlas while it is younger than
+        `max_age` seconds
+        :param max_stale: if set, a cached inventory older than `max_age` but
+        younger than `max_stale` seconds is used straight away and revalidated
+        in a background thread (stale-while-revalidate). The fresh inventory
+        replaces it when it has been fetched, see wait_for_revalidation().
+        :param on_stale: with `max_stale`, called as on_stale(map) when a stale
+        inventory is used, instead of revalidating it in a background thread,
+        e.g. to refresh the cache in another process. See revalidate().
+        :param compact: if True keep CompactClusters rather than full cluster
+        documents, for organizations too large to hold in memory
+        :param max_documents: with `compact`, how many full cluster documents
+        stay resident, least recently used first out
+        """
+        if workers < 1:
+            raise ValueError("'workers' must be at least 1")
 
         self._org = org
         self._populate = populate
-        self._clusters : List[AtlasCluster] = None
-        self._project_map : Dict[str, Dict] = None  # map of all project ids to projects
-
-        self._project_cluster_map: Dict[str, Dict[str, AtlasCluster]] = {}
-        # map from project id to a dict of clusters
-        # because cluster names are not unique across and organization
-        # we have to key each collection of clusters under a specific project id.
-
+        self._workers = workers
+        self._progress = progress
+        self._org_wide = org_wide
+        self._cache = cache if org else None  # the cache is keyed by org ID
+        self._max_age = max_age
+        self._max_stale = max_stale
+        self._on_stale = on_stale
+        self._lock = threading.RLock()
+        self._populate_lock = threading.RLock()
+        self._log = logging.getLogger(__name__)
+        self._index: Optional[InventoryIndex] = None
+        # Cluster names are not unique across an organization so the index
+        # keys each collection of clusters under a specific project id.
+
+        self._partial_cluster_map: Dict[str, Dict[str, AtlasCluster]] = {}
+        # clusters of the projects fetched by a populate_cluster_map() call
+        # that failed part way through. The next call reuses them rather than
+        # fetching them again, then drops them.
+
+        self._project_memo: Dict[str, Dict[str, AtlasCluster]] = {}
+        # clusters of the projects fetched one at a time by a lookup within a
+        # project, until the map is populated
+
+        self._updated: Dict[Tuple[str, str], Optional[AtlasCluster]] = {}
+        # clusters refreshed, created (or, as None, found to be gone) since
+        # populate_cluster_map() or refresh_changed() started. They are newer
+        # than the ones it fetched so they win when it swaps its index in.
+        # They are kept whole, like the clusters it fetched, until it has
+        # saved them.
+
+        self._cache_checked = False  # _load_cache() has read the cache, it is not read again
+        self._stale = False  # the index is a stale cached inventory that has not been revalidated
+        self._revalidation: Optional[threading.Thread] = None
+        self._revalidation_error: Optional[Exception] = None
+
+        self._documents = ClusterDocuments(max_documents, self._load_document) if compact else None
 
         if api:
             self._api = api
@@ -46,27 +147,162 @@ class AtlasMap:
     def api(self):
         return self._api
 
+    def _project_index(self, deadline: Deadline = None) -> InventoryIndex:
+        #
+        # An index holding at least the projects. `deadline` covers fetching
+        # them if they are not in the map or the cache.
+        #
+        index = self._index
+        if index is None:
+            with self._populate_lock:
+                if self._index is None and not self._load_cache():
+                    self._index = InventoryIndex({x.id: x for x in self._api.get_projects(deadline=deadline)})
+                index = self._index
+        return index
+
+    def _cluster_index(self, deadline: Deadline = None) -> InventoryIndex:
+        #
+        # An index holding the projects and their clusters
+        #
+        index = self._index
+        if index is None or not index.has_clusters:
+            with self._populate_lock:
+                if (self._index is None or not self._index.has_clusters) and not self._load_cache():
+                    self.populate_cluster_map(deadline=deadline)
+                index = self._index
+        return index
+
+    def _project_clusters(self, project_id: str, deadline: Deadline = None) -> Dict[str, AtlasCluster]:
+        #
+        # The clusters of one project by name. Unless the whole organization
+        # is in the map or the cache they are fetched on their own and kept
+        # until it is. Concurrent fetches of the same project are coalesced
+        # by the API.
+        #
+        index = self._index
+        if index is None or not index.has_clusters:
+            with self._populate_lock:
+                loaded = (self._index is not None and self._index.has_clusters) or self._load_cache()
+            if not loaded:
+                clusters = self._project_memo.get(project_id)
+                if clusters is None:
+                    clusters = self._partial_cluster_map.get(project_id)
+                if clusters is None:
+                    if not self.is_project_id(project_id, deadline=deadline):
+                        return {}
+                    clusters = self._compact({c.name: c for c in self._api.get_clusters(project_id,
+                                                                                         deadline=deadline)})
+                    with self._lock:
+                        clusters = self._project_memo.setdefault(project_id, clusters)
+                return clusters
+            index = self._index
+        return index.project_clusters.get(project_id, {})
+
+    def _load_cache(self) -> bool:
+        #
+        # Install the cached inventory if there is one younger than max_age,
+        # or one younger than max_stale which is then revalidated in the
+        # background. A cache we cannot read is the same as an empty one.
+        # The cache is only read once, by the first lookup that needs it,
+        # with self._populate_lock held.
+        #
+        if self._cache is None or self._cache_checked:
+            return False
+        self._cache_checked = True
+        try:
+            cached = self._cache.get_inventory(self.org_id)
+        except (sqlite3.Error, OSError) as e:
+            self._log.warning(f"Cannot read the inventory cache {self._cache.filename}: {e}")
+            return False
+        if cached is None:
+            return False
+        index, age = cached
+        if self._documents is not None:
+            index = InventoryIndex(index.projects, {project_id: self._compact(clusters)
+                                                    for project_id, clusters in index.project_clusters.items()})
+        if age <= self._max_age:
+            self._index = index
+            return True
+        if self._max_stale is not None and age <= self._max_stale:
+            self._log.info(f"Using an inventory cached {age:.0f}s ago while it is revalidated")
+            self._index = index
+            self._stale = True
+            if self._on_stale:
+                self._on_stale(self)
+            else:
+                self._revalidate()
+            return True
+        return False
+
+    def _revalidate(self):
+        #
+        # Populate the map in a daemon thread. It waits for self._populate_lock,
+        # which our caller holds, so it starts once the stale index is in.
+        #
+        def revalidate():
+            try:
+                self._fetch_inventory(None, self._workers, None)
+            except Exception as e:  # a thread has nowhere to raise to, keep the stale inventory
+                self._log.warning(f"Cannot revalidate the cached inventory: {e}")
+                self._revalidation_error = e
+
+        self._revalidation_error = None
+        self._revalidation = threading.Thread(target=revalidate, name="atlasmap-revalidate", daemon=True)
+        self._revalidation.start()
+
+    def wait_for_revalidation(self, timeout: float = None) -> bool:
+        """
+        Wait for the background revalidation of a stale cached inventory.
+
+        :return: True if the map was revalidated, False if there was no
+        revalidation, it failed or it is still running after `timeout` seconds
+        """
+        thread = self._revalidation
+        if thread is None:
+            return False
+        thread.join(timeout)
+        return not thread.is_alive() and self._revalidation_error is None
+
+    def is_stale(self) -> bool:
+        return self._stale
+
+    def revalidate(self, timeout: float = None, deadline: Deadline = None) -> bool:
+        """
+        Bring a stale cached inventory up to date. Wait up to `timeout`
+        seconds for the background revalidation or, if the map was given
+        `on_stale`, fetch the changes from Atlas now, within `deadline`.
+
+        :return: True if the map was revalidated, False if it was not stale,
+        the revalidation failed or it is still running after `timeout` seconds
+        """
+        if self._revalidation is not None:
+            return self.wait_for_revalidation(timeout)
+        if not self._stale:
+            return False
+        self.refresh_changed(deadline=deadline)
+        return True
+
+    def _save_cache(self, cluster: AtlasCluster = None):
+        #
+        # Save the whole inventory, or just `cluster` if only it has changed
+        #
+        if self._cache is None:
+            return
+        try:
+            if cluster is None:
+                self._cache.put_inventory(self.org_id, self._index)
+            else:
+                self._cache.put_cluster(cluster)
+        except (sqlite3.Error, OSError) as e:
+            self._log.warning(f"Cannot write the inventory cache {self._cache.filename}: {e}")
+
     @property
     def projects(self):
-        if self._project_map is None:
-            self._project_map = {x.id: x for x in self._api.get_projects()}
-        return list(self._project_map.values())
+        return list(self._project_index().projects.values())
 
     @property
     def clusters(self):
-        if self._clusters is None:
-            clusters = []
-            if len(self._project_cluster_map) == 0:
-                self.populate_cluster_map()
-
-            # return list(itertools.chain.from_iterable(self._project_cluster_map.values()))
-            for project_id, cluster_dict in self._project_cluster_map.items():
-                for cluster_name, cluster in cluster_dict.items():
-                    clusters.append(cluster)
-
-            self._clusters = clusters
-
-        return self._clusters
+        return self._cluster_index().clusters
 
     @property
     def organization(self):
@@ -81,30 +317,144 @@ class AtlasMap:
 
     @property
     def project_cluster_map(self):
-        if len(self._project_cluster_map) == 0:
-            self.populate_cluster_map()
-        return self._project_cluster_map
-
-    def populate_cluster_map(self):
-        new_projects_map = {}
-        new_project_cluster_map = {}
-        for project in self._api.get_projects():
-            new_projects_map[project.id] = project
-            new_project_cluster_map[project.id] = {}
-            for cluster in self._api.get_clusters(project.id):
-                new_project_cluster_map[project.id][cluster.name] = cluster
-            assert len(new_projects_map) == len(new_project_cluster_map)
-
-        self._project_cluster_map = new_project_cluster_map
-        self._project_map = new_projects_map
-
-    def is_project_id(self, project_id: str) -> bool:
-        return project_id in [ x.id for x in self.projects]
+        return self._cluster_index().project_clusters
+
+    def is_populated(self) -> bool:
+        index = self._index
+        return index is not None and index.has_clusters
+
+    def populate_cluster_map(self, deadline: Deadline = None, workers: int = None,
+                             progress: Callable[[AtlasProject, int, int], None] = None):
+        """
+        Fetch every project and the clusters of each project, `workers`
+        projects at a time, and save them in the cache. `workers` and
+        `progress` default to the values the map was constructed with.
+        """
+        #
+        # If fetching the clusters of a project fails (after the API has
+        # exhausted its retries) the clusters of the projects we have
+        # already fetched are kept in self._partial_cluster_map so that
+        # calling populate_cluster_map() again only fetches the rest.
+        #
+        # Only one thread populates at a time, readers carry on using the
+        # previous maps until the new ones are swapped in.
+        #
+        if workers is None:
+            workers = self._workers
+        if progress is None:
+            progress = self._progress
+        self._fetch_inventory(deadline, workers, progress)
+
+    def _fetch_inventory(self, deadline: Optional[Deadline], workers: int,
+                  progress: Optional[Callable[[AtlasProject, int, int], None]]):
+
+        def fetch(project_id):
+            return {cluster.name: cluster for cluster in self._api.get_clusters(project_id, deadline=deadline)}
+
+        with self._populate_lock:
+            with self._lock:
+                self._updated = {}
+            projects = list(self._api.get_projects(deadline=deadline))
+            todo = [p for p in projects if p.id not in self._partial_cluster_map]
+            done = len(projects) - len(todo)
+
+            cluster_counts = self._cluster_counts(deadline) if self._org_wide and todo else None
+            if cluster_counts is not None:
+                for project in todo:
+                    if cluster_counts.get(project.id) == 0:
+                        self._partial_cluster_map[project.id] = self._save_project(project.id, {})
+                        done += 1
+                        if progress:
+                            progress(project, done, len(projects))
+                todo = [p for p in todo if p.id not in self._partial_cluster_map]
+
+            #
+            # Keep going when a project fails so that every project we can
+            # fetch is kept for the next call, then raise the first error.
+            #
+            error = None
+            results = self._api.execute_many_iter((lambda p=p: fetch(p.id) for p in todo),
+                                                  max_workers=workers, deadline=deadline)
+            for result in results:
+                project = todo[result.index]
+                if not result.ok:
+                    error = error or result.error
+                    continue
+                self._partial_cluster_map[project.id] = self._save_project(project.id, result.result)
+                done += 1
+                if progress:
+                    progress(project, done, len(projects))
+            if error:
+                raise error
+
+            index = InventoryIndex({p.id: p for p in projects},
+                                   {p.id: self._partial_cluster_map[p.id] for p in projects})
+            with self._lock:
+                self._partial_cluster_map = {}
+                self._project_memo = {}
+                updated = {k: c for k, c in self._updated.items() if k[0] in index.projects}
+                for (project_id, name), cluster in updated.items():
+                    index = index.with_cluster(cluster) if cluster else index.without_cluster(project_id, name)
+                self._index = index
+                self._stale = False
+            if self._documents is None:
+                self._save_cache()
+            else:
+                self._save_projects(index, updated)
+                self._compact_saved(index)
+
+    def _save_project(self, project_id: str, clusters: Dict[str, AtlasCluster]) -> Dict[str, AtlasCluster]:
+        #
+        # In compact mode save the clusters of one project as soon as they
+        # have been fetched and compact them, rather than holding every
+        # document of the organization until the whole inventory is saved.
+        #
+        if self._documents is None:
+            return clusters
+        if self._cache is not None:
+            try:
+                self._cache.put_clusters(project_id, clusters)
+            except (sqlite3.Error, OSError) as e:
+                self._log.warning(f"Cannot write the inventory cache {self._cache.filename}: {e}")
+        return self._compact(clusters)
+
+    def _save_projects(self, index: InventoryIndex, updated: Dict[Tuple[str, str], Optional[AtlasCluster]]):
+        #
+        # Finish saving a compact populate: its clusters were saved by
+        # _save_project(), what is left are the projects and the clusters
+        # refreshed, created or found to be gone while it ran.
+        #
+        if self._cache is None:
+            return
+        try:
+            self._cache.put_projects(self.org_id, index.projects.values())
+            changed = [c for c in updated.values() if c is not None]
+            removed = [k for k, c in updated.items() if c is None]
+            if changed or removed:
+                self._cache.update_inventory(self.org_id, changed, removed)
+        except (sqlite3.Error, OSError) as e:
+            self._log.warning(f"Cannot write the inventory cache {self._cache.filename}: {e}")
+
+    def _cluster_counts(self, deadline: Deadline = None) -> Optional[Dict[str, int]]:
+        #
+        # The org wide summary (GET /clusters) lists every project with a
+        # summary of each of its clusters. The summaries are too thin to
+        # build AtlasClusters from but they tell us which projects are empty
+        # in a few paged requests. Projects missing from the summary are
+        # treated as unknown and fetched.
+        #
+        try:
+            return {s["groupId"]: len(s.get("clusters", [])) for s in self._api.get_cluster_summaries(deadline)}
+        except AtlasGetError as e:
+            self._log.info(f"The org wide cluster summary is unavailable, fetching every project: {e}")
+            self._org_wide = False
+            return None
+
+    def is_project_id(self, project_id: str, deadline: Deadline = None) -> bool:
+        return project_id in self._project_index(deadline).projects
 
     def is_cluster_name(self, cluster_name: str) -> bool:
-        # print(f"is_cluster_name({cluster_name})")
-        # pprint.pprint([x.name for x in self._clusters])
-        return any([x.name == cluster_name for x in self.clusters])
+        return cluster_name in self._cluster_index().clusters_by_name
 
     def is_unique_cluster(self, cluster_name: str) -> bool:
         l = self.get_cluster(cluster_name)
@@ -117,49 +467,35 @@ class AtlasMap:
         for i in self.clusters:
             yield i.name
 
-    def get_cluster_project_ids(self, cluster_name: str):
-        project_ids = []
-        for project_id, cluster_map in self.project_cluster_map.items():
-            for name, cluster in cluster_map.items():
-                if name == cluster_name:
-                    project_ids.append(project_id)
-        return project_ids
+    def get_cluster_project_ids(self, cluster_name: str, deadline: Deadline = None):
+        return self._cluster_index(deadline).cluster_project_ids(cluster_name)
 
     def get_project_ids(self) -> List[str]:
-        return [ x.id for x in self.projects]
+        return list(self._project_index().projects)
 
     def get_one_project(self, project_id:str) -> AtlasProject:
-        return self._project_map[project_id]
+        return self._project_index().projects[project_id]
 
     def get_projects(self) -> Dict[str, AtlasProject]:
-        return self._project_map
+        return self._project_index().projects
 
     def get_project_id(self, project_name: str):
-        for i in self.projects:
-            #print(i.name)
-            if i.name == project_name:
-                return i.id
-        return None
+        return self._project_index().project_id(project_name)
 
     def get_project_name(self, project_id: str):
-        for i in self.projects:
-            if i.id == project_id:
-                return i.name
-        return None
+        return self._project_index().project_name(project_id)
 
-    def get_cluster(self, cluster_name: str, project_id: object = None) -> List[AtlasCluster]:
+    def get_cluster(self, cluster_name: str, project_id: object = None,
+                    deadline: Deadline = None) -> List[AtlasCluster]:
         #
         # Cluster names are not unique so we might get more than one cluster
-        # when we request a cluster.
+        # when we request a cluster. `deadline` covers fetching what the
+        # lookup needs if it is not in the map or the cache.
         #
-        clusters = []
-        for i in self.clusters:
-            if i.name == cluster_name:
-                if project_id is None:
-                    clusters.append(i)
-                elif project_id == i.project_id:
-                    clusters.append(i)
-        return clusters
+        if project_id is None:
+            return list(self._cluster_index(deadline).clusters_named(cluster_name))
+        cluster = self._project_clusters(project_id, deadline).get(cluster_name)
+        return [cluster] if cluster else []
 
     def get_one_cluster(self, project_id:str, cluster_name:str) -> AtlasCluster:
         clist = self.get_cluster(cluster_name, project_id)
@@ -170,15 +506,207 @@ class AtlasMap:
             return clist[0]
 
     def get_clusters(self, project_id: str = None) -> Generator[AtlasCluster, None, None]:
-        for c in self.clusters:
-            if project_id is None:
-                yield c
-            elif project_id == c.project_id:
-                yield c
-
-    def create_cluster(self, project_id:str, cluster_name: str) -> AtlasCluster:
-        c = self._api.create_cluster(project_id, cluster_name)
-        self._project_cluster_map[project_id]
+        if project_id is None:
+            yield from self._cluster_index().clusters
+        else:
+            yield from self._project_clusters(project_id).values()
+
+    def create_cluster(self, project_id:str, cluster_name: str, config: Dict = None) -> AtlasCluster:
+        if config is None:
+            config = AtlasCluster.default_single_region_cluster()
+        c = self._api.create_cluster(project_id, cluster_name, config)
+        self.update_cluster(c)
+        return c
+
+    def refresh_cluster(self, project_id: str, cluster_name: str, deadline: Deadline = None) -> AtlasCluster:
+        """
+        Fetch the current state of a cluster from Atlas and replace the copy
+        in the map and the cache with it. Use it before acting on a cluster
+        whose name was resolved from a cached inventory.
+        """
+        c = self._api.get_one_cluster(project_id, cluster_name, deadline=deadline)
+        self.update_cluster(c)
+        return c
+
+    def update_cluster(self, cluster: AtlasCluster):
+        """
+        Replace the copy of `cluster` in the map and the cache, e.g. with the
+        cluster Atlas returned when it was paused.
+        """
+        compact = self._compact({cluster.name: cluster})[cluster.name]
+        with self._lock:
+            self._updated[(cluster.project_id, cluster.name)] = cluster
+            populated = self.is_populated()
+            if populated:
+                self._index = self._index.with_cluster(compact)
+            else:
+                project_id = cluster.project_id
+                if project_id in self._project_memo:
+                    self._project_memo[project_id] = {**self._project_memo[project_id], cluster.name: compact}
+                if project_id in self._partial_cluster_map:
+                    # kept whole until populate_cluster_map() has saved it
+                    self._partial_cluster_map[project_id] = {**self._partial_cluster_map[project_id],
+                                                             cluster.name: cluster}
+        if populated:
+            self._save_cache(cluster)
+
+    def refresh_project(self, project_id: str, deadline: Deadline = None) -> Dict[str, AtlasCluster]:
+        """
+        Fetch the clusters of one project and replace those in the map and
+        the cache with them.
+
+        :return: the clusters of `project_id` by name
+        """
+        fetched = {c.name: c for c in self._api.get_clusters(project_id, deadline=deadline)}
+        clusters = self._compact(fetched)
+        with self._lock:
+            index = self._index
+            populated = self.is_populated() and project_id in index.projects
+            if populated:
+                for name in index.project_clusters.get(project_id, {}):
+                    self._updated[(project_id, name)] = None
+                self._updated.update(((project_id, name), c) for name, c in fetched.items())
+                self._index = index.with_clusters(project_id, clusters)
+            elif not self.is_populated():
+                self._project_memo[project_id] = clusters
+                if project_id in self._partial_cluster_map:
+                    self._partial_cluster_map[project_id] = fetched
+        if populated and self._cache is not None:
+            try:
+                self._cache.put_clusters(project_id, fetched)
+            except (sqlite3.Error, OSError) as e:
+                self._log.warning(f"Cannot write the inventory cache {self._cache.filename}: {e}")
+        return clusters
+
+    def refresh_changed(self, deadline: Deadline = None, workers: int = None) -> List[AtlasCluster]:
+        """
+        Fetch the clusters of every project and update the map and the cache
+        with just the ones that are new or whose CHANGE_FIELDS differ from
+        those in the map. Clusters that no longer exist are dropped. If the
+        map has not been populated it is populated instead.
+
+        :return: the clusters that are new or have changed
+        """
+        #
+        # Unchanged clusters keep their AtlasCluster objects and a project
+        # whose clusters have not changed keeps its entries in the indexes,
+        # so a refresh that finds nothing new allocates next to nothing.
+        # Projects the org wide summary shows are empty are not fetched.
+        #
+        if workers is None:
+            workers = self._workers
+
+        with self._populate_lock:
+            if not self.is_populated():
+                self._fetch_inventory(deadline, workers, None)
+                return []
+            with self._lock:
+                self._updated = {}
+            projects = list(self._api.get_projects(deadline=deadline))
+            cluster_counts = self._cluster_counts(deadline) if self._org_wide else None
+            todo = [p for p in projects if cluster_counts is None or cluster_counts.get(p.id) != 0]
+            results = self._api.execute_many(
+                [lambda p=p: {c.name: c for c in self._api.get_clusters(p.id, deadline=deadline)} for p in todo],
+                max_workers=workers, deadline=deadline)
+            fetched = {p.id: {} for p in projects}
+            for result in results:
+                fetched[todo[result.index].id] = result.unwrap()
+
+            with self._lock:
+                index = self._index
+                changed = []
+                removed = []
+                for project_id, clusters in fetched.items():
+                    old = index.project_clusters.get(project_id, {})
+                    current = {}
+                    for name, cluster in clusters.items():
+                        if name in old and not self._has_changed(old[name], cluster):
+                            current[name] = old[name]
+                        else:
+                            current[name] = cluster  # compacted once it has been saved
+                            changed.append(cluster)
+                    removed.extend((project_id, name) for name in old if name not in clusters)
+                    if current.keys() != old.keys() or any(current[k] is not old[k] for k in current):
+                        fetched[project_id] = current
+                    else:
+                        fetched[project_id] = old
+
+                if list(index.projects) == [p.id for p in projects]:
+                    for project_id, clusters in fetched.items():
+                        if clusters is not index.project_clusters[project_id]:
+                            index = index.with_clusters(project_id, clusters)
+                    projects_changed = False
+                else:
+                    index = InventoryIndex({p.id: p for p in projects}, fetched)
+                    projects_changed = True
+                for (project_id, name), cluster in self._updated.items():
+                    if project_id in index.projects:
+                        index = index.with_cluster(cluster) if cluster else index.without_cluster(project_id, name)
+                self._index = index
+                self._stale = False
+
+            if self._cache is not None:
+                try:
+                    if projects_changed:
+                        self._cache.put_inventory(self.org_id, index)
+                    else:
+                        self._cache.update_inventory(self.org_id, changed, removed)
+                except (sqlite3.Error, OSError) as e:
+                    self._log.warning(f"Cannot write the inventory cache {self._cache.filename}: {e}")
+            self._compact_saved(index)
+            return changed
+
+    @staticmethod
+    def _has_changed(old: AtlasCluster, new: AtlasCluster) -> bool:
+        if isinstance(old, CompactCluster):
+            return old.fingerprint != AtlasMap._fingerprint(new)
+        return any(old.resource.get(f) != new.resource.get(f) for f in AtlasMap.CHANGE_FIELDS)
+
+    @staticmethod
+    def _fingerprint(cluster: AtlasCluster) -> int:
+        #
+        # A CompactCluster drops most of CHANGE_FIELDS, it keeps this hash of them instead
+        #
+        return hash(serializer.dumps([cluster.resource.get(f) for f in AtlasMap.CHANGE_FIELDS], sort_keys=True))
+
+    def _compact(self, clusters: Dict[str, AtlasCluster]) -> Dict[str, AtlasCluster]:
+        #
+        # `clusters` as CompactClusters if the map is compact
+        #
+        if self._documents is None:
+            return clusters
+        return {name: c if isinstance(c, CompactCluster) else
+                CompactCluster.from_cluster(c, self._documents, self._fingerprint(c))
+                for name, c in clusters.items()}
+
+    def _compact_saved(self, index: InventoryIndex):
+        #
+        # Compact the clusters of `index`, which has just been saved, so the
+        # documents the map drops can be read back from the cache. A project
+        # replaced since `index` was swapped in is left to whoever replaced it.
+        #
+        if self._documents is None:
+            return
+        with self._lock:
+            for project_id, clusters in index.project_clusters.items():
+                if self._index.project_clusters.get(project_id) is clusters and \
+                        not all(isinstance(c, CompactCluster) for c in clusters.values()):
+                    self._index = self._index.with_clusters(project_id, self._compact(clusters))
+
+    def _load_document(self, project_id: str, cluster_name: str) -> Dict:
+        #
+        # The full document of a CompactCluster that is no longer resident.
+        # The cache has the document the cluster was compacted from, unless
+        # it was never saved there.
+        #
+        if self._cache is not None:
+            try:
+                document = self._cache.get_cluster(project_id, cluster_name)
+                if document is not None:
+                    return AtlasCluster(project_id, cluster_name, document).resource
+            except (sqlite3.Error, OSError) as e:
+                self._log.warning(f"Cannot read the inventory cache {self._cache.filename}: {e}")
+        return self._api.get_one_cluster(project_id, cluster_name).resource
 
 
     def parse_cluster_id(self, cluster_str: str) -> ClusterID:
@@ -1,11 +1,11 @@
 import pprint
-import json
 from datetime import datetime
 from dateutil import parser
 from typing import Dict
 
 from colorama import Fore
 
+from atlascli import serializer
 from atlascli.outputformat import OutputFormat
 from pygments import highlight
 from pygments.styles import default, colorful, emacs, get_style_by_name
@@ -13,15 +13,13 @@ from pygments.lexers import JsonLexer
 from pygments.formatters import Terminal256Formatter
 
 
-def json_datetime_encoder(item: datetime):
-    return str(item)
-
-
 class AtlasResource:
     """
     Base class for Atlas Resources
     """
 
+    __slots__ = ("_resource",)  # so that subclasses may do without a __dict__
+
     def __init__(self, resource: Dict = None):
         if resource:
             self._resource = resource
@@ -70,7 +68,7 @@ class AtlasResource:
         self._resource = item
 
     def json(self, indent=2):
-        return json.dumps(self._resource, indent=indent, default=json_datetime_encoder)
+        return serializer.dumps(self._resource, indent=indent)
 
     @staticmethod
     def iter_print(iter, func, format):
@@ -87,7 +85,7 @@ class AtlasResource:
 
     @classmethod
     def pretty_dict(cls, d: Dict) -> str:
-        return highlight(json.dumps(d, indent=2, default=json_datetime_encoder), JsonLexer(),
+        return highlight(serializer.dumps(d, indent=2), JsonLexer(),
                               Terminal256Formatter(style=get_style_by_name('emacs')))
 
     @staticmethod
@@ -100,12 +98,12 @@ class AtlasResource:
     @staticmethod
     def dump(output_filename: str, d: Dict):
         with open(output_filename, "w") as output_file:
-            output_file.write(json.dumps(d, indent=2))
+            serializer.dump(d, output_file)
 
     @staticmethod
     def load(input_filename: str):
         with open(input_filename, "r") as input_file:
-            return json.load(input_file)
+            return serializer.load(input_file)
 
     # def __call__(self):
     #     return self._resource
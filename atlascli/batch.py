@@ -0,0 +1,122 @@
+"""
+Batches of operations
+~~~~~~~~~~~~~~~~~~~~~
+
+An Operation describes one Atlas API request so that a mixed batch, e.g.
+pausing some clusters, reading others and deleting a third, can be handed
+to AtlasAPI.execute_many() in one call. Each operation produces an OpResult
+holding either its result or the exception it raised, so one failure does
+not stop the rest of the batch.
+
+    ops = [Operation.pause_cluster(project_id, "Cluster0"),
+           Operation.get(f"/groups/{project_id}/clusters/Cluster1"),
+           Operation.delete(f"/groups/{project_id}/clusters/Cluster2")]
+    for result in api.execute_many(ops, max_workers=4):
+        if not result.ok:
+            print(f"{result.operation} failed: {result.error}")
+
+Author:joe@joedrumgoole.com
+"""
+from typing import Any, Callable, Dict, Optional, Union
+
+from atlascli.deadline import Deadline
+
+
+class Operation:
+    """
+    One request against the Atlas API. `resource` is relative to
+    ATLAS_BASE_URL, e.g. /groups/{project_id}/clusters/{name}.
+    """
+
+    METHODS = ("GET", "POST", "PATCH", "DELETE")
+
+    __slots__ = ("method", "resource", "data", "idempotent")
+
+    def __init__(self, method: str, resource: str, data: Dict = None, idempotent: bool = False):
+        method = method.upper()
+        if method not in Operation.METHODS:
+            raise ValueError(f"'method' must be one of {', '.join(Operation.METHODS)} not '{method}'")
+        self.method = method
+        self.resource = resource
+        self.data = data
+        self.idempotent = idempotent
+
+    @classmethod
+    def get(cls, resource: str) -> "Operation":
+        return cls("GET", resource)
+
+    @classmethod
+    def post(cls, resource: str, data: Dict) -> "Operation":
+        return cls("POST", resource, data)
+
+    @classmethod
+    def patch(cls, resource: str, data: Dict, idempotent: bool = False) -> "Operation":
+        return cls("PATCH", resource, data, idempotent)
+
+    @classmethod
+    def delete(cls, resource: str) -> "Operation":
+        return cls("DELETE", resource)
+
+    @classmethod
+    def pause_cluster(cls, project_id: str, name: str) -> "Operation":
+        return cls.patch(f"/groups/{project_id}/clusters/{name}", {"paused": True}, idempotent=True)
+
+    @classmethod
+    def resume_cluster(cls, project_id: str, name: str) -> "Operation":
+        return cls.patch(f"/groups/{project_id}/clusters/{name}", {"paused": False}, idempotent=True)
+
+    def run(self, api, deadline: Deadline = None) -> Dict:
+        """
+        Send the request with `api` and return the decoded response.
+        """
+        if self.method == "GET":
+            return api.atlas_get(self.resource, deadline=deadline)
+        elif self.method == "POST":
+            return api.atlas_post(self.resource, self.data, deadline=deadline)
+        elif self.method == "PATCH":
+            return api.atlas_patch(self.resource, self.data, idempotent=self.idempotent, deadline=deadline)
+        else:
+            return api.atlas_delete(self.resource, deadline=deadline)
+
+    def __eq__(self, rhs):
+        if isinstance(rhs, Operation):
+            return (self.method, self.resource, self.data, self.idempotent) == \
+                   (rhs.method, rhs.resource, rhs.data, rhs.idempotent)
+        return NotImplemented
+
+    def __repr__(self):
+        return f"Operation(method={self.method!r}, resource={self.resource!r}, data={self.data!r}, " \
+               f"idempotent={self.idempotent})"
+
+
+class OpResult:
+    """
+    The outcome of the operation at position `index` in a batch. Exactly one
+    of `result` and `error` is meaningful, check `ok`.
+    """
+
+    __slots__ = ("index", "operation", "result", "error", "latency")
+
+    def __init__(self, index: int, operation: Union[Operation, Callable[[], Any]], result: Any = None,
+                 error: Optional[Exception] = None, latency: float = 0.0):
+        self.index = index
+        self.operation = operation
+        self.result = result
+        self.error = error
+        self.latency = latency  # seconds the operation took once it started to run
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def unwrap(self) -> Any:
+        """
+        :return: the result, or raise the error if the operation failed
+        """
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+    def __repr__(self):
+        return f"OpResult(index={self.index}, operation={self.operation!r}, ok={self.ok}, " \
+               f"error={self.error!r}, latency={self.latency:.3f})"
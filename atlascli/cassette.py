@@ -0,0 +1,239 @@
+"""
+Recording and replaying Atlas traffic
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+RecordingTransport wraps another transport and writes every request and
+response that passes through it to a cassette, a JSON file. ReplayTransport
+answers requests from a cassette, either as fast as possible or taking as
+long as each request originally took, so that a slow production listing can
+be reproduced offline.
+
+Cassettes are redacted as they are recorded. Keys are never written (the
+digest Authorization header is not recorded) and fields that hold secrets
+are replaced with REDACTED. Every 24 digit hex ID (organization, project,
+cluster and key IDs) is replaced by a stand in ID. The same real ID always
+maps to the same stand in, so a replayed session can follow the IDs it reads
+from one response into the URLs of the next requests.
+
+    transport = RecordingTransport(RequestsTransport(), "listing.json")
+    api = AtlasAPI(transport=transport)
+    ...
+    api.close()  # writes listing.json
+
+    api = AtlasAPI(transport=ReplayTransport("listing.json", realtime=True))
+
+Author:joe@joedrumgoole.com
+"""
+import re
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Set, Tuple, Union
+from urllib.parse import urlsplit
+
+import requests
+
+from atlascli import serializer
+from atlascli.errors import AtlasCassetteError
+from atlascli.transport import Transport, build_response
+
+CASSETTE_VERSION = 1
+
+
+class Redactor:
+    """
+    Replace IDs with stable stand ins and blank out secrets.
+    """
+
+    ID_RE = re.compile(r"\b[0-9a-fA-F]{24}\b")
+    SECRET_FIELDS = {"publicKey", "privateKey", "apiKey", "password"}
+    REDACTED = "REDACTED"
+
+    def __init__(self, secret_fields: Set[str] = None):
+        """
+        :param secret_fields: field names whose values are replaced. Defaults to SECRET_FIELDS.
+        """
+        self._secret_fields = Redactor.SECRET_FIELDS if secret_fields is None else set(secret_fields)
+        self._ids: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def _stand_in(self, match: re.Match) -> str:
+        real = match.group(0).lower()
+        with self._lock:
+            if real not in self._ids:
+                self._ids[real] = f"ca55e77e{len(self._ids) + 1:016x}"
+            return self._ids[real]
+
+    def text(self, s: str) -> str:
+        return Redactor.ID_RE.sub(self._stand_in, s)
+
+    def doc(self, d: Any) -> Any:
+        if isinstance(d, dict):
+            return {k: Redactor.REDACTED if k in self._secret_fields else self.doc(v) for k, v in d.items()}
+        if isinstance(d, list):
+            return [self.doc(v) for v in d]
+        if isinstance(d, str):
+            return self.text(d)
+        return d
+
+
+def request_key(method: str, url: str) -> Tuple[str, str]:
+    """
+    Requests are matched on their method, path and query. The scheme and host
+    are ignored so a cassette can be replayed against any site_url.
+    """
+    parts = urlsplit(url)
+    if parts.query:
+        return method, f"{parts.path}?{parts.query}"
+    return method, parts.path
+
+
+class RecordingTransport(Transport):
+    """
+    Pass requests to `transport` and record them, redacted, to a cassette.
+    """
+
+    RECORDED_HEADERS = ("Content-Type", "Retry-After")
+
+    def __init__(self, transport: Transport, filename: str = None, redactor: Redactor = None,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        :param filename: where close() saves the cassette. If None call save().
+        """
+        self._transport = transport
+        self._filename = filename
+        self._redactor = redactor if redactor else Redactor()
+        self._clock = clock
+        self._interactions: List[Dict] = []
+        self._lock = threading.Lock()
+
+    @property
+    def interactions(self) -> List[Dict]:
+        return list(self._interactions)
+
+    def request(self, method: str, url: str, auth=None,
+                timeout: Union[float, Tuple[float, float]] = None,
+                headers: Dict[str, str] = None,
+                json=None,
+                stream: bool = False) -> requests.Response:
+        #
+        # The body is always read in full so it can be recorded. The response
+        # we return is still readable with iter_content().
+        #
+        _, path = request_key(method, self._redactor.text(url))
+        interaction = {"method": method,
+                       "url": path,
+                       "request": self._redactor.doc(json)}
+        start = self._clock()
+        try:
+            r = self._transport.request(method, url, auth=auth, timeout=timeout, headers=headers, json=json,
+                                        stream=False)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            interaction["elapsed"] = self._clock() - start
+            interaction["error"] = type(e).__name__
+            self._append(interaction)
+            raise
+        interaction["elapsed"] = self._clock() - start
+        interaction["status"] = r.status_code
+        interaction["headers"] = {k: r.headers[k] for k in RecordingTransport.RECORDED_HEADERS if k in r.headers}
+        try:
+            interaction["body"] = self._redactor.doc(serializer.loads(r.content))
+        except ValueError:
+            interaction["text"] = self._redactor.text(r.text)
+        self._append(interaction)
+        return r
+
+    def _append(self, interaction: Dict):
+        with self._lock:
+            self._interactions.append(interaction)
+
+    def save(self, filename: str = None):
+        filename = filename if filename else self._filename
+        if filename is None:
+            raise ValueError("No filename to save the cassette to")
+        with self._lock:
+            cassette = {"version": CASSETTE_VERSION, "interactions": self._interactions}
+            with open(filename, "w") as output_file:
+                serializer.dump(cassette, output_file)
+
+    def close(self):
+        self._transport.close()
+        if self._filename:
+            self.save()
+
+
+class ReplayTransport(Transport):
+    """
+    Answer requests from a cassette.
+
+    Each recorded interaction is used once, in the order it was recorded for
+    its method and URL, so repeated requests for the same page get the
+    responses they got when they were recorded. A request with no recorded
+    interaction left raises AtlasCassetteError.
+    """
+
+    def __init__(self, cassette: Union[str, Dict], realtime: bool = False, loop: bool = False,
+                 sleep: Callable[[float], None] = time.sleep):
+        """
+        :param cassette: a cassette filename or a loaded cassette
+        :param realtime: if True each request takes as long as it did when it
+        was recorded, otherwise responses are returned immediately
+        :param loop: if True start again from the first interaction for a
+        request once they have all been used, e.g. for benchmarks that make
+        the same requests many times
+        """
+        if isinstance(cassette, str):
+            with open(cassette, "r") as input_file:
+                cassette = serializer.load(input_file)
+        if cassette.get("version") != CASSETTE_VERSION:
+            raise AtlasCassetteError(f"Unsupported cassette version {cassette.get('version')}")
+        self._interactions: Dict[Tuple[str, str], List[Dict]] = defaultdict(list)
+        for interaction in cassette["interactions"]:
+            self._interactions[(interaction["method"], interaction["url"])].append(interaction)
+        self._next: Dict[Tuple[str, str], int] = defaultdict(int)
+        self._realtime = realtime
+        self._loop = loop
+        self._sleep = sleep
+        self._lock = threading.Lock()
+
+    def remaining(self) -> int:
+        """
+        :return: the number of recorded interactions that have not been replayed
+        """
+        with self._lock:
+            return sum(max(0, len(v) - self._next[k]) for k, v in self._interactions.items())
+
+    def request(self, method: str, url: str, auth=None,
+                timeout: Union[float, Tuple[float, float]] = None,
+                headers: Dict[str, str] = None,
+                json=None,
+                stream: bool = False) -> requests.Response:
+        key = request_key(method, url)
+        with self._lock:
+            recorded = self._interactions.get(key, [])
+            n = self._next[key]
+            if n >= len(recorded) and self._loop and recorded:
+                n = 0
+            if n >= len(recorded):
+                raise AtlasCassetteError(f"No recorded response left for {method} {key[1]}")
+            self._next[key] = n + 1
+            interaction = recorded[n]
+
+        if self._realtime:
+            read_timeout = timeout[1] if isinstance(timeout, tuple) else timeout
+            if read_timeout is not None and interaction["elapsed"] > read_timeout and "error" not in interaction:
+                self._sleep(read_timeout)
+                raise requests.exceptions.ReadTimeout(f"{method} {url} took longer than {read_timeout}s")
+            self._sleep(interaction["elapsed"])
+
+        if "error" in interaction:
+            error = getattr(requests.exceptions, interaction["error"], requests.exceptions.ConnectionError)
+            raise error(f"Replayed {interaction['error']} for {method} {key[1]}")
+
+        return build_response(url, interaction["status"], _content(interaction), interaction.get("headers"))
+
+
+def _content(interaction: Dict) -> bytes:
+    if "body" in interaction:
+        return serializer.dumpb(interaction["body"])
+    return interaction.get("text", "").encode("utf-8")
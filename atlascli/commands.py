@@ -3,10 +3,13 @@ import json
 import os.path
 from typing import List
 
+from atlascli import serializer
 from atlascli.atlascluster import AtlasCluster
 from atlascli.atlasmap import AtlasMap
 from atlascli.atlasresource import AtlasResource, inputhighlight
 from atlascli.clusterid import ClusterID
+from atlascli.deadline import Deadline
+from atlascli.errors import AtlasDeadlineExceededError
 
 from colorama import init, Fore
 import click
@@ -14,6 +17,8 @@ import click
 
 class Commands:
 
+    REVALIDATION_TIMEOUT = 30.0  # seconds a lookup waits for a stale inventory to be revalidated
+
     def __init__(self, map: AtlasMap):
         self._map = map
 
@@ -31,13 +36,25 @@ class Commands:
         else:
             raise SystemExit(f"No project ID argument defined for this command")
 
-    def preflight_cluster_arg(self, cluster_arg: str) -> ClusterID:
+    def preflight_cluster_arg(self, cluster_arg: str, deadline: Deadline = None) -> ClusterID:
+        try:
+            return self._preflight_cluster_arg(cluster_arg, deadline)
+        except SystemExit:
+            #
+            # A stale cached inventory may not know about a new cluster yet,
+            # look again once it has been revalidated.
+            #
+            if cluster_arg is not None and self._map.revalidate(self.REVALIDATION_TIMEOUT, deadline):
+                return self._preflight_cluster_arg(cluster_arg, deadline)
+            raise
+
+    def _preflight_cluster_arg(self, cluster_arg: str, deadline: Deadline = None) -> ClusterID:
         try:
             if cluster_arg is None:
                 raise SystemExit(f"command needs an argument")
             project_id, cluster_name = ClusterID.parse_id_name(cluster_arg)
             if project_id is None:
-                project_ids = self._map.get_cluster_project_ids(cluster_name)
+                project_ids = self._map.get_cluster_project_ids(cluster_name, deadline)
                 if len(project_ids) == 0:
                     raise SystemExit(f"{inputhighlight(cluster_name)} is not a valid cluster name in this organization")
                 elif len(project_ids) > 1:
@@ -45,8 +62,8 @@ class Commands:
                                      f"you need to specify the project id")
                 else:
                     project_id = project_ids[0]
-            if project_id and self._map.is_project_id(project_id):
-                if cluster_name and self._map.is_cluster_name(cluster_name):
+            if project_id and self._map.is_project_id(project_id, deadline):
+                if cluster_name and self._map.get_cluster(cluster_name, project_id, deadline):
                     return ClusterID(project_id, cluster_name)
                 else:
                     if cluster_name:
@@ -65,7 +82,7 @@ class Commands:
     def default_cluster_cmd(output_file=None):
         default_cluster = AtlasCluster.default_single_region_cluster()
         if output_file:
-            output_file.write(json.dumps(default_cluster, indent=2))
+            serializer.dump(default_cluster, output_file)
             print(f"default cluster config created in {inputhighlight(output_file.name)}")
         else:
             print(AtlasCluster.pretty_dict(default_cluster))
@@ -73,12 +90,12 @@ class Commands:
     def create_cluster_cmd(self, cluster_name: str, cfg_file, output_file=None):
         project_id, cluster_name = ClusterID.parse_id_name(cluster_name)
         if cfg_file:
-            cfg_dict = json.load(cfg_file)
+            cfg_dict = serializer.load(cfg_file)
             print(f"Creating cluster {Fore.YELLOW}{project_id}{Fore.RESET}:{Fore.MAGENTA}{cluster_name}"
                   f"{Fore.RESET} from cluster configuration {Fore.GREEN}{cfg_file.name}")
             new_cluster = self._map.api.create_cluster(project_id, cluster_name, cfg_dict)
             if output_file:
-                json.dump(output_file, new_cluster)
+                output_file.write(new_cluster.json())
                 print(f"Cluster config created in '{Fore.MAGENTA}{output_file.name}{Fore.RESET}'")
             else:
                 print(new_cluster.pretty())
@@ -87,14 +104,14 @@ class Commands:
         print(f"Creating project {self._map.org_id}:{project_name}")
         project = self._map.api.create_project(self._map.org_id, project_name)
         if output_file:
-            json.dump(output_file, project)
+            output_file.write(project.json())
             print(f"Cluster config created in '{Fore.MAGENTA}{output_file.name}{Fore.RESET}'")
         else:
             print(project.pretty())
 
     @staticmethod
     def template_cluster_cmd(cfg_file, output_file=None):
-        cfg = json.load(cfg_file)
+        cfg = serializer.load(cfg_file)
         new_cfg = AtlasCluster.strip_cluster_dict(cfg)
         if output_file:
             output_file.write(json.dumps(new_cfg))
@@ -116,7 +133,7 @@ class Commands:
         cluster_id = self.preflight_cluster_arg(cluster_name)
         print(f"deleting cluster: {cluster_id.pretty()} (project : {self._map.get_project_name(cluster_id.project_id)})")
         if Commands.prompt("Are you sure: ", "Y"):
-            cluster = self._map.api.get_one_cluster(cluster_id.project_id, cluster_id.name)
+            cluster = self._map.refresh_cluster(cluster_id.project_id, cluster_id.name)
             self._map.api.delete_cluster(cluster)
             print("delete completed")
         else:
@@ -175,26 +192,43 @@ class Commands:
             if cluster_names:
                 self.list_cluster(cluster_names, output)
 
-    def pause_cmd(self, cluster_names: List[str]):
-
-        for cluster_name in cluster_names:
-            cluster_id = self.preflight_cluster_arg(cluster_name)
-            cluster = self._map.get_one_cluster(cluster_id.project_id, cluster_id.name)
-            if cluster.is_paused():
-                print(f"Cluster '{cluster.name}' is already paused")
-            else:
-                print(f"Trying to pause: '{cluster.name}'")
-                self._map.api.pause_cluster(cluster)
-                print(f"Paused cluster '{cluster.name}' at {datetime.now().strftime('%H:%M:%S')}")
-
-    def resume_cmd(self, cluster_ids: List[str]):
-
-        for cluster_name in cluster_ids:
-            cluster_id = self.preflight_cluster_arg(cluster_name)
-            cluster = self._map.get_one_cluster(cluster_id.project_id, cluster_id.name)
-            if cluster.is_paused():
-                print(f"Trying to resume: '{cluster.name}'")
-                self._map.api.resume_cluster(cluster)
-                print(f"Resumed cluster '{cluster.name}' at {datetime.now().strftime('%H:%M:%S')}")
-            else:
-                print(f"Cluster '{cluster.name}' is already running")
+    def _bulk_cmd(self, cluster_names: List[str], deadline: Deadline, pause: bool):
+        #
+        # Pause or resume each cluster in turn. If a deadline is set it covers
+        # whatever has to be fetched to resolve each name as well as every
+        # pause or resume request, and once it expires the clusters we have
+        # not got to are reported and skipped.
+        #
+        done = 0
+        try:
+            for cluster_name in cluster_names:
+                if deadline:
+                    deadline.check("pause" if pause else "resume")
+                cluster_id = self.preflight_cluster_arg(cluster_name, deadline)
+                # the name may be resolved from the cache but its state must be current
+                cluster = self._map.refresh_cluster(cluster_id.project_id, cluster_id.name, deadline=deadline)
+                if pause:
+                    if cluster.is_paused():
+                        print(f"Cluster '{cluster.name}' is already paused")
+                    else:
+                        print(f"Trying to pause: '{cluster.name}'")
+                        self._map.update_cluster(self._map.api.pause_cluster(cluster, deadline=deadline))
+                        print(f"Paused cluster '{cluster.name}' at {datetime.now().strftime('%H:%M:%S')}")
+                else:
+                    if cluster.is_paused():
+                        print(f"Trying to resume: '{cluster.name}'")
+                        self._map.update_cluster(self._map.api.resume_cluster(cluster, deadline=deadline))
+                        print(f"Resumed cluster '{cluster.name}' at {datetime.now().strftime('%H:%M:%S')}")
+                    else:
+                        print(f"Cluster '{cluster.name}' is already running")
+                done = done + 1
+        except AtlasDeadlineExceededError as e:
+            skipped = ", ".join(cluster_names[done:])
+            raise SystemExit(f"{Fore.RED}Deadline exceeded:{Fore.RESET} {e}\n"
+                             f"Clusters not {'paused' if pause else 'resumed'}: {inputhighlight(skipped)}")
+
+    def pause_cmd(self, cluster_names: List[str], deadline: Deadline = None):
+        self._bulk_cmd(cluster_names, deadline, pause=True)
+
+    def resume_cmd(self, cluster_ids: List[str], deadline: Deadline = None):
+        self._bulk_cmd(cluster_ids, deadline, pause=False)
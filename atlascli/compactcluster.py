@@ -0,0 +1,171 @@
+"""
+Compact clusters
+~~~~~~~~~~~~~~~~
+
+A full cluster document runs to several kilobytes once `links`,
+`connectionStrings` and `replicationSpecs` are decoded into dicts, which
+adds up in an organization with thousands of projects. A CompactCluster
+keeps only the fields the CLI lists and resolves names with, in slots:
+
+    project id, name, state, paused, instance size, disk size and region
+
+Anything else, e.g. cluster.resource for `atlascli clone`, loads the full
+document through a ClusterDocuments store. The store keeps the most recently
+used documents resident, up to its limit, and loads the rest again when
+they are asked for:
+
+    documents = ClusterDocuments(100, load=lambda project_id, name: ...)
+    cluster = CompactCluster.from_cluster(full_cluster, documents)
+
+AtlasMap(compact=True) stores its clusters this way.
+
+Author:joe@joedrumgoole.com
+"""
+import sys
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Tuple
+
+from atlascli.atlascluster import AtlasCluster
+
+
+class ClusterDocuments:
+    """
+    An LRU store of full cluster documents keyed by project ID and name.
+    `load(project_id, name)` is called for a document that is not resident.
+    """
+
+    def __init__(self, max_documents: int, load: Callable[[str, str], Dict]):
+        if max_documents < 0:
+            raise ValueError("'max_documents' must not be negative")
+        self._max_documents = max_documents
+        self._load = load
+        self._lock = threading.Lock()
+        self._documents: "OrderedDict[Tuple[str, str], Dict]" = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+
+    @property
+    def max_documents(self) -> int:
+        return self._max_documents
+
+    def get(self, project_id: str, name: str) -> Dict:
+        key = (project_id, name)
+        with self._lock:
+            document = self._documents.get(key)
+            if document is not None:
+                self._documents.move_to_end(key)
+                self._hits += 1
+                return document
+            self._misses += 1
+        #
+        # Load without the lock, two threads missing on the same document
+        # both load it and the second put wins.
+        #
+        document = self._load(project_id, name)
+        self.put(project_id, name, document)
+        return document
+
+    def put(self, project_id: str, name: str, document: Dict):
+        if self._max_documents == 0:
+            return
+        key = (project_id, name)
+        with self._lock:
+            self._documents[key] = document
+            self._documents.move_to_end(key)
+            while len(self._documents) > self._max_documents:
+                self._documents.popitem(last=False)
+
+    def discard(self, project_id: str, name: str):
+        with self._lock:
+            self._documents.pop((project_id, name), None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"resident": len(self._documents), "hits": self._hits, "misses": self._misses}
+
+    def __len__(self):
+        return len(self._documents)
+
+    def __repr__(self):
+        return f"ClusterDocuments(max_documents={self._max_documents}, resident={len(self._documents)})"
+
+
+def _intern(s):
+    #
+    # States, sizes and regions repeat across thousands of clusters, share one copy of each
+    #
+    return sys.intern(s) if isinstance(s, str) else s
+
+
+class CompactCluster(AtlasCluster):
+    """
+    An AtlasCluster holding only the fields the CLI uses. The full document
+    is loaded from `documents` the first time anything else is needed.
+    """
+
+    __slots__ = ("_name", "_state", "_paused", "_instance_size", "_disk_size", "_region", "_documents",
+                 "fingerprint")  # _project_id is a slot of AtlasCluster
+
+    def __init__(self, project_id: str, name: str, state: str, paused: bool, instance_size: str,
+                 disk_size: float, region: str, documents: ClusterDocuments, fingerprint: Hashable = None):
+        #
+        # AtlasResource.__init__ would keep the document, so it is not called
+        #
+        self._project_id = project_id
+        self._name = name
+        self._state = _intern(state)
+        self._paused = paused
+        self._instance_size = _intern(instance_size)
+        self._disk_size = disk_size
+        self._region = _intern(region)
+        self._documents = documents
+        self.fingerprint = fingerprint  # set by the owner to tell if the cluster has changed
+
+    @classmethod
+    def from_cluster(cls, cluster: AtlasCluster, documents: ClusterDocuments,
+                     fingerprint: Hashable = None) -> "CompactCluster":
+        """
+        Make a compact copy of `cluster` and put its document in `documents`.
+        """
+        if isinstance(cluster, CompactCluster):
+            return cluster
+        resource = cluster.resource
+        provider = resource.get("providerSettings", {})
+        compact = cls(cluster.project_id, cluster.name, resource.get("stateName"), resource.get("paused", False),
+                      provider.get("instanceSizeName"), resource.get("diskSizeGB"), provider.get("regionName"),
+                      documents, fingerprint)
+        documents.put(cluster.project_id, cluster.name, resource)
+        return compact
+
+    @property
+    def _resource(self) -> Dict:
+        return self._documents.get(self._project_id, self._name)
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def project_id(self):
+        return self._project_id
+
+    def is_paused(self):
+        return self._paused
+
+    @property
+    def state(self):
+        return self._state
+
+    def instance_size(self):
+        return self._instance_size
+
+    def disk_size(self):
+        return self._disk_size
+
+    def region(self):
+        return self._region
+
+    def __repr__(self):
+        return f"CompactCluster(project_id={self._project_id!r}, name={self._name!r}, state={self._state!r}, " \
+               f"paused={self._paused})"
@@ -0,0 +1,69 @@
+"""
+Deadlines
+~~~~~~~~~
+
+A Deadline is an absolute point in time by which a whole operation, such
+as "pause these 200 clusters", must complete. It is passed down through
+the AtlasAPI to every request the operation makes. Each request's socket
+timeouts are clipped to the time remaining, retries and back offs that
+would overrun the deadline are abandoned, and AtlasDeadlineExceededError
+is raised once the deadline has passed.
+
+Author:joe@joedrumgoole.com
+"""
+import time
+from typing import Tuple, Union
+
+from atlascli.errors import AtlasDeadlineExceededError
+
+
+class Deadline:
+
+    def __init__(self, seconds: float, clock=time.monotonic):
+        """
+        :param seconds: how long from now the operation has to complete
+        """
+        if seconds <= 0:
+            raise ValueError("a deadline must be in the future")
+        self._seconds = seconds
+        self._clock = clock
+        self._expires_at = clock() + seconds
+
+    @property
+    def seconds(self) -> float:
+        return self._seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self._expires_at - self._clock())
+
+    def expired(self) -> bool:
+        return self._clock() >= self._expires_at
+
+    def check(self, what: str = "operation"):
+        """
+        Raise AtlasDeadlineExceededError if the deadline has passed.
+        """
+        if self.expired():
+            raise AtlasDeadlineExceededError(f"{what} did not complete within the {self._seconds}s deadline")
+
+    def allows(self, seconds: float) -> bool:
+        """
+        :return: True if we can wait `seconds` and still be inside the deadline
+        """
+        return seconds < self.remaining()
+
+    def clip(self, timeout: Union[float, Tuple[float, float], None]) -> Union[float, Tuple[float, float]]:
+        """
+        Shorten a requests style timeout, either a number or a (connect, read)
+        tuple, so that it ends no later than the deadline.
+        """
+        remaining = self.remaining()
+        if timeout is None:
+            return remaining
+        if isinstance(timeout, tuple):
+            connect, read = timeout
+            return min(connect, remaining), min(read, remaining)
+        return min(timeout, remaining)
+
+    def __repr__(self):
+        return f"Deadline(seconds={self._seconds}, remaining={self.remaining():.2f})"
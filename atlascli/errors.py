@@ -40,3 +40,15 @@ class AtlasEnvironmentError(ValueError):
 
 class AtlasInitialisationError(ValueError):
     pass
+
+
+class AtlasCircuitOpenError(AtlasError):
+    pass
+
+
+class AtlasDeadlineExceededError(AtlasError):
+    pass
+
+
+class AtlasCassetteError(AtlasError):
+    pass
@@ -0,0 +1,474 @@
+"""
+In memory Atlas
+~~~~~~~~~~~~~~~
+
+FakeAtlas is a Transport that answers the part of the Atlas Admin API that
+atlascli uses from memory. It holds organizations, projects (groups) and
+clusters, pages listings and returns `links` the way Atlas does, and moves
+clusters through the states Atlas does when they are created, modified,
+paused, resumed and deleted. Latency, throttling (429) and server errors can
+be injected so that pagination, caching, retries and concurrency can be
+tested and benchmarked without keys or a network connection.
+
+    atlas = FakeAtlas()
+    org = atlas.add_organization("Acme")
+    project = atlas.add_project(org["id"], "demo")
+    atlas.add_cluster(project["id"], "Cluster0")
+    api = AtlasAPI(transport=atlas)
+    api.authenticate(AtlasKey("public", "private"))
+
+Author:joe@joedrumgoole.com
+"""
+import copy
+import itertools
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from http import HTTPStatus
+from typing import Callable, Dict, List, Optional, Tuple, Union
+from urllib.parse import urlsplit, parse_qs
+
+import requests
+
+from atlascli import serializer
+from atlascli.atlasapi import AtlasAPI
+from atlascli.atlascluster import AtlasCluster
+from atlascli.transport import Transport, build_response
+
+
+class FakeAtlas(Transport):
+    """
+    An in memory Atlas. Every method is thread safe.
+    """
+
+    DEFAULT_PAGE_SIZE = 100
+    MAX_PAGE_SIZE = 500
+    MONGODB_VERSION = "4.4.10"
+
+    ROUTES = [
+        ("GET",    r"/orgs",                                        "_list_organizations"),
+        ("POST",   r"/orgs",                                        "_create_organization"),
+        ("GET",    r"/orgs/(?P<org_id>[^/]+)",                      "_get_organization"),
+        ("DELETE", r"/orgs/(?P<org_id>[^/]+)",                      "_delete_organization"),
+        ("GET",    r"/orgs/(?P<org_id>[^/]+)/groups",               "_list_organization_projects"),
+        ("GET",    r"/groups",                                      "_list_projects"),
+        ("POST",   r"/groups",                                      "_create_project"),
+        ("GET",    r"/groups/(?P<project_id>[^/]+)",                "_get_project"),
+        ("DELETE", r"/groups/(?P<project_id>[^/]+)",                "_delete_project"),
+        ("GET",    r"/clusters",                                    "_list_all_clusters"),
+        ("GET",    r"/groups/(?P<project_id>[^/]+)/clusters",       "_list_clusters"),
+        ("POST",   r"/groups/(?P<project_id>[^/]+)/clusters",       "_create_cluster"),
+        ("GET",    r"/groups/(?P<project_id>[^/]+)/clusters/(?P<name>[^/]+)", "_get_cluster"),
+        ("PATCH",  r"/groups/(?P<project_id>[^/]+)/clusters/(?P<name>[^/]+)", "_modify_cluster"),
+        ("DELETE", r"/groups/(?P<project_id>[^/]+)/clusters/(?P<name>[^/]+)", "_delete_cluster"),
+    ]
+
+    def __init__(self,
+                 latency: Union[float, Callable[[], float]] = 0.0,
+                 transition_time: float = 0.0,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep,
+                 all_clusters: bool = True):
+        """
+        :param latency: seconds every request takes, or a function returning
+        them e.g. `lambda: random.uniform(0.05, 0.2)`
+        :param transition_time: seconds a cluster stays CREATING, REPAIRING,
+        UPDATING or DELETING before the change completes. 0 completes changes
+        before the next request.
+        :param clock: time source for transitions
+        :param sleep: how latency is waited out
+        :param all_clusters: if False GET /clusters is refused with 401 as it
+        is for keys without the Organization Member role
+        """
+        self._lock = threading.RLock()
+        self._orgs: Dict[str, Dict] = {}
+        self._projects: Dict[str, Dict] = {}
+        self._clusters: Dict[str, Dict[str, Dict]] = {}  # project id -> cluster name -> cluster
+        self._transitions: Dict[Tuple[str, str], Tuple[float, Optional[str]]] = {}
+        self._failures: List[Tuple[int, Optional[float]]] = []
+        self._ids = itertools.count(1)
+        self._routes = [(method, re.compile(pattern), handler) for method, pattern, handler in FakeAtlas.ROUTES]
+        self._clock = clock
+        self._sleep = sleep
+        self.latency = latency
+        self.transition_time = transition_time
+        self.all_clusters = all_clusters
+        self.requests: List[Tuple[str, str]] = []
+
+    #
+    # Setting up and inspecting the data
+    #
+
+    def _new_id(self) -> str:
+        return f"{next(self._ids):024x}"
+
+    @staticmethod
+    def _now() -> str:
+        return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    def add_organization(self, name: str) -> Dict:
+        with self._lock:
+            org = {"id": self._new_id(), "name": name, "isDeleted": False, "links": []}
+            self._orgs[org["id"]] = org
+            return copy.deepcopy(org)
+
+    def add_project(self, org_id: str, name: str) -> Dict:
+        with self._lock:
+            if org_id not in self._orgs:
+                raise KeyError(f"no organization '{org_id}'")
+            project = {"id": self._new_id(), "name": name, "orgId": org_id, "clusterCount": 0,
+                       "created": self._now(), "links": []}
+            self._projects[project["id"]] = project
+            self._clusters[project["id"]] = {}
+            return copy.deepcopy(project)
+
+    def add_cluster(self, project_id: str, name: str, config: Dict = None, state: str = "IDLE",
+                    paused: bool = False) -> Dict:
+        with self._lock:
+            if project_id not in self._projects:
+                raise KeyError(f"no project '{project_id}'")
+            cluster = self._make_cluster(project_id, name, config)
+            cluster["stateName"] = state
+            cluster["paused"] = paused
+            self._clusters[project_id][name] = cluster
+            self._projects[project_id]["clusterCount"] += 1
+            return copy.deepcopy(cluster)
+
+    def seed(self, orgs: int = 1, projects: int = 1, clusters: int = 1) -> List[Dict]:
+        """
+        Add `orgs` organizations each holding `projects` projects, each holding
+        `clusters` clusters.
+        :return: the projects that were added
+        """
+        added = []
+        for o in range(orgs):
+            org = self.add_organization(f"org{o}")
+            for p in range(projects):
+                project = self.add_project(org["id"], f"project{o}-{p}")
+                for c in range(clusters):
+                    self.add_cluster(project["id"], f"Cluster{c}")
+                added.append(project)
+        return added
+
+    def cluster(self, project_id: str, name: str) -> Optional[Dict]:
+        """
+        :return: a copy of the cluster as it is now or None if it does not exist
+        """
+        with self._lock:
+            self._apply_transitions()
+            cluster = self._clusters.get(project_id, {}).get(name)
+            return copy.deepcopy(cluster)
+
+    def set_state(self, project_id: str, name: str, state: str, duration: float = None):
+        """
+        Put a cluster into `state`, e.g. REPAIRING. If `duration` is given the
+        cluster returns to IDLE after that many seconds.
+        """
+        with self._lock:
+            self._clusters[project_id][name]["stateName"] = state
+            self._transitions.pop((project_id, name), None)
+            if duration is not None:
+                self._transitions[(project_id, name)] = (self._clock() + duration, "IDLE")
+
+    def throttle(self, count: int = 1, retry_after: float = None):
+        """
+        Answer the next `count` requests with 429 Too Many Requests.
+        """
+        self.fail(count, status=429, retry_after=retry_after)
+
+    def fail(self, count: int = 1, status: int = 503, retry_after: float = None):
+        """
+        Answer the next `count` requests with `status`.
+        """
+        with self._lock:
+            self._failures.extend([(status, retry_after)] * count)
+
+    @property
+    def request_count(self) -> int:
+        return len(self.requests)
+
+    def reset_requests(self):
+        with self._lock:
+            self.requests = []
+
+    #
+    # Transport
+    #
+
+    def request(self, method: str, url: str, auth=None,
+                timeout: Union[float, Tuple[float, float]] = None,
+                headers: Dict[str, str] = None,
+                json=None,
+                stream: bool = False) -> requests.Response:
+        parts = urlsplit(url)
+        with self._lock:
+            self.requests.append((method, parts.path))
+            failure = self._failures.pop(0) if self._failures else None
+
+        delay = self.latency() if callable(self.latency) else self.latency
+        if delay:
+            read_timeout = timeout[1] if isinstance(timeout, tuple) else timeout
+            if read_timeout is not None and delay > read_timeout:
+                self._sleep(read_timeout)
+                raise requests.exceptions.ReadTimeout(f"{method} {url} took longer than {read_timeout}s")
+            self._sleep(delay)
+
+        if failure:
+            status, retry_after = failure
+            response_headers = {"Retry-After": f"{retry_after:g}"} if retry_after is not None else {}
+            return self._response(url, status, self._error(status, "INJECTED_FAILURE", "Injected failure"),
+                                  response_headers)
+
+        if not parts.path.startswith(AtlasAPI.API_URL):
+            return self._response(url, 404, self._error(404, "RESOURCE_NOT_FOUND", f"No resource {parts.path}"))
+        path = parts.path[len(AtlasAPI.API_URL):].rstrip("/")
+        query = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+        base_url = f"{parts.scheme}://{parts.netloc}{parts.path}"
+
+        allowed = False
+        for route_method, pattern, handler in self._routes:
+            match = pattern.fullmatch(path)
+            if match is None:
+                continue
+            allowed = True
+            if route_method == method:
+                with self._lock:
+                    self._apply_transitions()
+                    status, doc = getattr(self, handler)(query=query, body=json, base_url=base_url,
+                                                         **match.groupdict())
+                return self._response(url, status, doc)
+        if allowed:
+            return self._response(url, 405, self._error(405, "METHOD_NOT_ALLOWED", f"{method} {path}"))
+        return self._response(url, 404, self._error(404, "RESOURCE_NOT_FOUND", f"No resource {path}"))
+
+    @staticmethod
+    def _response(url: str, status: int, doc: Dict, headers: Dict[str, str] = None) -> requests.Response:
+        return build_response(url, status, serializer.dumpb(doc), headers)
+
+    @staticmethod
+    def _error(status: int, code: str, detail: str) -> Dict:
+        return {"detail": detail, "error": status, "errorCode": code, "parameters": [],
+                "reason": HTTPStatus(status).phrase}
+
+    @staticmethod
+    def _page(items: List[Dict], query: Dict[str, str], base_url: str) -> Tuple[int, Dict]:
+        try:
+            per_page = int(query.get("itemsPerPage", FakeAtlas.DEFAULT_PAGE_SIZE))
+            page_num = int(query.get("pageNum", 1))
+        except ValueError:
+            return 400, FakeAtlas._error(400, "INVALID_QUERY_PARAMETER", "itemsPerPage and pageNum must be numbers")
+        if not 1 <= per_page <= FakeAtlas.MAX_PAGE_SIZE or page_num < 1:
+            return 400, FakeAtlas._error(400, "INVALID_QUERY_PARAMETER",
+                                         f"itemsPerPage must be between 1 and {FakeAtlas.MAX_PAGE_SIZE}")
+        start = (page_num - 1) * per_page
+
+        def link(n, rel):
+            return {"href": f"{base_url}?itemsPerPage={per_page}&pageNum={n}", "rel": rel}
+
+        links = [link(page_num, "self")]
+        if page_num > 1:
+            links.append(link(page_num - 1, "previous"))
+        if start + per_page < len(items):
+            links.append(link(page_num + 1, "next"))
+        doc = {"links": links, "results": items[start:start + per_page]}
+        if query.get("includeCount", "true").lower() == "true":
+            doc["totalCount"] = len(items)
+        return 200, doc
+
+    #
+    # Cluster states
+    #
+
+    def _make_cluster(self, project_id: str, name: str, config: Dict = None) -> Dict:
+        cluster = copy.deepcopy(config) if config else AtlasCluster.default_single_region_cluster()
+        host = f"{name.lower()}.{project_id[-5:]}.mongodb.net"
+        cluster.update({"id": self._new_id(),
+                        "name": name,
+                        "groupId": project_id,
+                        "clusterType": cluster.get("clusterType", "REPLICASET"),
+                        "mongoDBVersion": cluster.get("mongoDBVersion", FakeAtlas.MONGODB_VERSION),
+                        "createDate": self._now(),
+                        "mongoURI": f"mongodb://{host}:27017",
+                        "srvAddress": f"mongodb+srv://{host}",
+                        "connectionStrings": {"standard": f"mongodb://{host}:27017",
+                                              "standardSrv": f"mongodb+srv://{host}"},
+                        "stateName": "IDLE",
+                        "paused": False,
+                        "links": []})
+        return cluster
+
+    def _transition(self, project_id: str, name: str, state: str, next_state: Optional[str]):
+        #
+        # Put the cluster into `state` until transition_time has passed and then
+        # into `next_state`. A next_state of None deletes the cluster.
+        #
+        self._clusters[project_id][name]["stateName"] = state
+        self._transitions[(project_id, name)] = (self._clock() + self.transition_time, next_state)
+
+    def _apply_transitions(self):
+        now = self._clock()
+        for key, (when, next_state) in list(self._transitions.items()):
+            if when > now:
+                continue
+            del self._transitions[key]
+            project_id, name = key
+            if next_state is None:
+                self._clusters[project_id].pop(name, None)
+                self._projects[project_id]["clusterCount"] -= 1
+            else:
+                self._clusters[project_id][name]["stateName"] = next_state
+
+    #
+    # Handlers. Each is called with the lock held and returns (status, document).
+    #
+
+    def _list_organizations(self, query, body, base_url):
+        return self._page(list(self._orgs.values()), query, base_url)
+
+    def _create_organization(self, query, body, base_url):
+        if not body or "name" not in body:
+            return 400, self._error(400, "MISSING_ATTRIBUTE", "The name attribute is required")
+        return 201, self.add_organization(body["name"])
+
+    def _get_organization(self, query, body, base_url, org_id):
+        if org_id not in self._orgs:
+            return 404, self._error(404, "ORG_NOT_FOUND", f"No organization with ID {org_id} exists")
+        return 200, self._orgs[org_id]
+
+    def _delete_organization(self, query, body, base_url, org_id):
+        if org_id not in self._orgs:
+            return 404, self._error(404, "ORG_NOT_FOUND", f"No organization with ID {org_id} exists")
+        if any(p["orgId"] == org_id for p in self._projects.values()):
+            return 409, self._error(409, "CANNOT_DELETE_ORG_ACTIVE_PROJECTS",
+                                    f"Organization {org_id} still has projects")
+        del self._orgs[org_id]
+        return 200, {}
+
+    def _list_organization_projects(self, query, body, base_url, org_id):
+        if org_id not in self._orgs:
+            return 404, self._error(404, "ORG_NOT_FOUND", f"No organization with ID {org_id} exists")
+        return self._page([p for p in self._projects.values() if p["orgId"] == org_id], query, base_url)
+
+    def _list_projects(self, query, body, base_url):
+        return self._page(list(self._projects.values()), query, base_url)
+
+    def _create_project(self, query, body, base_url):
+        if not body or "name" not in body or "orgId" not in body:
+            return 400, self._error(400, "MISSING_ATTRIBUTE", "The name and orgId attributes are required")
+        if body["orgId"] not in self._orgs:
+            return 404, self._error(404, "ORG_NOT_FOUND", f"No organization with ID {body['orgId']} exists")
+        if any(p["name"] == body["name"] for p in self._projects.values()):
+            return 409, self._error(409, "GROUP_ALREADY_EXISTS", f"A project named {body['name']} already exists")
+        return 201, self.add_project(body["orgId"], body["name"])
+
+    def _get_project(self, query, body, base_url, project_id):
+        if project_id not in self._projects:
+            return 404, self._error(404, "GROUP_NOT_FOUND", f"No project with ID {project_id} exists")
+        return 200, self._projects[project_id]
+
+    def _delete_project(self, query, body, base_url, project_id):
+        if project_id not in self._projects:
+            return 404, self._error(404, "GROUP_NOT_FOUND", f"No project with ID {project_id} exists")
+        if self._clusters[project_id]:
+            return 409, self._error(409, "CANNOT_CLOSE_GROUP_ACTIVE_ATLAS_CLUSTERS",
+                                    f"Project {project_id} still has clusters")
+        del self._projects[project_id]
+        del self._clusters[project_id]
+        return 200, {}
+
+    def _list_all_clusters(self, query, body, base_url):
+        if not self.all_clusters:
+            return 401, self._error(401, "USER_UNAUTHORIZED", "Current user is not authorized to perform this action")
+        summaries = []
+        for project in self._projects.values():
+            org = self._orgs.get(project["orgId"], {})
+            summaries.append({"groupId": project["id"],
+                              "groupName": project["name"],
+                              "orgId": project["orgId"],
+                              "orgName": org.get("name"),
+                              "planType": "Atlas",
+                              "tags": [],
+                              "clusters": [self._summary(c) for c in self._clusters[project["id"]].values()]})
+        return self._page(summaries, query, base_url)
+
+    @staticmethod
+    def _summary(cluster: Dict) -> Dict:
+        if cluster["paused"]:
+            availability = "dead"
+        elif cluster["stateName"] == "IDLE":
+            availability = "available"
+        else:
+            availability = "transitive"
+        return {"alertCount": 0,
+                "authorizedToView": True,
+                "availability": availability,
+                "backupEnabled": cluster.get("providerBackupEnabled", False),
+                "clusterId": cluster["id"],
+                "dataSizeBytes": 0,
+                "name": cluster["name"],
+                "nodeCount": cluster.get("replicationFactor", 3),
+                "sslEnabled": True,
+                "type": "sharded cluster" if cluster["clusterType"] == "SHARDED" else "replica set",
+                "versions": [cluster["mongoDBVersion"]]}
+
+    def _list_clusters(self, query, body, base_url, project_id):
+        if project_id not in self._projects:
+            return 404, self._error(404, "GROUP_NOT_FOUND", f"No project with ID {project_id} exists")
+        return self._page(list(self._clusters[project_id].values()), query, base_url)
+
+    def _create_cluster(self, query, body, base_url, project_id):
+        if project_id not in self._projects:
+            return 404, self._error(404, "GROUP_NOT_FOUND", f"No project with ID {project_id} exists")
+        if not body or "name" not in body:
+            return 400, self._error(400, "MISSING_ATTRIBUTE", "The name attribute is required")
+        name = body["name"]
+        if name in self._clusters[project_id]:
+            return 409, self._error(409, "DUPLICATE_CLUSTER_NAME",
+                                    f"A cluster named {name} is already present in project {project_id}")
+        self._clusters[project_id][name] = self._make_cluster(project_id, name, body)
+        self._projects[project_id]["clusterCount"] += 1
+        self._transition(project_id, name, "CREATING", "IDLE")
+        return 201, self._clusters[project_id][name]
+
+    def _find_cluster(self, project_id, name):
+        if project_id not in self._projects:
+            return None, (404, self._error(404, "GROUP_NOT_FOUND", f"No project with ID {project_id} exists"))
+        if name not in self._clusters[project_id]:
+            return None, (404, self._error(404, "CLUSTER_NOT_FOUND",
+                                           f"No cluster named {name} exists in project {project_id}"))
+        return self._clusters[project_id][name], None
+
+    def _get_cluster(self, query, body, base_url, project_id, name):
+        cluster, error = self._find_cluster(project_id, name)
+        if error:
+            return error
+        return 200, cluster
+
+    def _modify_cluster(self, query, body, base_url, project_id, name):
+        cluster, error = self._find_cluster(project_id, name)
+        if error:
+            return error
+        body = body or {}
+        changes = {k: v for k, v in body.items() if k != "paused"}
+        if cluster["paused"] and changes and body.get("paused", True):
+            return 409, self._error(409, "CANNOT_UPDATE_PAUSED_CLUSTER",
+                                    f"Cluster {name} is paused and must be resumed before it is modified")
+        if "paused" in body and body["paused"] != cluster["paused"]:
+            cluster["paused"] = body["paused"]
+            self._transition(project_id, name, "REPAIRING", "IDLE")
+        if changes:
+            for k, v in changes.items():
+                if isinstance(v, dict) and isinstance(cluster.get(k), dict):
+                    cluster[k].update(v)
+                else:
+                    cluster[k] = v
+            self._transition(project_id, name, "UPDATING", "IDLE")
+        return 200, cluster
+
+    def _delete_cluster(self, query, body, base_url, project_id, name):
+        cluster, error = self._find_cluster(project_id, name)
+        if error:
+            return error
+        self._transition(project_id, name, "DELETING", None)
+        return 202, {}
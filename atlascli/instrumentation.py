@@ -0,0 +1,222 @@
+"""
+Request instrumentation
+~~~~~~~~~~~~~~~~~~~~~~~
+
+AtlasAPI calls every RequestHook it has been given before and after each
+request. A request here is one call to AtlasAPI.get(), post() etc. including
+any retries. The hook is passed a RequestEvent describing the request:
+its method, its templated endpoint (e.g. /groups/{id}/clusters/{name}), and
+once it has completed its status, size, retries and latency.
+
+HistogramCollector is a hook that keeps a latency histogram per endpoint
+so we can see where the time goes:
+
+    collector = HistogramCollector()
+    api = AtlasAPI(hooks=[collector])
+    ...
+    print(collector.report())
+
+Author:joe@joedrumgoole.com
+"""
+import logging
+import math
+import re
+import threading
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+ID_RE = re.compile(r"[0-9a-fA-F]{24}")
+
+# Collections whose members are addressed by name rather than by ID
+NAMED_COLLECTIONS = ("clusters", "databaseUsers", "byName")
+
+
+def endpoint_template(url: str, base_url: str = "") -> str:
+    """
+    Turn a request URL into the endpoint it addresses with the IDs and names
+    replaced by placeholders, e.g.
+
+    https://cloud.mongodb.com/api/atlas/v1.0/groups/5a14...8010/clusters/Demo?pageNum=2
+    becomes
+    /groups/{id}/clusters/{name}
+    """
+    if base_url and url.startswith(base_url):
+        path = url[len(base_url):]
+    else:
+        path = urlsplit(url).path
+    path = path.split("?", 1)[0]
+    segments = path.strip("/").split("/")
+    template = []
+    for i, segment in enumerate(segments):
+        if ID_RE.fullmatch(segment):
+            template.append("{id}")
+        elif i > 0 and segments[i - 1] in NAMED_COLLECTIONS:
+            template.append("{name}")
+        else:
+            template.append(segment)
+    return "/" + "/".join(template)
+
+
+class RequestEvent:
+    """
+    What a hook is told about a request. `status`, `bytes`, `latency` and
+    `error` are only set when after_request() is called.
+    """
+
+    __slots__ = ("method", "url", "endpoint", "status", "bytes", "retries", "throttled", "latency", "error")
+
+    def __init__(self, method: str, url: str, endpoint: str):
+        self.method = method
+        self.url = url
+        self.endpoint = endpoint
+        self.status: Optional[int] = None
+        self.bytes: Optional[int] = None  # response body size, None if it is unknown e.g. streamed
+        self.retries = 0  # resends after server errors and dropped connections
+        self.throttled = 0  # resends after 429 Too Many Requests
+        self.latency: Optional[float] = None  # seconds, including retries and waiting for the rate limiter
+        self.error: Optional[BaseException] = None  # set if no response was received
+
+    def __repr__(self):
+        return f"RequestEvent(method={self.method!r}, endpoint={self.endpoint!r}, status={self.status}, " \
+               f"bytes={self.bytes}, retries={self.retries}, throttled={self.throttled}, " \
+               f"latency={self.latency}, error={self.error!r})"
+
+
+class RequestHook:
+    """
+    Subclass and override either method. Hooks are called on the thread
+    that makes the request so they must be thread safe and quick. An
+    exception raised by a hook is logged and otherwise ignored.
+    """
+
+    def before_request(self, event: RequestEvent):
+        pass
+
+    def after_request(self, event: RequestEvent):
+        pass
+
+
+def call_hooks(hooks: List[RequestHook], name: str, event: RequestEvent):
+    for hook in hooks:
+        try:
+            getattr(hook, name)(event)
+        except Exception as e:
+            logging.getLogger(__name__).warning(f"{hook.__class__.__name__}.{name}() failed: {e!r}")
+
+
+class LatencyHistogram:
+    """
+    A histogram with logarithmic buckets, each GROWTH times wider than the
+    last, so percentiles are accurate to within GROWTH - 1 (5%) whatever
+    the range of latencies while memory stays bounded.
+    """
+
+    MIN = 1e-4  # seconds, everything faster lands in the first bucket
+    GROWTH = 1.05
+
+    def __init__(self):
+        self._buckets: Dict[int, int] = {}
+        self._count = 0
+        self._total = 0.0
+        self._max = 0.0
+
+    def record(self, seconds: float):
+        if seconds <= LatencyHistogram.MIN:
+            index = 0
+        else:
+            index = math.ceil(math.log(seconds / LatencyHistogram.MIN, LatencyHistogram.GROWTH))
+        self._buckets[index] = self._buckets.get(index, 0) + 1
+        self._count += 1
+        self._total += seconds
+        self._max = max(self._max, seconds)
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    @property
+    def mean(self) -> float:
+        return self._total / self._count if self._count else 0.0
+
+    @property
+    def max(self) -> float:
+        return self._max
+
+    def percentile(self, p: float) -> float:
+        """
+        :param p: 0 to 100
+        :return: the upper bound of the bucket holding the p'th percentile latency
+        """
+        if self._count == 0:
+            return 0.0
+        rank = max(1, math.ceil(self._count * p / 100))
+        seen = 0
+        for index in sorted(self._buckets):
+            seen += self._buckets[index]
+            if seen >= rank:
+                return min(LatencyHistogram.MIN * LatencyHistogram.GROWTH ** index, self._max)
+        return self._max
+
+
+class HistogramCollector(RequestHook):
+    """
+    Count requests and keep a latency histogram per method and endpoint.
+    """
+
+    PERCENTILES = (50, 95, 99)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, LatencyHistogram] = {}
+        self._totals: Dict[str, Dict[str, int]] = {}
+
+    def after_request(self, event: RequestEvent):
+        key = f"{event.method} {event.endpoint}"
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = LatencyHistogram()
+                self._totals[key] = {"errors": 0, "retries": 0, "throttled": 0, "bytes": 0}
+            histogram.record(event.latency)
+            totals = self._totals[key]
+            if event.error is not None or (event.status is not None and event.status >= 400):
+                totals["errors"] += 1
+            totals["retries"] += event.retries
+            totals["throttled"] += event.throttled
+            totals["bytes"] += event.bytes or 0
+
+    def stats(self) -> Dict[str, Dict]:
+        """
+        :return: for each "METHOD endpoint" the request count, errors, retries,
+        throttled resends, bytes received, mean and max latency and the
+        p50, p95 and p99 latencies in seconds
+        """
+        with self._lock:
+            result = {}
+            for key, histogram in self._histograms.items():
+                stats = {"count": histogram.count}
+                stats.update(self._totals[key])
+                stats["mean"] = histogram.mean
+                stats["max"] = histogram.max
+                for p in HistogramCollector.PERCENTILES:
+                    stats[f"p{p}"] = histogram.percentile(p)
+                result[key] = stats
+            return result
+
+    def report(self) -> str:
+        """
+        :return: the stats as a table, slowest endpoint (by p99) first
+        """
+        stats = self.stats()
+        width = max([len(k) for k in stats] + [len("endpoint")])
+        lines = [f"{'endpoint':<{width}} {'count':>6} {'errors':>6} {'retries':>7} "
+                 f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"]
+        for key, s in sorted(stats.items(), key=lambda kv: kv[1]["p99"], reverse=True):
+            lines.append(f"{key:<{width}} {s['count']:>6} {s['errors']:>6} {s['retries'] + s['throttled']:>7} "
+                         f"{s['p50'] * 1000:>8.1f} {s['p95'] * 1000:>8.1f} {s['p99'] * 1000:>8.1f}")
+        return "\n".join(lines)
+
+    def reset(self):
+        with self._lock:
+            self._histograms = {}
+            self._totals = {}
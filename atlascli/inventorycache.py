@@ -0,0 +1,263 @@
+"""
+On disk inventory cache
+~~~~~~~~~~~~~~~~~~~~~~~
+
+Every atlascli invocation needs the organization, its projects and their
+clusters before it can resolve a cluster name. InventoryCache keeps them in
+a local SQLite database, with the time each entity was fetched, so the next
+invocation can answer from disk while the data is younger than its max age:
+
+    cache = InventoryCache()
+    atlas_map = AtlasMap(org, api, cache=cache, max_age=300)
+
+Several atlascli processes may share one cache. Writers take an exclusive
+lock on a lock file next to the database (fcntl on POSIX, msvcrt on Windows)
+so one process's inventory is never interleaved with another's, and readers
+take a shared lock so they never see a half written inventory.
+
+Author:joe@joedrumgoole.com
+"""
+import contextlib
+import hashlib
+import os
+import sqlite3
+import time
+from typing import Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from atlascli import serializer
+from atlascli.atlascluster import AtlasCluster
+from atlascli.atlasorganization import AtlasOrganization
+from atlascli.atlasproject import AtlasProject
+from atlascli.inventoryindex import InventoryIndex
+
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS organizations (key_hash TEXT PRIMARY KEY, org_id TEXT, doc TEXT, fetched REAL);
+CREATE TABLE IF NOT EXISTS inventories (org_id TEXT PRIMARY KEY, fetched REAL);
+CREATE TABLE IF NOT EXISTS projects (id TEXT PRIMARY KEY, org_id TEXT, position INTEGER, doc TEXT, fetched REAL);
+CREATE INDEX IF NOT EXISTS projects_org_id ON projects (org_id);
+CREATE TABLE IF NOT EXISTS clusters (project_id TEXT, name TEXT, position INTEGER, doc TEXT, fetched REAL,
+                                     PRIMARY KEY (project_id, name));
+"""
+
+
+class FileLock:
+    """
+    An advisory lock on `filename`, held between processes. Each acquisition
+    opens the file afresh so threads in one process exclude each other too.
+    """
+
+    def __init__(self, filename: str):
+        self._filename = filename
+
+    @contextlib.contextmanager
+    def acquire(self, shared: bool = False) -> Iterator[None]:
+        with open(self._filename, "a+") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            else:
+                # msvcrt only has exclusive locks. LK_LOCK retries for 10s.
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+                else:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class InventoryCache:
+
+    DEFAULT_FILENAME = os.path.join(os.path.expanduser("~"), ".atlascli", "inventory.db")
+
+    def __init__(self, filename: str = DEFAULT_FILENAME, clock: Callable[[], float] = time.time):
+        """
+        :param filename: the SQLite database, created if it does not exist
+        :param clock: wall clock time source, the cache outlives the process
+        """
+        self._filename = filename
+        self._clock = clock
+        directory = os.path.dirname(os.path.abspath(filename))
+        os.makedirs(directory, exist_ok=True)
+        self._lock = FileLock(f"{filename}.lock")
+        with self._lock.acquire():
+            with self._connect() as db:
+                if db.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                    for table in ("organizations", "inventories", "projects", "clusters"):
+                        db.execute(f"DROP TABLE IF EXISTS {table}")
+                    db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+                db.executescript(SCHEMA)
+
+    @property
+    def filename(self) -> str:
+        return self._filename
+
+    @contextlib.contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        #
+        # A connection per call so the cache can be used from any thread.
+        # The connection's context manager commits or rolls back.
+        #
+        db = sqlite3.connect(self._filename, timeout=30)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    @staticmethod
+    def _key_hash(public_key: str) -> str:
+        return hashlib.sha256(public_key.encode("utf-8")).hexdigest()
+
+    def get_organization(self, public_key: str) -> Optional[Tuple[AtlasOrganization, float]]:
+        """
+        :return: the organization last fetched with `public_key` and its age
+        in seconds, or None
+        """
+        with self._lock.acquire(shared=True), self._connect() as db:
+            row = db.execute("SELECT doc, fetched FROM organizations WHERE key_hash = ?",
+                             (self._key_hash(public_key),)).fetchone()
+        if row is None:
+            return None
+        return AtlasOrganization(serializer.loads(row[0])), self._clock() - row[1]
+
+    def put_organization(self, public_key: str, org: AtlasOrganization):
+        with self._lock.acquire(), self._connect() as db:
+            db.execute("INSERT OR REPLACE INTO organizations VALUES (?, ?, ?, ?)",
+                       (self._key_hash(public_key), org.id, serializer.dumps(org.resource), self._clock()))
+
+    def get_inventory(self, org_id: str) -> Optional[Tuple[InventoryIndex, float]]:
+        """
+        :return: the projects and clusters of `org_id` and the age in seconds
+        of the oldest of them, or None if they have not been saved
+        """
+        with self._lock.acquire(shared=True), self._connect() as db:
+            row = db.execute("SELECT fetched FROM inventories WHERE org_id = ?", (org_id,)).fetchone()
+            if row is None:
+                return None
+            oldest = row[0]
+            projects = {}
+            project_clusters = {}
+            for doc, fetched in db.execute("SELECT doc, fetched FROM projects WHERE org_id = ? ORDER BY position",
+                                           (org_id,)):
+                project = AtlasProject(serializer.loads(doc))
+                projects[project.id] = project
+                project_clusters[project.id] = {}
+                oldest = min(oldest, fetched)
+            for project_id, doc, fetched in db.execute(
+                    "SELECT c.project_id, c.doc, c.fetched FROM clusters c JOIN projects p ON c.project_id = p.id "
+                    "WHERE p.org_id = ? ORDER BY p.position, c.position", (org_id,)):
+                cluster = serializer.loads(doc)
+                project_clusters[project_id][cluster["name"]] = AtlasCluster(project_id, cluster["name"], cluster)
+                oldest = min(oldest, fetched)
+        return InventoryIndex(projects, project_clusters), self._clock() - oldest
+
+    def get_cluster(self, project_id: str, name: str) -> Optional[Dict]:
+        """
+        :return: the saved document of one cluster, or None
+        """
+        with self._lock.acquire(shared=True), self._connect() as db:
+            row = db.execute("SELECT doc FROM clusters WHERE project_id = ? AND name = ?",
+                             (project_id, name)).fetchone()
+        return serializer.loads(row[0]) if row else None
+
+    def put_inventory(self, org_id: str, index: InventoryIndex):
+        """
+        Replace the saved projects and clusters of `org_id` with those in `index`.
+        """
+        #
+        # Encode the documents before taking the lock. A CompactCluster may
+        # have to load its document, from this cache, to be encoded.
+        #
+        now = self._clock()
+        project_rows = [(project.id, org_id, position, serializer.dumps(project.resource), now)
+                        for position, project in enumerate(index.projects.values())]
+        cluster_rows = [(project_id, name, position, serializer.dumps(cluster.resource), now)
+                        for project_id, clusters in index.project_clusters.items()
+                        for position, (name, cluster) in enumerate(clusters.items())]
+        with self._lock.acquire(), self._connect() as db:
+            db.execute("DELETE FROM clusters WHERE project_id IN (SELECT id FROM projects WHERE org_id = ?)",
+                       (org_id,))
+            db.execute("DELETE FROM projects WHERE org_id = ?", (org_id,))
+            db.executemany("INSERT OR REPLACE INTO projects VALUES (?, ?, ?, ?, ?)", project_rows)
+            db.executemany("INSERT OR REPLACE INTO clusters VALUES (?, ?, ?, ?, ?)", cluster_rows)
+            db.execute("INSERT OR REPLACE INTO inventories VALUES (?, ?)", (org_id, now))
+
+    def put_projects(self, org_id: str, projects: Iterable[AtlasProject]):
+        """
+        Replace the saved projects of `org_id`, dropping the clusters of those
+        that are gone, and mark the inventory as fetched now. The clusters of
+        `projects` are saved separately, one project at a time with put_clusters().
+        """
+        now = self._clock()
+        project_rows = [(project.id, org_id, position, serializer.dumps(project.resource), now)
+                        for position, project in enumerate(projects)]
+        with self._lock.acquire(), self._connect() as db:
+            kept = {row[0] for row in project_rows}
+            saved = db.execute("SELECT id FROM projects WHERE org_id = ?", (org_id,)).fetchall()
+            gone = [(project_id,) for project_id, in saved if project_id not in kept]
+            db.executemany("DELETE FROM clusters WHERE project_id = ?", gone)
+            db.execute("DELETE FROM projects WHERE org_id = ?", (org_id,))
+            db.executemany("INSERT OR REPLACE INTO projects VALUES (?, ?, ?, ?, ?)", project_rows)
+            db.execute("INSERT OR REPLACE INTO inventories VALUES (?, ?)", (org_id, now))
+
+    def put_cluster(self, cluster: AtlasCluster):
+        """
+        Add or replace one cluster of an inventory that has been saved, e.g.
+        after it has been created or modified.
+        """
+        doc = serializer.dumps(cluster.resource)
+        with self._lock.acquire(), self._connect() as db:
+            db.execute("INSERT INTO clusters VALUES (?, ?, "
+                       "(SELECT COALESCE(MAX(position) + 1, 0) FROM clusters WHERE project_id = ?), ?, ?) "
+                       "ON CONFLICT (project_id, name) DO UPDATE SET doc = excluded.doc, fetched = excluded.fetched",
+                       (cluster.project_id, cluster.name, cluster.project_id, doc, self._clock()))
+
+    def put_clusters(self, project_id: str, clusters: Dict[str, AtlasCluster]):
+        """
+        Replace the saved clusters of one project, e.g. after it has been
+        refreshed on its own.
+        """
+        now = self._clock()
+        rows = [(project_id, name, position, serializer.dumps(cluster.resource), now)
+                for position, (name, cluster) in enumerate(clusters.items())]
+        with self._lock.acquire(), self._connect() as db:
+            db.execute("DELETE FROM clusters WHERE project_id = ?", (project_id,))
+            db.executemany("INSERT INTO clusters VALUES (?, ?, ?, ?, ?)", rows)
+
+    def update_inventory(self, org_id: str, changed: Iterable[AtlasCluster],
+                         removed: Iterable[Tuple[str, str]] = ()):
+        """
+        Save the clusters of `org_id` that have changed, delete the
+        (project id, name) pairs in `removed` and mark the rest of the
+        inventory as fetched now, because it has just been checked.
+        """
+        now = self._clock()
+        rows = [(c.project_id, c.name, c.project_id, serializer.dumps(c.resource), now) for c in changed]
+        with self._lock.acquire(), self._connect() as db:
+            db.executemany("DELETE FROM clusters WHERE project_id = ? AND name = ?", removed)
+            db.executemany("INSERT INTO clusters VALUES (?, ?, "
+                           "(SELECT COALESCE(MAX(position) + 1, 0) FROM clusters WHERE project_id = ?), ?, ?) "
+                           "ON CONFLICT (project_id, name) DO UPDATE SET doc = excluded.doc", rows)
+            db.execute("UPDATE clusters SET fetched = ? WHERE project_id IN (SELECT id FROM projects WHERE org_id = ?)",
+                       (now, org_id))
+            db.execute("UPDATE projects SET fetched = ? WHERE org_id = ?", (now, org_id))
+            db.execute("UPDATE inventories SET fetched = ? WHERE org_id = ?", (now, org_id))
+
+    def clear(self):
+        with self._lock.acquire(), self._connect() as db:
+            for table in ("organizations", "inventories", "projects", "clusters"):
+                db.execute(f"DELETE FROM {table}")
+
+    def __repr__(self):
+        return f"InventoryCache(filename={self._filename!r})"
@@ -0,0 +1,116 @@
+"""
+Inventory index
+~~~~~~~~~~~~~~~
+
+An InventoryIndex holds the projects of an organization and, once they have
+been fetched, the clusters of each project, together with the hash indexes
+AtlasMap answers its lookups from:
+
+    projects            project id -> project
+    project_ids_by_name project name -> [project id, ...]
+    project_clusters    project id -> cluster name -> cluster
+    clusters_by_name    cluster name -> [cluster, ...] in project order
+
+An index is never modified once it has been built. AtlasMap replaces its
+index with a new one in a single assignment, so a reader always sees one
+consistent inventory. The with_* methods build the new index from the old
+one, reusing everything the change does not touch.
+
+Author:joe@joedrumgoole.com
+"""
+from typing import Dict, List, Optional
+
+from atlascli.atlascluster import AtlasCluster
+from atlascli.atlasproject import AtlasProject
+
+
+class InventoryIndex:
+
+    __slots__ = ("projects", "project_ids_by_name", "project_clusters", "clusters", "clusters_by_name")
+
+    def __init__(self, projects: Dict[str, AtlasProject],
+                 project_clusters: Dict[str, Dict[str, AtlasCluster]] = None):
+        """
+        :param projects: every project by ID
+        :param project_clusters: the clusters of every project by project ID
+        and cluster name, or None if the clusters have not been fetched
+        """
+        self.projects = projects
+        self.project_ids_by_name: Dict[str, List[str]] = {}
+        for project_id, project in projects.items():
+            self.project_ids_by_name.setdefault(project.name, []).append(project_id)
+
+        self.project_clusters = project_clusters
+        self.clusters: Optional[List[AtlasCluster]] = None
+        self.clusters_by_name: Optional[Dict[str, List[AtlasCluster]]] = None
+        if project_clusters is not None:
+            self.clusters = [c for clusters in project_clusters.values() for c in clusters.values()]
+            self.clusters_by_name = {}
+            for cluster in self.clusters:
+                self.clusters_by_name.setdefault(cluster.name, []).append(cluster)
+
+    @property
+    def has_clusters(self) -> bool:
+        return self.project_clusters is not None
+
+    def project_name(self, project_id: str) -> Optional[str]:
+        project = self.projects.get(project_id)
+        return project.name if project else None
+
+    def project_id(self, project_name: str) -> Optional[str]:
+        """
+        :return: the ID of the first project called `project_name`, or None
+        """
+        project_ids = self.project_ids_by_name.get(project_name)
+        return project_ids[0] if project_ids else None
+
+    def cluster(self, project_id: str, name: str) -> Optional[AtlasCluster]:
+        return self.project_clusters.get(project_id, {}).get(name)
+
+    def clusters_named(self, name: str) -> List[AtlasCluster]:
+        return self.clusters_by_name.get(name, [])
+
+    def cluster_project_ids(self, name: str) -> List[str]:
+        return [c.project_id for c in self.clusters_named(name)]
+
+    def with_clusters(self, project_id: str, clusters: Dict[str, AtlasCluster]) -> "InventoryIndex":
+        """
+        :return: a new index in which the clusters of `project_id` are `clusters`
+        """
+        project_clusters = dict(self.project_clusters)
+        project_clusters[project_id] = clusters
+        index = InventoryIndex.__new__(InventoryIndex)
+        index.projects = self.projects
+        index.project_ids_by_name = self.project_ids_by_name
+        index.project_clusters = project_clusters
+        index.clusters = [c for cs in project_clusters.values() for c in cs.values()]
+        #
+        # Only the names in this project can have changed. Rebuild their
+        # entries from the flat list so they stay in project order.
+        #
+        names = set(self.project_clusters.get(project_id, {})) | set(clusters)
+        index.clusters_by_name = {k: v for k, v in self.clusters_by_name.items() if k not in names}
+        for cluster in index.clusters:
+            if cluster.name in names:
+                index.clusters_by_name.setdefault(cluster.name, []).append(cluster)
+        return index
+
+    def with_cluster(self, cluster: AtlasCluster) -> "InventoryIndex":
+        """
+        :return: a new index in which `cluster` is added or replaced
+        """
+        clusters = dict(self.project_clusters.get(cluster.project_id, {}))
+        clusters[cluster.name] = cluster
+        return self.with_clusters(cluster.project_id, clusters)
+
+    def without_cluster(self, project_id: str, name: str) -> "InventoryIndex":
+        """
+        :return: a new index without the cluster `name` of `project_id`
+        """
+        clusters = dict(self.project_clusters.get(project_id, {}))
+        clusters.pop(name, None)
+        return self.with_clusters(project_id, clusters)
+
+    def __repr__(self):
+        clusters = len(self.clusters) if self.clusters is not None else None
+        return f"InventoryIndex(projects={len(self.projects)}, clusters={clusters})"
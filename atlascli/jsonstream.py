@@ -0,0 +1,138 @@
+"""
+Incremental decoding of paged results
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+A page of Atlas results is a JSON object whose `results` field holds up to
+500 documents. Rather than reading the whole body and decoding it in one go
+we decode the body as it arrives and hand back each element of `results` as
+soon as it is complete. Only the element being decoded and the unread part
+of the current chunk are held in memory.
+
+The other top level fields, `links` and `totalCount`, are collected into an
+envelope dict so the caller can find the next page once the results have
+been consumed.
+
+Author:joe@joedrumgoole.com
+"""
+import codecs
+import json
+from typing import Any, Dict, Generator, Iterable, Union
+
+WHITESPACE = " \t\n\r"
+DELIMITERS = ",]}:"
+
+
+class _Buffer:
+    #
+    # The unconsumed text of the body plus the chunks still to come
+    #
+
+    def __init__(self, chunks: Iterable[Union[bytes, str]]):
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self.text = ""
+        self.pos = 0
+        self.eof = False
+
+    def more(self) -> bool:
+        """
+        Append the next chunk, discarding the text already consumed.
+        :return: False if there is nothing left to read
+        """
+        if self.eof:
+            return False
+        self.text = self.text[self.pos:]
+        self.pos = 0
+        for chunk in self._chunks:
+            if isinstance(chunk, bytes):
+                chunk = self._decoder.decode(chunk)
+            if chunk:
+                self.text += chunk
+                return True
+        self.text += self._decoder.decode(b"", final=True)
+        self.eof = True
+        return True
+
+    def peek(self) -> str:
+        """
+        :return: the next character that is not whitespace, or "" at the end of the body
+        """
+        while True:
+            while self.pos < len(self.text) and self.text[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self.more():
+                return ""
+
+    def expect(self, chars: str) -> str:
+        c = self.peek()
+        if c == "" or c not in chars:
+            raise json.JSONDecodeError(f"Expecting one of '{chars}'", self.text, self.pos)
+        self.pos += 1
+        return c
+
+
+def _decode_value(buf: _Buffer, decoder: json.JSONDecoder) -> Any:
+    #
+    # Every value we decode is followed by one of ',]}:' so until we can see
+    # that delimiter the value may be truncated, e.g. "1.5e10" split after
+    # "1.5e" decodes as 1.5, and we read more before trusting it.
+    #
+    buf.peek()
+    while True:
+        try:
+            value, end = decoder.raw_decode(buf.text, buf.pos)
+            after = end
+            while after < len(buf.text) and buf.text[after] in WHITESPACE:
+                after += 1
+            if buf.eof or (after < len(buf.text) and buf.text[after] in DELIMITERS):
+                buf.pos = end
+                return value
+        except json.JSONDecodeError:
+            if buf.eof:
+                raise
+        buf.more()
+
+
+def iter_results(chunks: Iterable[Union[bytes, str]], envelope: Dict = None,
+                 field: str = "results") -> Generator[Any, None, None]:
+    """
+    Yield each element of the `field` array of a JSON object as it is decoded.
+
+    :param chunks: the body as an iterable of bytes (UTF-8) or str e.g. `Response.iter_content()`
+    :param envelope: if supplied, receives every other top level field of the object
+    :param field: the name of the array to stream
+    :raise json.JSONDecodeError: if the body is not a JSON object
+    :raise KeyError: if the object has no `field` array
+    """
+    if envelope is None:
+        envelope = {}
+    decoder = json.JSONDecoder()
+    buf = _Buffer(chunks)
+
+    seen = False
+    buf.expect("{")
+    if buf.peek() == "}":
+        raise KeyError(field)
+    while True:
+        key = _decode_value(buf, decoder)
+        if not isinstance(key, str):
+            raise json.JSONDecodeError("Expecting property name", buf.text, buf.pos)
+        buf.expect(":")
+        if key == field and buf.peek() == "[":
+            buf.pos += 1
+            seen = True
+            if buf.peek() == "]":
+                buf.pos += 1
+            else:
+                while True:
+                    yield _decode_value(buf, decoder)
+                    if buf.expect(",]") == "]":
+                        break
+        else:
+            envelope[key] = _decode_value(buf, decoder)
+        if buf.expect(",}") == "}":
+            break
+    if not seen:
+        raise KeyError(field)
@@ -25,6 +25,8 @@ Author: Joe.Drumgoole@mongodb.com
 """
 import argparse
 import configparser
+import sqlite3
+import subprocess
 
 import requests
 import os
@@ -39,13 +41,17 @@ from atlascli.clusterid import ClusterID, ProjectID
 
 from atlascli.errors import AtlasError, AtlasGetError
 from atlascli.atlasapi import AtlasAPI
+from atlascli.cassette import RecordingTransport, ReplayTransport
 from atlascli.config import Config, initialise
+from atlascli.deadline import Deadline
+from atlascli.instrumentation import HistogramCollector
+from atlascli.inventorycache import InventoryCache
+from atlascli.transport import RequestsTransport
 from atlascli.version import __VERSION__
 
 from atlascli.atlasmap import AtlasMap
 from atlascli.commands import Commands
 
-
 def main(argv : list[str] = None):
 
     parser = argparse.ArgumentParser(description=
@@ -62,6 +68,37 @@ def main(argv : list[str] = None):
 
     parser.add_argument("-cfg", "--configfile", help="path to a config file containing API keys")
     parser.add_argument("-do", "--defaultorg", help="Use API keys associated with this organization")
+    parser.add_argument("--timeout", type=float, default=AtlasAPI.DEFAULT_TIMEOUT[1],
+                        help="Seconds to wait for a response to any single Atlas API request "
+                             "[default: %(default)s]")
+    parser.add_argument("--record", metavar="CASSETTE",
+                        help="Record the Atlas API requests and responses, with keys and IDs redacted, "
+                             "to this file")
+    parser.add_argument("--replay", metavar="CASSETTE",
+                        help="Answer Atlas API requests from a file written by --record instead of Atlas")
+    parser.add_argument("--realtime", default=False, action="store_true",
+                        help="With --replay, take as long over each request as it took when it was recorded")
+    parser.add_argument("--workers", type=int, default=8,
+                        help="Fetch the clusters of this many projects at the same time [default: %(default)s]")
+    parser.add_argument("--cache", metavar="FILE", default=InventoryCache.DEFAULT_FILENAME,
+                        help="Keep the organization's projects and clusters in this SQLite file between runs "
+                             "[default: %(default)s]")
+    parser.add_argument("--max-age", type=float, default=AtlasMap.DEFAULT_MAX_AGE,
+                        help="Use the cached projects and clusters if they were fetched less than this many "
+                             "seconds ago [default: %(default)s]")
+    parser.add_argument("--max-stale", type=float, default=AtlasMap.DEFAULT_MAX_STALE,
+                        help="Use the cached projects and clusters if they were fetched less than this many "
+                             "seconds ago and refresh them in the background [default: %(default)s]")
+    parser.add_argument("--compact", default=False, action="store_true",
+                        help="Keep only the cluster fields atlascli lists in memory and load the rest on demand, "
+                             "for very large organizations")
+    parser.add_argument("--max-documents", type=int, default=AtlasMap.DEFAULT_MAX_DOCUMENTS,
+                        help="With --compact, keep at most this many full cluster documents in memory "
+                             "[default: %(default)s]")
+    parser.add_argument("--refresh", default=False, action="store_true",
+                        help="Fetch the projects and clusters from Atlas even if they are cached")
+    parser.add_argument("--stats", default=False, action="store_true",
+                        help="Print request counts and p50/p95/p99 latencies for each Atlas API endpoint at exit")
 
     # parser.add_argument("--defaultcluster", default=False, action="store_true",
     #                     help="Print out the default cluster we use to create clusters with the create command")
@@ -88,11 +125,17 @@ def main(argv : list[str] = None):
     pause_parser.add_argument('-c', '--cluster_name', type=ClusterID.validate_cluster_name, nargs="*",
                               help="List of Cluster names to pause")
 
+    pause_parser.add_argument('--deadline', type=float,
+                              help="Give up on any clusters not paused within this many seconds")
+
     resume_parser = subparsers.add_parser('resume', help="Resume a cluster")
 
     resume_parser.add_argument('-c', '--cluster_name', type=ClusterID.validate_cluster_name, nargs="*",
                                help="List of Cluster names to resume")
 
+    resume_parser.add_argument('--deadline', type=float,
+                               help="Give up on any clusters not resumed within this many seconds")
+
     list_parser = subparsers.add_parser(name='list', help="List organizations, projects and/or clusters")
 
     list_parser.add_argument('-c', '--cluster_name', type=ClusterID.validate_cluster_name, nargs="*",
@@ -146,6 +189,8 @@ def main(argv : list[str] = None):
     parser.add_argument("-d", "--debug", default=False, action="store_true",
                         help="Turn on logging at debug level")
 
+    subparsers.add_parser("refresh", help="Fetch the projects and clusters from Atlas and save them in the cache")
+
     config_parser = subparsers.add_parser("config", help="Configure the config file for storing API keys")
 
     config_parser.add_argument("-i", "--initialize", action="store_true", default=False,
@@ -183,19 +228,105 @@ def main(argv : list[str] = None):
         print(e)
         sys.exit(1)
 
-    api = AtlasAPI()
+    transport = None
+    if args.replay:
+        transport = ReplayTransport(args.replay, realtime=args.realtime)
+    elif args.record:
+        transport = RecordingTransport(RequestsTransport(AtlasAPI.make_session()), args.record)
+
+    collector = HistogramCollector() if args.stats else None
+
+    api = AtlasAPI(timeout=(AtlasAPI.DEFAULT_TIMEOUT[0], args.timeout), stream_pages=True, transport=transport,
+                   hooks=[collector] if collector else None)
 
-    api.authenticate(AtlasKey(config.get_public_key(), config.get_private_key()))
+    #
+    # Recording and replaying must see every request so they bypass the cache
+    #
+    cache = None
+    if not (args.record or args.replay):
+        try:
+            cache = InventoryCache(args.cache)
+        except (sqlite3.Error, OSError) as e:
+            logging.warning(f"Not caching the inventory, cannot open {args.cache}: {e}")
 
     try:
-        org = api.get_this_organization()
+        run(args, api, config, cache)
+    finally:
+        api.close()  # also saves the cassette when recording
+        if collector:
+            print(collector.report(), file=sys.stderr)
+
+
+def print_progress(project, done: int, total: int):
+    print(f"\rFetched the clusters of {done}/{total} projects", end="\n" if done == total else "",
+          file=sys.stderr, flush=True)
+
+
+def get_organization(api: AtlasAPI, public_key: str, cache: InventoryCache, max_age: float):
+    if cache:
+        try:
+            cached = cache.get_organization(public_key)
+            if cached and cached[1] <= max_age:
+                return cached[0]
+        except (sqlite3.Error, OSError) as e:
+            logging.warning(f"Cannot read the inventory cache {cache.filename}: {e}")
+
+    org = api.get_this_organization()
+    if cache:
+        try:
+            cache.put_organization(public_key, org)
+        except (sqlite3.Error, OSError) as e:
+            logging.warning(f"Cannot write the inventory cache {cache.filename}: {e}")
+    return org
+
+
+def refresh_in_background(args, key: AtlasKey):
+    #
+    # Refresh a stale cached inventory in a detached `atlascli refresh` so
+    # this process can exit as soon as its command is done. The keys go
+    # through the environment so they do not show up in the process list.
+    #
+    def on_stale(atlas_map: AtlasMap):
+        env = dict(os.environ, **{Config.PUBLIC_KEY_ENV: key.public_key, Config.PRIVATE_KEY_ENV: key.private_key})
+        command = [sys.executable, "-m", "atlascli.main", "--cache", args.cache, "--workers", str(args.workers),
+                   "--timeout", str(args.timeout), "refresh"]
+        detach = {"creationflags": subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP} \
+            if os.name == "nt" else {"start_new_session": True}
+        try:
+            subprocess.Popen(command, env=env, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                             stderr=subprocess.DEVNULL, **detach)
+        except OSError as e:
+            logging.warning(f"Cannot refresh the inventory cache in the background: {e}")
+
+    return on_stale
+
+
+def run(args, api: AtlasAPI, config: Config, cache: InventoryCache = None):
+
+    if args.replay:
+        key = AtlasKey("replay", "replay")  # the cassette never sees the keys
+    else:
+        key = AtlasKey(config.get_public_key(), config.get_private_key())
+    api.authenticate(key)
+
+    max_age = 0 if args.refresh else args.max_age
+    max_stale = None if args.refresh else args.max_stale
+    try:
+        org = get_organization(api, key.public_key, cache, max(max_age, max_stale or 0))
     except AtlasError:
         raise SystemExit(f"Your Atlas programmatic keys may be invalid.  Please check the values for "
                          f"ATLAS_PRIVATE_KEY and ATLAS_PUBLIC_KEY or the contents of your"
                          f"configuration file {Fore.LIGHTWHITE_EX}{config.filename}")
 
-    atlas_map = AtlasMap(org, api)
+    atlas_map = AtlasMap(org, api, workers=args.workers, org_wide=True, cache=cache, max_age=max_age,
+                         max_stale=max_stale, compact=args.compact, max_documents=args.max_documents,
+                         progress=print_progress if sys.stderr.isatty() else None,
+                         on_stale=refresh_in_background(args, key))
     commands = Commands(atlas_map)
+    dispatch(args, config, atlas_map, commands)
+
+
+def dispatch(args, config: Config, atlas_map: AtlasMap, commands: Commands):
 
     if args.subparser_name == "config":
 
@@ -240,10 +371,13 @@ def main(argv : list[str] = None):
             commands.delete_project_cmd(args.project_name)
 
     if args.subparser_name == "pause" :
-        commands.pause_cmd(args.cluster_name)
+        commands.pause_cmd(args.cluster_name, Deadline(args.deadline) if args.deadline else None)
 
     if args.subparser_name == "resume":
-        commands.resume_cmd(args.cluster_name)
+        commands.resume_cmd(args.cluster_name, Deadline(args.deadline) if args.deadline else None)
+
+    if args.subparser_name == "refresh":
+        atlas_map.populate_cluster_map()
 
     if args.subparser_name == "list":
         if args.cluster_name is not None and (len(args.cluster_name) == 0):
@@ -0,0 +1,208 @@
+"""
+Client side rate limiting
+~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Atlas limits the number of requests a programmatic key can make, both
+overall and per project. Rather than firing requests until the server
+answers 429 Too Many Requests, the AtlasAPI passes every request through a
+RateLimiter. The limiter holds a token bucket for the whole key and one per
+project. A bucket refills at `rate` tokens per second up to `burst` tokens,
+so short bursts go straight through and longer runs are smoothed out to
+the configured rate. A bucket can also be blocked for a period, which is
+how a Retry-After header from the server is honoured.
+
+Author:joe@joedrumgoole.com
+"""
+import threading
+import time
+from typing import Dict
+
+from atlascli.errors import AtlasDeadlineExceededError
+
+EPSILON = 1e-9  # tolerance for floating point error in the token count
+
+
+class TokenBucket:
+
+    def __init__(self, rate: float = None, burst: int = None, clock=time.monotonic):
+        """
+        :param rate: tokens added per second. None means no limit, in which case
+        the bucket only enforces blocks.
+        :param burst: the maximum number of tokens the bucket holds. Defaults to
+        one second's worth of tokens.
+        """
+        if rate is not None and rate <= 0:
+            raise ValueError("'rate' must be greater than 0")
+        self._rate = rate
+        if burst is None:
+            burst = max(1, int(rate)) if rate else 1
+        if burst < 1:
+            raise ValueError("'burst' must be at least 1")
+        self._burst = burst
+        self._clock = clock
+        self._tokens = float(burst)
+        self._last = clock()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def rate(self):
+        return self._rate
+
+    @property
+    def burst(self):
+        return self._burst
+
+    def try_acquire(self) -> float:
+        """
+        Take a token if one is available.
+
+        :return: 0 if a token was taken, otherwise the number of seconds to wait
+        before trying again
+        """
+        with self._lock:
+            now = self._clock()
+            if now < self._blocked_until:
+                return self._blocked_until - now
+            if self._rate is None:
+                return 0
+
+            self._tokens = min(self._burst, self._tokens + (now - self._last) * self._rate)
+            self._last = now
+            if self._tokens >= 1 - EPSILON:
+                self._tokens = max(0.0, self._tokens - 1)
+                return 0
+            return (1 - self._tokens) / self._rate
+
+    def block(self, seconds: float):
+        """
+        Refuse tokens for the next `seconds` seconds and start refilling from
+        empty once the block ends.
+        """
+        with self._lock:
+            now = self._clock()
+            self._blocked_until = max(self._blocked_until, now + seconds)
+            self._tokens = 0.0
+            self._last = self._blocked_until
+
+    def __repr__(self):
+        return f"TokenBucket(rate={self._rate}, burst={self._burst})"
+
+
+class RateLimiter:
+
+    def __init__(self,
+                 rate: float = None,
+                 burst: int = None,
+                 project_rate: float = None,
+                 project_burst: int = None,
+                 project_rates: Dict[str, float] = None,
+                 clock=time.monotonic,
+                 sleep=time.sleep):
+        """
+        :param rate: requests per second allowed across all projects. None is unlimited.
+        :param burst: requests that may be sent at once before `rate` applies
+        :param project_rate: requests per second allowed for any single project
+        :param project_burst: burst size for each project
+        :param project_rates: per project overrides of `project_rate` keyed by project ID
+        """
+        self._clock = clock
+        self._sleep = sleep
+        self._global = TokenBucket(rate, burst, clock)
+        self._project_rate = project_rate
+        self._project_burst = project_burst
+        self._project_rates = dict(project_rates) if project_rates else {}
+        self._projects: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+        self._acquired = 0
+        self._waiting = 0
+        self._max_waiting = 0
+        self._delayed = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._throttled = 0
+
+    def _project_bucket(self, project_id: str) -> TokenBucket:
+        with self._lock:
+            bucket = self._projects.get(project_id)
+            if bucket is None:
+                rate = self._project_rates.get(project_id, self._project_rate)
+                bucket = TokenBucket(rate, self._project_burst, self._clock)
+                self._projects[project_id] = bucket
+            return bucket
+
+    def _buckets(self, project_id: str = None):
+        if project_id is None:
+            return [self._global]
+        return [self._global, self._project_bucket(project_id)]
+
+    def acquire(self, project_id: str = None, timeout: float = None) -> float:
+        """
+        Block until a request for `project_id` (or for no particular project)
+        may be sent.
+
+        :param timeout: raise AtlasDeadlineExceededError rather than wait
+        longer than this many seconds
+        :return: the number of seconds we waited
+        """
+        waited = 0.0
+        queued = False
+        try:
+            for bucket in self._buckets(project_id):
+                while True:
+                    wait = bucket.try_acquire()
+                    if wait <= 0:
+                        break
+                    if timeout is not None and waited + wait >= timeout:
+                        raise AtlasDeadlineExceededError(f"rate limited for longer than {timeout:.2f}s")
+                    if not queued:
+                        queued = True
+                        with self._lock:
+                            self._waiting += 1
+                            self._max_waiting = max(self._max_waiting, self._waiting)
+                    self._sleep(wait)
+                    waited += wait
+        finally:
+            with self._lock:
+                if queued:
+                    self._waiting -= 1
+                    self._delayed += 1
+                self._acquired += 1
+                self._total_wait += waited
+                self._max_wait = max(self._max_wait, waited)
+        return waited
+
+    def retry_after(self, seconds: float, project_id: str = None):
+        """
+        The server told us to back off for `seconds`. Block the project bucket
+        if the request was for a project, otherwise block every request.
+        """
+        with self._lock:
+            self._throttled += 1
+        if project_id is None:
+            self._global.block(seconds)
+        else:
+            self._project_bucket(project_id).block(seconds)
+
+    @property
+    def queue_depth(self) -> int:
+        return self._waiting
+
+    def metrics(self) -> Dict:
+        """
+        :return: a snapshot of the limiter's counters. `waiting` is the current
+        queue depth and wait times are in seconds.
+        """
+        with self._lock:
+            return {"acquired": self._acquired,
+                    "delayed": self._delayed,
+                    "waiting": self._waiting,
+                    "max_waiting": self._max_waiting,
+                    "total_wait": self._total_wait,
+                    "max_wait": self._max_wait,
+                    "throttled": self._throttled}
+
+    def __repr__(self):
+        return f"RateLimiter(rate={self._global.rate}, burst={self._global.burst}, " \
+               f"project_rate={self._project_rate}, project_burst={self._project_burst})"
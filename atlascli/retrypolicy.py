@@ -0,0 +1,193 @@
+"""
+Retries and circuit breaking
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+A RetryPolicy decides whether a failed request to Atlas should be sent
+again and how long to wait first. Only requests that are safe to repeat
+are retried: GETs, plus any request the caller marks as idempotent (such
+as the PATCH that pauses or resumes a cluster). Delays grow exponentially
+with full jitter so that many clients recovering at once do not retry in
+lock step, and a retry budget caps retries to a fraction of all requests
+so that a struggling server is not hit with a retry storm.
+
+A CircuitBreaker counts consecutive failures. Once it opens, requests fail
+immediately with AtlasCircuitOpenError until `reset_timeout` has passed,
+after which a single trial request is let through to see if Atlas is back.
+
+Author:joe@joedrumgoole.com
+"""
+import random
+import threading
+import time
+from enum import Enum
+
+from atlascli.errors import AtlasCircuitOpenError
+
+
+class RetryPolicy:
+
+    RETRY_STATUS = (500, 502, 503, 504)
+    RETRY_METHODS = ("GET", "HEAD", "OPTIONS")
+
+    def __init__(self,
+                 max_retries: int = 3,
+                 backoff: float = 0.5,
+                 max_backoff: float = 30.0,
+                 jitter: bool = True,
+                 budget_ratio: float = 0.2,
+                 budget_min: int = 10,
+                 rand=random.random,
+                 sleep=time.sleep):
+        """
+        :param max_retries: retries allowed for a single request
+        :param backoff: delay before the first retry in seconds. Doubles on each retry.
+        :param max_backoff: upper bound on the delay between retries
+        :param jitter: pick a random delay between 0 and the backoff ("full jitter")
+        :param budget_ratio: retries may not exceed this fraction of requests...
+        :param budget_min: ...plus this many, so a quiet client can still retry
+        """
+        if max_retries < 0:
+            raise ValueError("'max_retries' cannot be negative")
+        self._max_retries = max_retries
+        self._backoff = backoff
+        self._max_backoff = max_backoff
+        self._jitter = jitter
+        self._budget_ratio = budget_ratio
+        self._budget_min = budget_min
+        self._rand = rand
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._retries = 0
+        self._budget_exhausted = 0
+
+    @property
+    def max_retries(self):
+        return self._max_retries
+
+    def is_retryable(self, method: str, idempotent: bool = False) -> bool:
+        return idempotent or method.upper() in RetryPolicy.RETRY_METHODS
+
+    def record_request(self):
+        with self._lock:
+            self._requests += 1
+
+    def _spend_retry(self) -> bool:
+        with self._lock:
+            if self._retries + 1 > self._budget_min + self._budget_ratio * self._requests:
+                self._budget_exhausted += 1
+                return False
+            self._retries += 1
+            return True
+
+    def should_retry(self, method: str, attempt: int, status: int = None, idempotent: bool = False) -> bool:
+        """
+        :param method: the HTTP method of the failed request
+        :param attempt: the number of retries already made for this request
+        :param status: the HTTP status, or None if the request raised a connection error
+        :param idempotent: True if the request is safe to repeat whatever its method
+        """
+        if attempt >= self._max_retries:
+            return False
+        if not self.is_retryable(method, idempotent):
+            return False
+        if status is not None and status not in RetryPolicy.RETRY_STATUS:
+            return False
+        return self._spend_retry()
+
+    def delay(self, attempt: int) -> float:
+        delay = min(self._max_backoff, self._backoff * (2 ** attempt))
+        if self._jitter:
+            delay = delay * self._rand()
+        return delay
+
+    def sleep(self, seconds: float):
+        self._sleep(seconds)
+
+    def metrics(self):
+        with self._lock:
+            return {"requests": self._requests,
+                    "retries": self._retries,
+                    "budget_exhausted": self._budget_exhausted}
+
+    def __repr__(self):
+        return f"RetryPolicy(max_retries={self._max_retries}, backoff={self._backoff}, " \
+               f"max_backoff={self._max_backoff}, jitter={self._jitter})"
+
+
+class CircuitState(Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __str__(self):
+        return self.value
+
+
+class CircuitBreaker:
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0, clock=time.monotonic):
+        """
+        :param failure_threshold: consecutive failures that open the circuit
+        :param reset_timeout: seconds to fail fast before a trial request is allowed
+        """
+        if failure_threshold < 1:
+            raise ValueError("'failure_threshold' must be at least 1")
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = CircuitState.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> CircuitState:
+        with self._lock:
+            if self._state is CircuitState.OPEN and self._clock() - self._opened_at >= self._reset_timeout:
+                return CircuitState.HALF_OPEN
+            return self._state
+
+    def before_request(self):
+        """
+        Raise AtlasCircuitOpenError if the circuit is open.
+        """
+        with self._lock:
+            if self._state is CircuitState.OPEN:
+                remaining = self._reset_timeout - (self._clock() - self._opened_at)
+                if remaining > 0:
+                    raise AtlasCircuitOpenError(f"Atlas appears to be unavailable after {self._failures} "
+                                                f"consecutive failures, not retrying for {remaining:.1f}s")
+                self._state = CircuitState.HALF_OPEN
+                self._trial_in_flight = False
+            if self._state is CircuitState.HALF_OPEN:
+                if self._trial_in_flight:
+                    raise AtlasCircuitOpenError("Atlas appears to be unavailable, waiting for a trial request")
+                self._trial_in_flight = True
+
+    def release_trial(self):
+        """
+        Give back the trial request slot taken by before_request() for a
+        request that ended without a success or a failure to record, e.g. it
+        raised an error that says nothing about Atlas.
+        """
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self._state = CircuitState.CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state is CircuitState.HALF_OPEN or self._failures >= self._failure_threshold:
+                self._state = CircuitState.OPEN
+                self._opened_at = self._clock()
+            self._trial_in_flight = False
+
+    def __repr__(self):
+        return f"CircuitBreaker(failure_threshold={self._failure_threshold}, reset_timeout={self._reset_timeout})"
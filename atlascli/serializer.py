@@ -0,0 +1,96 @@
+"""
+JSON serialization
+~~~~~~~~~~~~~~~~~~
+
+Every JSON document atlascli decodes or encodes goes through dumps() and
+loads() here. When orjson is installed (pip install atlascli[fast]) it does
+the work, otherwise the standard library json module does. Both backends
+produce the same documents:
+
+* datetime and date objects, e.g. the `created` field of an AtlasResource,
+  are written in ISO 8601 format.
+* Non-ASCII characters are written as UTF-8 rather than escaped.
+* Anything else that is not JSON serializable is written as its str().
+
+    from atlascli import serializer
+    text = serializer.dumps(cluster.resource, indent=2)
+    doc = serializer.loads(response.content)
+
+Author:joe@joedrumgoole.com
+"""
+import json
+from datetime import date, datetime
+from typing import Any, IO, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+BACKEND = "orjson" if orjson else "json"
+
+
+def _default(o: Any):
+    if isinstance(o, (datetime, date)):
+        return o.isoformat()
+    return str(o)
+
+
+def _orjson_default(o: Any):
+    #
+    # orjson handles datetime itself, we only see what it can't handle
+    #
+    return str(o)
+
+
+def dumpb(obj: Any, indent: int = None, sort_keys: bool = False) -> bytes:
+    """
+    :return: `obj` encoded as UTF-8 JSON bytes
+    """
+    if orjson is not None and indent in (None, 2):
+        option = orjson.OPT_NON_STR_KEYS
+        if indent == 2:
+            option |= orjson.OPT_INDENT_2
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        try:
+            return orjson.dumps(obj, default=_orjson_default, option=option)
+        except orjson.JSONEncodeError:
+            pass  # e.g. integers wider than 64 bits, let the stdlib have a go
+    return _stdlib_dumps(obj, indent, sort_keys).encode("utf-8")
+
+
+def dumps(obj: Any, indent: int = None, sort_keys: bool = False) -> str:
+    """
+    :return: `obj` encoded as a JSON string
+    """
+    if orjson is not None and indent in (None, 2):
+        return dumpb(obj, indent, sort_keys).decode("utf-8")
+    return _stdlib_dumps(obj, indent, sort_keys)
+
+
+def _stdlib_dumps(obj: Any, indent: int = None, sort_keys: bool = False) -> str:
+    #
+    # Match orjson's compact separators when there is no indent
+    #
+    separators = (",", ":") if indent is None else (",", ": ")
+    return json.dumps(obj, indent=indent, sort_keys=sort_keys, separators=separators,
+                      ensure_ascii=False, default=_default)
+
+
+def loads(data: Union[str, bytes, bytearray]) -> Any:
+    """
+    Decode a JSON document. `data` may be a str or UTF-8 encoded bytes, e.g.
+    the content of a response.
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dump(obj: Any, output_file: IO[str], indent: int = 2):
+    output_file.write(dumps(obj, indent=indent))
+
+
+def load(input_file: IO) -> Any:
+    return loads(input_file.read())
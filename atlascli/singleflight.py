@@ -0,0 +1,134 @@
+"""
+Single flight request coalescing
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+When several threads (or coroutines) ask for the same resource at the same
+time only the first, the leader, actually calls Atlas. The others wait for
+the leader and share its result, or its exception. Once the call completes
+the key is forgotten, so this is not a cache: a request that starts after
+the leader finished goes to Atlas again.
+
+Author:joe@joedrumgoole.com
+"""
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class _Call:
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.exception = None
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls made from threads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._leaders = 0
+        self._coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any], timeout: float = None) -> Tuple[Any, bool]:
+        """
+        Call `fn()` unless a call for `key` is already in flight, in which case
+        wait for that call instead.
+
+        :param timeout: the longest a follower waits for the leader. TimeoutError
+        is raised if it is exceeded.
+        :return: (result, shared) where shared is True if the result came from
+        another caller's call. Every caller, the leader included, gets the
+        same object and may still be using it when a follower wakes up, so
+        `fn` should return something no caller modifies, e.g. bytes.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = _Call()
+                self._calls[key] = call
+                self._leaders += 1
+                leader = True
+            else:
+                self._coalesced += 1
+                leader = False
+
+        if not leader:
+            if not call.done.wait(timeout):
+                raise TimeoutError(f"timed out waiting for in flight call {key}")
+            if call.exception is not None:
+                raise call.exception
+            return call.result, True
+
+        try:
+            call.result = fn()
+            return call.result, False
+        except BaseException as e:
+            call.exception = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"calls": self._leaders, "coalesced": self._coalesced, "in_flight": len(self._calls)}
+
+
+class AsyncSingleFlight:
+    """
+    Coalesce concurrent calls made from coroutines running on one event loop.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self._leaders = 0
+        self._coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]],
+                 share: Callable[[Any], Any] = None) -> Tuple[Any, bool]:
+        """
+        Await `fn()` unless a call for `key` is already in flight, in which case
+        await that call's result instead.
+
+        :param share: if set, the followers are given share(result), made
+        before the leader returns its result, rather than the result itself.
+        Use it to snapshot a result the leader's caller may modify.
+        :return: (result, shared) as for SingleFlight.do()
+        """
+        future = self._calls.get(key)
+        if future is not None:
+            self._coalesced += 1
+            # shield so a cancelled follower does not cancel the leader's call
+            return await asyncio.shield(future), True
+
+        self._leaders += 1
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        try:
+            result = await fn()
+            future.set_result(share(result) if share else result)
+            return result, False
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # mark it retrieved in case nobody was waiting
+            raise
+        finally:
+            del self._calls[key]
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    def stats(self) -> Dict[str, int]:
+        return {"calls": self._leaders, "coalesced": self._coalesced, "in_flight": len(self._calls)}
@@ -0,0 +1,96 @@
+"""
+Transports
+~~~~~~~~~~
+
+AtlasAPI sends every request through a transport. The default transport
+is a pooled requests.Session talking to Atlas over HTTPS. Other transports,
+e.g. the in memory FakeAtlas, let the API be exercised without keys or a
+network connection.
+
+A transport returns a requests.Response so that the rest of AtlasAPI (status
+handling, Retry-After, streaming) is the same whichever transport is used.
+
+Author:joe@joedrumgoole.com
+"""
+from http import HTTPStatus
+from typing import Dict, Tuple, Union
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+
+class Transport:
+    """
+    The interface AtlasAPI sends requests through.
+    """
+
+    def request(self, method: str, url: str, auth=None,
+                timeout: Union[float, Tuple[float, float]] = None,
+                headers: Dict[str, str] = None,
+                json=None,
+                stream: bool = False) -> requests.Response:
+        """
+        Send a request and return its response. Connection failures and
+        timeouts are raised as requests.exceptions.ConnectionError and
+        requests.exceptions.Timeout so they can be retried.
+
+        :param auth: a requests auth object
+        :param timeout: seconds, either a single value or a (connect, read) tuple
+        :param json: a document to send as the JSON body
+        :param stream: if True the body may be read incrementally with iter_content()
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """
+        Release any resources held by the transport.
+        """
+        pass
+
+
+class RequestsTransport(Transport):
+    """
+    Send requests over the network with a requests.Session.
+    """
+
+    def __init__(self, session: requests.Session = None):
+        if session is None:
+            session = requests.Session()
+        self._session = session
+
+    @property
+    def session(self) -> requests.Session:
+        return self._session
+
+    def request(self, method: str, url: str, auth=None,
+                timeout: Union[float, Tuple[float, float]] = None,
+                headers: Dict[str, str] = None,
+                json=None,
+                stream: bool = False) -> requests.Response:
+        return self._session.request(method, url, auth=auth, timeout=timeout, headers=headers, json=json,
+                                     stream=stream)
+
+    def close(self):
+        self._session.close()
+
+
+def build_response(url: str, status: int, content: bytes, headers: Dict[str, str] = None) -> requests.Response:
+    """
+    Build a requests.Response for a body that is already in memory, for
+    transports that do not talk to a server. The body can be read with
+    json() or iter_content().
+    """
+    r = requests.Response()
+    r.status_code = status
+    try:
+        r.reason = HTTPStatus(status).phrase
+    except ValueError:
+        r.reason = ""
+    r.url = url
+    r.headers = CaseInsensitiveDict({"Content-Type": "application/json"})
+    if headers:
+        r.headers.update(headers)
+    r.encoding = "utf-8"
+    r._content = content
+    r._content_consumed = True
+    return r
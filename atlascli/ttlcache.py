@@ -0,0 +1,140 @@
+"""
+Response cache
+~~~~~~~~~~~~~~
+
+A small, thread safe, size bounded LRU cache whose entries expire after a
+time to live. The AtlasAPI keeps one per instance for its get_one_cached_*
+methods. Keys are Atlas resource paths such as
+/groups/{GROUP-ID}/clusters/{CLUSTER-NAME}, which lets a mutation invalidate
+the resource it changed and everything beneath it with invalidate_prefix().
+
+Author:joe@joedrumgoole.com
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable
+
+_MISSING = object()
+
+
+class TTLCache:
+
+    def __init__(self, maxsize: int = 500, ttl: float = 60.0, clock=time.monotonic):
+        """
+        :param maxsize: the maximum number of entries. The least recently used
+        entry is evicted to make room for a new one.
+        :param ttl: seconds an entry stays valid after it is stored
+        """
+        if maxsize < 1:
+            raise ValueError("'maxsize' must be at least 1")
+        if ttl <= 0:
+            raise ValueError("'ttl' must be greater than 0")
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._clock = clock
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.RLock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._invalidations = 0
+        self._generation = 0  # bumped by every invalidation, see get_or_load()
+
+    @property
+    def maxsize(self) -> int:
+        return self._maxsize
+
+    @property
+    def ttl(self) -> float:
+        return self._ttl
+
+    def get(self, key: Hashable, default=None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if self._clock() < expires_at:
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return value
+                del self._entries[key]
+                self._expirations += 1
+            self._misses += 1
+            return default
+
+    def put(self, key: Hashable, value: Any):
+        with self._lock:
+            self._entries[key] = (self._clock() + self._ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._maxsize:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """
+        Return the cached value for `key`, calling `loader()` and caching its
+        result on a miss. Exceptions from the loader are not cached.
+
+        The loader runs without the lock, so a mutation may invalidate the
+        key while it is in flight. The value it returns may predate that
+        mutation so it is returned to this caller but not cached.
+        """
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            with self._lock:
+                generation = self._generation
+            value = loader()
+            with self._lock:
+                if self._generation == generation:
+                    self.put(key, value)
+        return value
+
+    def invalidate(self, key: Hashable) -> bool:
+        with self._lock:
+            self._generation += 1
+            if key in self._entries:
+                del self._entries[key]
+                self._invalidations += 1
+                return True
+            return False
+
+    def invalidate_prefix(self, prefix: str) -> int:
+        """
+        Remove the entry for the resource path `prefix` and every resource
+        below it, e.g. "/groups/X" removes "/groups/X" and "/groups/X/clusters/Y"
+        but not "/groups/XY".
+
+        :return: the number of entries removed
+        """
+        with self._lock:
+            self._generation += 1
+            keys = [k for k in self._entries
+                    if isinstance(k, str) and (k == prefix or k.startswith(prefix + "/"))]
+            for k in keys:
+                del self._entries[k]
+            self._invalidations += len(keys)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"hits": self._hits,
+                    "misses": self._misses,
+                    "evictions": self._evictions,
+                    "expirations": self._expirations,
+                    "invalidations": self._invalidations,
+                    "size": len(self._entries),
+                    "maxsize": self._maxsize,
+                    "ttl": self._ttl}
+
+    def __repr__(self):
+        return f"TTLCache(maxsize={self._maxsize}, ttl={self._ttl})"
@@ -0,0 +1,89 @@
+"""
+AtlasMap lookup benchmark
+~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Resolve cluster names the way `atlascli pause -c name ...` does, first with
+the linear scans AtlasMap used to do and then with its hash indexes, over
+an organization of 10,000 clusters served by FakeAtlas.
+
+    python -m benchmarks.bench_atlasmap [--projects 500] [--clusters 20] [--names 500]
+
+Author:joe@joedrumgoole.com
+"""
+import argparse
+import random
+import time
+
+from atlascli.atlasapi import AtlasAPI
+from atlascli.atlaskey import AtlasKey
+from atlascli.atlasmap import AtlasMap
+from atlascli.commands import Commands
+from atlascli.fakeatlas import FakeAtlas
+
+
+class LinearAtlasMap(AtlasMap):
+    #
+    # The lookups as they were before AtlasMap kept indexes
+    #
+
+    def is_project_id(self, project_id, deadline=None):
+        return project_id in [x.id for x in self.projects]
+
+    def is_cluster_name(self, cluster_name):
+        return any([x.name == cluster_name for x in self.clusters])
+
+    def get_cluster_project_ids(self, cluster_name, deadline=None):
+        project_ids = []
+        for project_id, cluster_map in self.project_cluster_map.items():
+            for name, cluster in cluster_map.items():
+                if name == cluster_name:
+                    project_ids.append(project_id)
+        return project_ids
+
+    def get_cluster(self, cluster_name, project_id=None, deadline=None):
+        return [c for c in self.clusters
+                if c.name == cluster_name and (project_id is None or project_id == c.project_id)]
+
+
+def resolve(atlas_map: AtlasMap, names):
+    commands = Commands(atlas_map)
+    for name in names:
+        cluster_id = commands.preflight_cluster_arg(name)
+        atlas_map.get_one_cluster(cluster_id.project_id, cluster_id.name)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--projects", type=int, default=500)
+    parser.add_argument("--clusters", type=int, default=20, help="clusters per project")
+    parser.add_argument("--names", type=int, default=500, help="cluster names to resolve")
+    args = parser.parse_args(argv)
+
+    atlas = FakeAtlas()
+    org = atlas.add_organization("bench")
+    names = []
+    for p in range(args.projects):
+        project = atlas.add_project(org["id"], f"project{p}")
+        for c in range(args.clusters):
+            name = f"cluster-{p}-{c}"
+            atlas.add_cluster(project["id"], name)
+            names.append(name)
+    names = random.Random(42).sample(names, min(args.names, len(names)))
+
+    api = AtlasAPI(transport=atlas, page_size=AtlasAPI.MAX_PAGE_SIZE)
+    api.authenticate(AtlasKey("public", "private"))
+    print(f"{args.projects * args.clusters} clusters in {args.projects} projects, resolving {len(names)} names")
+
+    results = {}
+    for label, cls in (("linear scans", LinearAtlasMap), ("hash indexes", AtlasMap)):
+        atlas_map = cls(api=api, workers=8)
+        atlas_map.populate_cluster_map()
+        start = time.perf_counter()
+        resolve(atlas_map, names)
+        results[label] = time.perf_counter() - start
+        print(f"{label:<16} {results[label] * 1000:>10.2f} ms")
+    print(f"{'speedup':<16} {results['linear scans'] / results['hash indexes']:>10.1f}x")
+
+
+if __name__ == '__main__':
+    main()
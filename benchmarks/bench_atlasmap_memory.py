@@ -0,0 +1,90 @@
+"""
+AtlasMap memory benchmark
+~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Measure with tracemalloc the memory an AtlasMap holds once it has been
+populated, and the peak while it is populated, first with full cluster
+documents and then in compact mode. The clusters are given the links,
+connection strings and replication specs Atlas returns so the documents are
+the size they are in a real organization. A compact map saves and compacts
+each project as it is fetched, so both stay near max_documents documents.
+
+    python -m benchmarks.bench_atlasmap_memory [--projects 1000] [--clusters 5] [--max-documents 100]
+
+Author:joe@joedrumgoole.com
+"""
+import argparse
+import gc
+import os
+import tempfile
+import tracemalloc
+
+from atlascli.atlasapi import AtlasAPI
+from atlascli.atlascluster import AtlasCluster
+from atlascli.atlaskey import AtlasKey
+from atlascli.atlasmap import AtlasMap
+from atlascli.atlasorganization import AtlasOrganization
+from atlascli.fakeatlas import FakeAtlas
+from atlascli.inventorycache import InventoryCache
+
+
+def cluster_config(name: str) -> dict:
+    config = AtlasCluster.default_single_region_cluster()
+    host = f"{name.lower()}-shard-00-0{{}}.abcde.mongodb.net"
+    config["replicationSpecs"] = [{"id": "5f0c0d0e0f1a2b3c4d5e6f70", "numShards": 1, "zoneName": "Zone 1",
+                                   "regionsConfig": {"EU_WEST_1": {"analyticsNodes": 0, "electableNodes": 3,
+                                                                   "priority": 7, "readOnlyNodes": 0}}}]
+    config["links"] = [{"href": f"https://cloud.mongodb.com/api/atlas/v1.0/groups/x/clusters/{name}{path}",
+                        "rel": rel} for path, rel in (("", "self"), ("/restoreJobs", "restoreJobs"),
+                                                      ("/backup/snapshots", "snapshots"))]
+    config["connectionStrings"] = {"standard": ",".join(f"mongodb://{host.format(i)}:27017" for i in range(3)),
+                                   "privateEndpoint": [], "awsPrivateLinkSrv": {}}
+    config["biConnector"] = {"enabled": False, "readPreference": "secondary"}
+    config["labels"] = [{"key": "team", "value": "payments"}, {"key": "env", "value": "prod"}]
+    return config
+
+
+def measure(label: str, make_map):
+    gc.collect()
+    tracemalloc.start()
+    atlas_map = make_map()
+    atlas_map.populate_cluster_map()
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<24} {current / 2 ** 20:>10.1f} MiB {peak / 2 ** 20:>10.1f} MiB")
+    return current, peak
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--projects", type=int, default=1000)
+    parser.add_argument("--clusters", type=int, default=5, help="clusters per project")
+    parser.add_argument("--max-documents", type=int, default=100)
+    args = parser.parse_args(argv)
+
+    atlas = FakeAtlas()
+    org = atlas.add_organization("bench")
+    for p in range(args.projects):
+        project = atlas.add_project(org["id"], f"project{p}")
+        for c in range(args.clusters):
+            name = f"cluster-{p}-{c}"
+            atlas.add_cluster(project["id"], name, cluster_config(name))
+
+    api = AtlasAPI(transport=atlas, page_size=AtlasAPI.MAX_PAGE_SIZE)
+    api.authenticate(AtlasKey("public", "private"))
+    organization = AtlasOrganization(org)
+    print(f"{args.projects * args.clusters} clusters in {args.projects} projects, "
+          f"compact keeps {args.max_documents} documents")
+    print(f"{'':<24} {'retained':>14} {'peak':>14}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache = InventoryCache(os.path.join(directory, "inventory.db"))
+        full = measure("full documents", lambda: AtlasMap(organization, api, workers=8, cache=cache, max_age=0))
+        compact = measure("compact", lambda: AtlasMap(organization, api, workers=8, cache=cache, max_age=0,
+                                                      compact=True, max_documents=args.max_documents))
+    print(f"{'reduction':<24} {full[0] / compact[0]:>13.1f}x {full[1] / compact[1]:>13.1f}x")
+
+
+if __name__ == '__main__':
+    main()
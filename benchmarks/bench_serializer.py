@@ -0,0 +1,64 @@
+"""
+Serializer benchmark
+~~~~~~~~~~~~~~~~~~~~
+
+Time decoding and encoding an inventory of 1000 clusters, as fetched from
+Atlas, with the standard library json module and with atlascli.serializer,
+which uses orjson when it is installed.
+
+    python -m benchmarks.bench_serializer [--clusters 1000] [--repeat 20]
+
+Author:joe@joedrumgoole.com
+"""
+import argparse
+import json
+import timeit
+from datetime import datetime, timezone
+
+from atlascli import serializer
+from atlascli.fakeatlas import FakeAtlas
+
+
+def inventory(clusters: int):
+    atlas = FakeAtlas()
+    projects = atlas.seed(projects=max(1, clusters // 100), clusters=min(clusters, 100))
+    docs = [atlas.cluster(p["id"], f"Cluster{c}") for p in projects for c in range(min(clusters, 100))]
+    for doc in docs:
+        # the models convert 'created' to a datetime
+        doc["created"] = datetime.now(timezone.utc)
+    return {"results": docs, "totalCount": len(docs)}
+
+
+def json_default(item: datetime):
+    return item.isoformat()
+
+
+def bench(label: str, func, repeat: int) -> float:
+    best = min(timeit.repeat(func, number=1, repeat=repeat))
+    print(f"{label:<32} {best * 1000:>8.2f} ms")
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clusters", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    doc = inventory(args.clusters)
+    text = json.dumps(doc, default=json_default)
+    content = text.encode("utf-8")
+    print(f"{len(doc['results'])} clusters, {len(content) // 1024} KB, backend: {serializer.BACKEND}")
+
+    for name, stdlib, fast in (
+            ("loads", lambda: json.loads(content), lambda: serializer.loads(content)),
+            ("dumps", lambda: json.dumps(doc, default=json_default), lambda: serializer.dumpb(doc)),
+            ("dumps indent=2", lambda: json.dumps(doc, indent=2, default=json_default),
+             lambda: serializer.dumps(doc, indent=2))):
+        baseline = bench(f"json {name}", stdlib, args.repeat)
+        best = bench(f"serializer {name}", fast, args.repeat)
+        print(f"{'speedup':<32} {baseline / best:>8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
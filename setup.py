@@ -22,7 +22,7 @@ VERSION = "0.3.0a"
 
 # What packages are optional?
 EXTRAS = {
-    # 'fancy feature': ['django'],
+    'fast': ['orjson'],
 }
 
 # The rest you shouldn't have to touch too much :)
@@ -55,7 +55,8 @@ setup(
                       'python-dateutil'],
     setup_requires=['requests',
                     'python-dateutil'],
-    packages=find_packages(),
+    extras_require=EXTRAS,
+    packages=find_packages(exclude=['test', 'benchmarks']),
     tests_require=["nose"],
     license='Apache 2.0',
     classifiers=[
@@ -0,0 +1,67 @@
+"""
+Test helpers
+~~~~~~~~~~~~
+
+Scaffolding shared by the tests: a clock the test moves by hand, an
+AtlasAPI authenticated against a FakeAtlas, or any other transport, that
+never sleeps, and a local HTTP server for the tests that need real sockets.
+
+Author:joe@joedrumgoole.com
+"""
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Type
+
+from atlascli.atlasapi import AtlasAPI
+from atlascli.atlaskey import AtlasKey
+from atlascli.ratelimiter import RateLimiter
+from atlascli.retrypolicy import RetryPolicy
+
+
+class FakeClock:
+    """
+    A clock that reads `now`. Each reading first advances it by `tick`
+    seconds and sleep() advances it without waiting.
+    """
+
+    def __init__(self, now: float = 0.0, tick: float = 0.0):
+        self.now = now
+        self.tick = tick
+
+    def __call__(self):
+        self.now += self.tick
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def make_api(transport, **kwargs) -> AtlasAPI:
+    """
+    An authenticated AtlasAPI on `transport` whose retries and rate limiter
+    never sleep. `kwargs` are passed to AtlasAPI and override those defaults.
+    """
+    kwargs.setdefault("retry_policy", RetryPolicy(backoff=0, sleep=lambda s: None))
+    kwargs.setdefault("rate_limiter", RateLimiter(sleep=lambda s: None))
+    api = AtlasAPI(transport=transport, **kwargs)
+    api.authenticate(AtlasKey("public", "private"))
+    return api
+
+
+class LocalServer:
+    """
+    A ThreadingHTTPServer on a free port of 127.0.0.1 answering with
+    `handler` from a daemon thread until it is closed.
+    """
+
+    def __init__(self, handler: Type[BaseHTTPRequestHandler]):
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
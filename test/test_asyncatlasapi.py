@@ -0,0 +1,106 @@
+import asyncio
+import threading
+import time
+import unittest
+
+from atlascli.asyncatlasapi import AsyncAtlasAPI
+from atlascli.atlasapi import AtlasAPI
+from atlascli.atlascluster import AtlasCluster
+
+PROJECT_ID = "5a141a774e65811a132a8010"
+
+
+class CannedAtlasAPI(AtlasAPI):
+    #
+    # Serves three pages of clusters and records how many requests overlap
+    #
+
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.pages = {1: ["A", "B"], 2: ["C", "D"], 3: ["E"]}
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+        super().close()
+
+    def _page(self, page_num):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.in_flight, self.max_in_flight)
+        time.sleep(0.02)
+        with self._lock:
+            self.in_flight -= 1
+        links = []
+        if page_num < len(self.pages):
+            links.append({"rel": "next", "href": f"page:{page_num + 1}"})
+        return {"results": [{"name": n, "paused": False} for n in self.pages[page_num]],
+                "links": links}
+
+    def atlas_get(self, resource=None, page_num=1, items_per_page=100, deadline=None):
+        if resource.endswith("/clusters"):
+            return self._page(1)
+        name = resource.rsplit("/", 1)[-1]
+        return self._page(1) | {"name": name}
+
+    def get(self, resource, headers=None, page_num=1, items_per_page=100, deadline=None):
+        return self._page(int(resource.split(":")[1]))
+
+    def atlas_patch(self, resource, data, idempotent=False, deadline=None):
+        return {"name": resource.rsplit("/", 1)[-1]} | data
+
+
+class TestAsyncAtlasAPI(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self._sync_api = CannedAtlasAPI()
+        self._api = AsyncAtlasAPI(self._sync_api, max_concurrency=2)
+
+    async def asyncTearDown(self):
+        await self._api.close()
+
+    async def test_pagination(self):
+        names = [c.name async for c in self._api.get_clusters(PROJECT_ID)]
+        self.assertEqual(names, ["A", "B", "C", "D", "E"])
+
+    async def test_models(self):
+        cluster = await self._api.get_one_cluster(PROJECT_ID, "A")
+        self.assertTrue(isinstance(cluster, AtlasCluster))
+        paused = await self._api.pause_cluster(cluster)
+        self.assertTrue(paused.is_paused())
+        self.assertEqual(paused.project_id, PROJECT_ID)
+
+    async def test_bounded_concurrency(self):
+        await asyncio.gather(*[self._api.get_one_cluster(PROJECT_ID, str(i)) for i in range(8)])
+        self.assertEqual(self._sync_api.max_in_flight, 2)
+
+    async def test_close(self):
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.001)
+
+        ticker = asyncio.create_task(tick())
+        slow = asyncio.create_task(self._api.get_one_cluster(PROJECT_ID, "A"))
+        await asyncio.sleep(0)
+        await self._api.close()
+        ticker.cancel()
+        await slow
+        self.assertGreater(ticks, 1)  # the loop ran while close() waited for the workers
+        self.assertFalse(self._sync_api.closed)  # the caller owns the api it passed in
+
+        owned = AsyncAtlasAPI()
+        closed = []
+        owned.api.close = lambda: closed.append(True)
+        await owned.close()
+        self.assertEqual(closed, [True])
+
+
+if __name__ == '__main__':
+    unittest.main()
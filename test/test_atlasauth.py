@@ -0,0 +1,120 @@
+import hashlib
+import json
+import re
+import threading
+import unittest
+import uuid
+from http.server import BaseHTTPRequestHandler
+
+from atlascli.atlasapi import AtlasAPI
+from atlascli.atlaskey import AtlasKey
+
+from test.helpers import LocalServer
+
+PUBLIC_KEY = "public"
+PRIVATE_KEY = "private"
+REALM = "MMS Public API"
+
+
+class DigestHandler(BaseHTTPRequestHandler):
+    #
+    # Just enough of a digest server to check nonce reuse. The first nonce
+    # it hands out goes stale after `stale_after` uses.
+    #
+    nonces = {}
+    stale_after = None
+    challenges = 0
+
+    def log_message(self, *args):
+        pass
+
+    def challenge(self, stale=False):
+        nonce = uuid.uuid4().hex
+        DigestHandler.nonces[nonce] = 0
+        DigestHandler.challenges += 1
+        self.send_response(401)
+        header = f'Digest realm="{REALM}", qop="auth", nonce="{nonce}"'
+        if stale:
+            header += ', stale="true"'
+        self.send_header("WWW-Authenticate", header)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        auth = self.headers.get("Authorization")
+        if auth is None:
+            return self.challenge()
+        fields = dict(re.findall(r'(\w+)="?([^",]+)"?', auth))
+        nonce = fields["nonce"]
+        if nonce not in DigestHandler.nonces:
+            return self.challenge(stale=True)
+        if DigestHandler.stale_after is not None and DigestHandler.nonces[nonce] >= DigestHandler.stale_after:
+            del DigestHandler.nonces[nonce]
+            return self.challenge(stale=True)
+        DigestHandler.nonces[nonce] += 1
+
+        ha1 = hashlib.md5(f"{PUBLIC_KEY}:{REALM}:{PRIVATE_KEY}".encode()).hexdigest()
+        ha2 = hashlib.md5(f"GET:{fields['uri']}".encode()).hexdigest()
+        expected = hashlib.md5(f"{ha1}:{nonce}:{fields['nc']}:{fields['cnonce']}:auth:{ha2}".encode()).hexdigest()
+        if expected != fields["response"]:
+            return self.challenge()
+
+        body = json.dumps({"nc": fields["nc"]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class TestAtlasDigestAuth(unittest.TestCase):
+
+    def setUp(self):
+        DigestHandler.nonces = {}
+        DigestHandler.stale_after = None
+        DigestHandler.challenges = 0
+        self._server = LocalServer(DigestHandler)
+        self._url = f"{self._server.url}/api/atlas/v1.0/groups"
+        self._api = AtlasAPI()
+        self._api.authenticate(AtlasKey(PUBLIC_KEY, PRIVATE_KEY))
+
+    def tearDown(self):
+        self._api.close()
+        self._server.close()
+
+    def test_nonce_reuse(self):
+        results = [self._api.get(self._url) for _ in range(5)]
+        self.assertEqual(DigestHandler.challenges, 1)
+        self.assertEqual(self._api.challenges_saved, 4)
+        self.assertEqual([r["nc"] for r in results], [f"{i:08x}" for i in range(1, 6)])
+
+    def test_stale_nonce(self):
+        DigestHandler.stale_after = 2
+        for _ in range(5):
+            self._api.get(self._url)
+        # one initial challenge plus one for each time the nonce went stale
+        self.assertEqual(DigestHandler.challenges, 3)
+        self.assertEqual(self._api._auth.challenges, 3)
+        self.assertEqual(self._api.challenges_saved, 2)
+
+    def test_threads_share_nonce(self):
+        self._api.get(self._url)
+        results = []
+
+        def worker(n):
+            for i in range(10):
+                results.append(self._api.get(f"{self._url}?thread={n}&i={i}")["nc"])
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        # one challenge for every thread and a different nonce count for every request
+        self.assertEqual(DigestHandler.challenges, 1)
+        self.assertEqual(len(set(results)), 80)
+        self.assertEqual(self._api.challenges_saved, 80)
+
+
+if __name__ == '__main__':
+    unittest.main()
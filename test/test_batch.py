@@ -0,0 +1,119 @@
+import threading
+import time
+import unittest
+
+from atlascli.batch import Operation
+from atlascli.deadline import Deadline
+from atlascli.errors import AtlasGetError, AtlasDeadlineExceededError, AtlasDeleteError
+from atlascli.fakeatlas import FakeAtlas
+from atlascli.instrumentation import RequestHook
+from atlascli.ratelimiter import RateLimiter
+
+from test.helpers import FakeClock, make_api
+
+
+class ConcurrencyHook(RequestHook):
+    #
+    # Track the most requests in flight at once
+    #
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def before_request(self, event):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def after_request(self, event):
+        with self._lock:
+            self.in_flight -= 1
+
+
+class TestExecuteMany(unittest.TestCase):
+
+    def setUp(self):
+        self._atlas = FakeAtlas(latency=0.05)
+        self._project_id = self._atlas.seed(clusters=8)[0]["id"]
+        self._hook = ConcurrencyHook()
+        self._limiter = RateLimiter()
+        self._api = make_api(self._atlas, hooks=[self._hook], rate_limiter=self._limiter)
+
+    def cluster(self, name):
+        return f"/groups/{self._project_id}/clusters/{name}"
+
+    def test_mixed_batch_in_order(self):
+        ops = [Operation.pause_cluster(self._project_id, "Cluster0"),
+               Operation.get(self.cluster("Missing")),
+               Operation.get(self.cluster("Cluster1")),
+               Operation.delete(self.cluster("Cluster2")),
+               Operation.delete(self.cluster("Missing")),
+               lambda: self._api.get_one_cluster(self._project_id, "Cluster3")]
+        results = self._api.execute_many(ops, max_workers=3)
+        self.assertEqual([r.index for r in results], list(range(6)))
+        self.assertEqual([r.ok for r in results], [True, False, True, True, False, True])
+        self.assertTrue(results[0].result["paused"])
+        self.assertIsInstance(results[1].error, AtlasGetError)
+        self.assertEqual(results[2].unwrap()["name"], "Cluster1")
+        self.assertIsInstance(results[4].error, AtlasDeleteError)
+        self.assertEqual(results[5].result.name, "Cluster3")
+        with self.assertRaises(AtlasGetError):
+            results[1].unwrap()
+        self.assertEqual(self._limiter.metrics()["acquired"], 6)
+
+    def test_bounded_concurrency(self):
+        ops = [Operation.get(self.cluster(f"Cluster{i}")) for i in range(8)]
+        start = time.monotonic()
+        results = self._api.execute_many(ops, max_workers=4)
+        elapsed = time.monotonic() - start
+        self.assertTrue(all(r.ok for r in results))
+        self.assertEqual(self._hook.max_in_flight, 4)
+        self.assertLess(elapsed, 0.05 * 8)
+
+    def test_streaming(self):
+        def op(seconds):
+            return lambda: time.sleep(seconds)
+
+        ops = (op(0.2 if i == 0 else 0.01) for i in range(4))
+        results = list(self._api.execute_many_iter(ops, max_workers=4))
+        self.assertEqual(sorted(r.index for r in results), [0, 1, 2, 3])
+        self.assertEqual(results[-1].index, 0)
+
+    def test_early_exit(self):
+        ops = [Operation.get(self.cluster(f"Cluster{i}")) for i in range(8)]
+        results = self._api.execute_many_iter(ops, max_workers=1)
+        self.assertTrue(next(results).ok)
+        results.close()
+        time.sleep(0.1)
+        self.assertLess(self._atlas.request_count, 8)
+
+    def test_deadline(self):
+        clock = FakeClock()
+        deadline = Deadline(1, clock=clock)
+        clock.now = 2
+        results = self._api.execute_many([Operation.get(self.cluster("Cluster0"))] * 3, deadline=deadline)
+        self.assertTrue(all(isinstance(r.error, AtlasDeadlineExceededError) for r in results))
+        self.assertEqual(self._atlas.request_count, 0)
+
+    def test_deadline_passes_while_waiting(self):
+        release = threading.Event()
+        ops = [lambda: release.wait(10), lambda: "done"] + [lambda: release.wait(10)] * 4
+        start = time.monotonic()
+        results = self._api.execute_many(ops, max_workers=2, deadline=Deadline(0.2))
+        release.set()
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertEqual([r.index for r in results], list(range(6)))
+        self.assertEqual(results[1].unwrap(), "done")
+        self.assertTrue(all(isinstance(r.error, AtlasDeadlineExceededError) for r in results if r.index != 1))
+
+    def test_bad_operation(self):
+        with self.assertRaises(ValueError):
+            Operation("PUT", "/groups")
+        with self.assertRaises(ValueError):
+            self._api.execute_many([], max_workers=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
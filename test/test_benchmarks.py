@@ -0,0 +1,28 @@
+import contextlib
+import io
+import unittest
+
+from benchmarks import bench_atlasmap, bench_atlasmap_memory
+
+
+class TestBenchmarks(unittest.TestCase):
+
+    def test_bench_atlasmap(self):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            bench_atlasmap.main(["--projects", "3", "--clusters", "2", "--names", "4"])
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[0], "6 clusters in 3 projects, resolving 4 names")
+        self.assertTrue(lines[-1].startswith("speedup"))
+
+    def test_bench_atlasmap_memory(self):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            bench_atlasmap_memory.main(["--projects", "3", "--clusters", "2", "--max-documents", "1"])
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[0], "6 clusters in 3 projects, compact keeps 1 documents")
+        self.assertTrue(lines[-1].startswith("reduction"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import json
+import os
+import tempfile
+import unittest
+
+import requests
+
+from atlascli.cassette import Redactor, RecordingTransport, ReplayTransport
+from atlascli.errors import AtlasCassetteError
+from atlascli.fakeatlas import FakeAtlas
+from atlascli.retrypolicy import RetryPolicy
+
+from test.helpers import FakeClock, make_api
+
+
+def cassette_api(transport, **kwargs):
+    # two items a page so each listing is several requests, and no retries to record
+    kwargs.setdefault("retry_policy", RetryPolicy(max_retries=0))
+    return make_api(transport, page_size=2, **kwargs)
+
+
+class TestRedactor(unittest.TestCase):
+
+    def test_ids_and_secrets(self):
+        redactor = Redactor()
+        doc = {"id": "5a141a774e65811a132a8010",
+               "links": [{"href": "https://x/groups/5a141a774e65811a132a8010/clusters"}],
+               "orgId": "5A141A774E65811A132A8011",
+               "privateKey": "secret"}
+        redacted = redactor.doc(doc)
+        self.assertEqual(redacted["id"], "ca55e77e0000000000000001")
+        self.assertEqual(redacted["links"][0]["href"], "https://x/groups/ca55e77e0000000000000001/clusters")
+        self.assertEqual(redacted["orgId"], "ca55e77e0000000000000002")
+        self.assertEqual(redacted["privateKey"], Redactor.REDACTED)
+        self.assertEqual(redactor.text("/groups/5a141a774e65811a132a8010"), "/groups/ca55e77e0000000000000001")
+
+
+class TestCassette(unittest.TestCase):
+
+    def setUp(self):
+        self._atlas = FakeAtlas()
+        self._projects = self._atlas.seed(projects=3, clusters=3)
+        self._dir = tempfile.TemporaryDirectory()
+        self._filename = os.path.join(self._dir.name, "cassette.json")
+
+    def tearDown(self):
+        self._dir.cleanup()
+
+    def record(self, **kwargs):
+        api = cassette_api(RecordingTransport(self._atlas, self._filename, clock=FakeClock(tick=1)), **kwargs)
+        projects = list(api.get_projects())
+        clusters = [c.name for p in projects for c in api.get_clusters(p.id)]
+        api.close()
+        return projects, clusters
+
+    def test_record_redacts(self):
+        self.record()
+        with open(self._filename) as f:
+            text = f.read()
+        for project in self._projects:
+            self.assertNotIn(project["id"], text)
+        cassette = json.loads(text)
+        # 2 pages of projects and 2 pages of clusters for each of 3 projects
+        self.assertEqual(len(cassette["interactions"]), 8)
+        self.assertTrue(all(i["elapsed"] == 1 for i in cassette["interactions"]))
+
+    def test_replay(self):
+        projects, clusters = self.record()
+        replay = ReplayTransport(self._filename)
+        api = cassette_api(replay)
+        replayed = list(api.get_projects())
+        self.assertEqual([p.name for p in replayed], [p.name for p in projects])
+        self.assertEqual([c.name for p in replayed for c in api.get_clusters(p.id)], clusters)
+        self.assertEqual(replay.remaining(), 0)
+        with self.assertRaises(AtlasCassetteError):
+            list(api.get_projects())
+
+    def test_replay_realtime(self):
+        self.record()
+        slept = []
+        api = cassette_api(ReplayTransport(self._filename, realtime=True, sleep=slept.append))
+        list(api.get_projects())
+        self.assertEqual(slept, [1, 1])
+
+    def test_replay_streamed_and_looped(self):
+        projects, _ = self.record()
+        api = cassette_api(ReplayTransport(self._filename, loop=True))
+        for _ in range(3):
+            self.assertEqual([p["name"] for p in api.get_resource_by_item("/groups", stream=True)],
+                             [p.name for p in projects])
+
+    def test_errors_replayed(self):
+        atlas = FakeAtlas(latency=5, sleep=lambda s: None)
+        atlas.seed()
+        api = cassette_api(RecordingTransport(atlas, self._filename), timeout=(1, 2))
+        with self.assertRaises(requests.exceptions.ReadTimeout):
+            list(api.get_projects())
+        api.close()
+
+        api = cassette_api(ReplayTransport(self._filename))
+        with self.assertRaises(requests.exceptions.ReadTimeout):
+            list(api.get_projects())
+
+    def test_bad_version(self):
+        with self.assertRaises(AtlasCassetteError):
+            ReplayTransport({"version": 99, "interactions": []})
+
+
+if __name__ == '__main__':
+    unittest.main()
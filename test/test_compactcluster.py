@@ -0,0 +1,198 @@
+import os
+import tempfile
+import unittest
+
+from atlascli.atlascluster import AtlasCluster
+from atlascli.atlasmap import AtlasMap
+from atlascli.atlasorganization import AtlasOrganization
+from atlascli.compactcluster import ClusterDocuments, CompactCluster
+from atlascli.fakeatlas import FakeAtlas
+from atlascli.inventorycache import InventoryCache
+
+from test.helpers import make_api
+
+
+class Loader:
+
+    def __init__(self):
+        self.loaded = []
+
+    def __call__(self, project_id, name):
+        self.loaded.append((project_id, name))
+        return {"name": name, "groupId": project_id}
+
+
+def make_cluster(name="Cluster0", project_id="p0", paused=False):
+    return AtlasCluster(project_id, name, {"name": name, "stateName": "IDLE", "paused": paused,
+                                           "diskSizeGB": 40, "connectionStrings": {"standard": "mongodb://x"},
+                                           "providerSettings": {"instanceSizeName": "M10",
+                                                                "regionName": "EU_WEST_1"}})
+
+
+class TestClusterDocuments(unittest.TestCase):
+
+    def test_lru(self):
+        loader = Loader()
+        documents = ClusterDocuments(2, loader)
+        for name in ("a", "b", "c"):
+            documents.put("p", name, {"name": name})
+        self.assertEqual(len(documents), 2)
+        self.assertEqual(documents.get("p", "b"), {"name": "b"})
+        documents.put("p", "d", {"name": "d"})  # evicts c, b was used more recently
+        self.assertEqual(documents.get("p", "b"), {"name": "b"})
+        self.assertEqual(loader.loaded, [])
+        self.assertEqual(documents.get("p", "c"), {"name": "c", "groupId": "p"})
+        self.assertEqual(loader.loaded, [("p", "c")])
+        self.assertEqual(documents.stats(), {"resident": 2, "hits": 2, "misses": 1})
+
+    def test_nothing_resident(self):
+        loader = Loader()
+        documents = ClusterDocuments(0, loader)
+        documents.put("p", "a", {"name": "a"})
+        documents.get("p", "a")
+        documents.get("p", "a")
+        self.assertEqual(len(documents), 0)
+        self.assertEqual(len(loader.loaded), 2)
+
+    def test_bad_limit(self):
+        with self.assertRaises(ValueError):
+            ClusterDocuments(-1, Loader())
+
+
+class TestCompactCluster(unittest.TestCase):
+
+    def test_fields_without_loading(self):
+        loader = Loader()
+        cluster = CompactCluster.from_cluster(make_cluster(paused=True), ClusterDocuments(0, loader))
+        self.assertEqual((cluster.project_id, cluster.name, cluster.state, cluster.is_paused()),
+                         ("p0", "Cluster0", "IDLE", True))
+        self.assertEqual((cluster.instance_size(), cluster.disk_size(), cluster.region()), ("M10", 40, "EU_WEST_1"))
+        self.assertIn("paused", cluster.summary())
+        self.assertFalse(hasattr(cluster, "__dict__"))
+        self.assertEqual(loader.loaded, [])
+
+        self.assertEqual(cluster.resource["groupId"], "p0")
+        self.assertEqual(loader.loaded, [("p0", "Cluster0")])
+
+    def test_resident_document(self):
+        full = make_cluster()
+        cluster = CompactCluster.from_cluster(full, ClusterDocuments(1, Loader()))
+        self.assertIs(cluster.resource, full.resource)
+        self.assertEqual(cluster, full)
+        self.assertIs(CompactCluster.from_cluster(cluster, ClusterDocuments(1, Loader())), cluster)
+
+
+class TestCompactAtlasMap(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self._cache = InventoryCache(os.path.join(self._dir.name, "inventory.db"))
+        self._atlas = FakeAtlas()
+        projects = self._atlas.seed(projects=3, clusters=4)
+        self._projects = [p["id"] for p in projects]
+        self._org = AtlasOrganization({"id": projects[0]["orgId"], "name": "org0"})
+        self._api = make_api(self._atlas)
+
+    def tearDown(self):
+        self._dir.cleanup()
+
+    def make_map(self, **kwargs):
+        return AtlasMap(self._org, self._api, cache=self._cache, compact=True, max_documents=2, **kwargs)
+
+    def test_populate(self):
+        atlas_map = self.make_map()
+        self.assertEqual(len(atlas_map.clusters), 12)
+        self.assertTrue(all(isinstance(c, CompactCluster) for c in atlas_map.clusters))
+        self.assertEqual(len(atlas_map._documents), 2)
+
+        self._atlas.reset_requests()
+        cluster = atlas_map.get_one_cluster(self._projects[0], "Cluster0")
+        self.assertEqual(cluster.resource, self._atlas.cluster(self._projects[0], "Cluster0"))
+        self.assertEqual(self._atlas.request_count, 0)  # read back from the cache
+
+    def test_populate_compacts_each_project(self):
+        seen = []
+
+        def progress(project, done, total):
+            clusters = atlas_map._partial_cluster_map.values()
+            seen.append((all(isinstance(c, CompactCluster) for m in clusters for c in m.values()),
+                         self._cache.get_cluster(project.id, "Cluster3") is not None))
+
+        atlas_map = self.make_map(progress=progress)
+        atlas_map.populate_cluster_map()
+        self.assertEqual(seen, [(True, True)] * 3)
+        self.assertEqual(len(self.make_map().clusters), 12)  # and the inventory was saved
+
+    def test_without_cache(self):
+        atlas_map = AtlasMap(self._org, self._api, compact=True, max_documents=0)
+        cluster = atlas_map.get_one_cluster(self._projects[1], "Cluster2")
+        self.assertIsInstance(cluster, CompactCluster)
+        self._atlas.reset_requests()
+        self.assertEqual(cluster.resource["name"], "Cluster2")
+        self.assertEqual(self._atlas.request_count, 1)
+
+    def test_from_cache(self):
+        self.make_map().populate_cluster_map()
+        atlas_map = self.make_map()
+        self.assertEqual(atlas_map.get_cluster_project_ids("Cluster3"), self._projects)
+        self.assertTrue(all(isinstance(c, CompactCluster) for c in atlas_map.clusters))
+        self.assertEqual(len(atlas_map._documents), 2)
+
+    def test_refresh_changed(self):
+        atlas_map = self.make_map()
+        atlas_map.populate_cluster_map()
+        misses = atlas_map._documents.stats()["misses"]
+        self.assertEqual(atlas_map.refresh_changed(), [])
+        self.assertEqual(atlas_map._documents.stats()["misses"], misses)
+
+        self._atlas.set_state(self._projects[2], "Cluster1", "UPDATING")
+        changed = atlas_map.refresh_changed()
+        self.assertEqual([(c.project_id, c.name) for c in changed], [(self._projects[2], "Cluster1")])
+        cluster = atlas_map.get_one_cluster(self._projects[2], "Cluster1")
+        self.assertIsInstance(cluster, CompactCluster)
+        self.assertEqual(cluster.state, "UPDATING")
+
+    def cluster_gets(self):
+        # clusters fetched one at a time, e.g. to load a document the map dropped
+        return [path for method, path in self._atlas.requests if method == "GET" and "/clusters/" in path]
+
+    def test_lazily_loaded_then_populated(self):
+        atlas_map = AtlasMap(self._org, self._api, cache=self._cache, compact=True, max_documents=1)
+        for project_id in self._projects:
+            self.assertEqual(len(list(atlas_map.get_clusters(project_id))), 4)
+        atlas_map.populate_cluster_map()
+        self.assertEqual(self.cluster_gets(), [])
+        self.assertEqual(self.make_map().get_one_cluster(self._projects[2], "Cluster3").resource,
+                         self._atlas.cluster(self._projects[2], "Cluster3"))
+
+    def test_refresh_changed_saves_changes(self):
+        atlas_map = AtlasMap(self._org, self._api, cache=self._cache, compact=True, max_documents=1)
+        atlas_map.populate_cluster_map()
+        self._atlas.set_state(self._projects[0], "Cluster1", "UPDATING")
+        self._atlas.set_state(self._projects[1], "Cluster2", "UPDATING")
+        project = self._api.create_project(self._org.id, "extra")  # the whole inventory is saved again
+        self._atlas.add_cluster(project.id, "Cluster0")
+        self._atlas.reset_requests()
+
+        self.assertEqual(len(atlas_map.refresh_changed()), 3)
+        self.assertEqual(self.cluster_gets(), [])
+        self.assertTrue(all(isinstance(c, CompactCluster) for c in atlas_map.clusters))
+        self._atlas.reset_requests()
+        cached = self.make_map()
+        for project_id, name in ((self._projects[0], "Cluster1"), (self._projects[1], "Cluster2")):
+            self.assertEqual(cached.get_one_cluster(project_id, name).resource["stateName"], "UPDATING")
+        self.assertEqual(self._atlas.request_count, 0)
+
+    def test_update_cluster(self):
+        atlas_map = self.make_map()
+        atlas_map.populate_cluster_map()
+        cluster = atlas_map.get_one_cluster(self._projects[0], "Cluster1")
+        atlas_map.update_cluster(self._api.pause_cluster(cluster))
+        paused = atlas_map.get_one_cluster(self._projects[0], "Cluster1")
+        self.assertIsInstance(paused, CompactCluster)
+        self.assertTrue(paused.is_paused())
+        self.assertTrue(self.make_map().get_one_cluster(self._projects[0], "Cluster1").is_paused())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import json
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler
+
+from atlascli.atlasapi import AtlasAPI
+from atlascli.atlaskey import AtlasKey
+from atlascli.deadline import Deadline
+from atlascli.errors import AtlasDeadlineExceededError
+from atlascli.ratelimiter import RateLimiter
+from atlascli.retrypolicy import RetryPolicy
+
+from test.helpers import FakeClock, LocalServer
+
+
+class SlowHandler(BaseHTTPRequestHandler):
+    delay = 0.0
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        time.sleep(SlowHandler.delay)
+        body = json.dumps({"results": [], "links": []}).encode()
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except ConnectionError:
+            pass
+
+
+class TestDeadline(unittest.TestCase):
+
+    def test_remaining(self):
+        clock = FakeClock()
+        deadline = Deadline(10, clock=clock)
+        self.assertEqual(deadline.remaining(), 10)
+        self.assertTrue(deadline.allows(9))
+        clock.now = 4
+        self.assertEqual(deadline.clip((3.05, 30)), (3.05, 6))
+        self.assertEqual(deadline.clip(2), 2)
+        self.assertFalse(deadline.allows(6))
+        clock.now = 10
+        self.assertTrue(deadline.expired())
+        with self.assertRaises(AtlasDeadlineExceededError):
+            deadline.check()
+
+    def test_bad_deadline(self):
+        with self.assertRaises(ValueError):
+            Deadline(0)
+
+    def test_rate_limiter_timeout(self):
+        clock = FakeClock()
+        limiter = RateLimiter(rate=1, burst=1, clock=clock, sleep=lambda s: None)
+        limiter.acquire()
+        with self.assertRaises(AtlasDeadlineExceededError):
+            limiter.acquire(timeout=0.5)
+
+
+class TestRequestDeadline(unittest.TestCase):
+
+    def setUp(self):
+        self._server = LocalServer(SlowHandler)
+        self._url = f"{self._server.url}/api/atlas/v1.0/groups"
+        self._api = AtlasAPI(retry_policy=RetryPolicy(backoff=0, sleep=lambda s: None))
+        self._api.authenticate(AtlasKey("public", "private"))
+
+    def tearDown(self):
+        self._api.close()
+        self._server.close()
+
+    def test_within_deadline(self):
+        SlowHandler.delay = 0
+        self.assertEqual(self._api.get(self._url, deadline=Deadline(5)), {"results": [], "links": []})
+
+    def test_deadline_exceeded(self):
+        SlowHandler.delay = 0.5
+        start = time.monotonic()
+        with self.assertRaises(AtlasDeadlineExceededError):
+            self._api.get(self._url, deadline=Deadline(0.2))
+        self.assertLess(time.monotonic() - start, 0.45)
+
+    def test_expired_before_send(self):
+        SlowHandler.delay = 0
+        clock = FakeClock()
+        deadline = Deadline(1, clock=clock)
+        clock.now = 2
+        with self.assertRaises(AtlasDeadlineExceededError):
+            list(self._api.get_resource_by_item("/groups", deadline=deadline))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import unittest
+
+import requests
+
+from atlascli.atlascluster import AtlasCluster
+from atlascli.errors import AtlasGetError, AtlasDeleteError
+from atlascli.fakeatlas import FakeAtlas
+from atlascli.retrypolicy import RetryPolicy
+
+from test.helpers import FakeClock, make_api
+
+
+class TestFakeAtlas(unittest.TestCase):
+
+    def setUp(self):
+        self._clock = FakeClock()
+        self._atlas = FakeAtlas(transition_time=10, clock=self._clock)
+        self._org = self._atlas.add_organization("Acme")
+        self._project = self._atlas.add_project(self._org["id"], "demo")
+        self._project_id = self._project["id"]
+        self._api = make_api(self._atlas, page_size=10)
+
+    def test_organization_and_project(self):
+        self.assertEqual(self._api.get_this_organization().name, "Acme")
+        projects = list(self._api.get_projects())
+        self.assertEqual([p.id for p in projects], [self._project_id])
+        self.assertEqual(self._api.get_one_project(self._project_id).name, "demo")
+
+    def test_pagination(self):
+        for i in range(25):
+            self._atlas.add_cluster(self._project_id, f"Cluster{i}")
+        names = [c.name for c in self._api.get_clusters(self._project_id)]
+        self.assertEqual(names, [f"Cluster{i}" for i in range(25)])
+        stats = self._api.listing_stats()["/groups/{id}/clusters"]
+        self.assertEqual((stats["round_trips"], stats["max_round_trips"]), (3, 3))
+
+    def test_listing_stats_per_endpoint(self):
+        other = self._atlas.add_project(self._org["id"], "other")["id"]
+        for i in range(25):
+            self._atlas.add_cluster(self._project_id, f"Cluster{i}")
+        self._atlas.add_cluster(other, "Cluster0")
+        list(self._api.get_clusters(self._project_id))
+        list(self._api.get_clusters(other))
+        stats = self._api.listing_stats()
+        self.assertEqual(list(stats), ["/groups/{id}/clusters"])
+        self.assertEqual(stats["/groups/{id}/clusters"], {"listings": 2, "round_trips": 4, "items": 26,
+                                                          "max_round_trips": 3, "mean_round_trips": 2.0})
+
+    def test_parallel_and_streamed_pagination(self):
+        for i in range(25):
+            self._atlas.add_cluster(self._project_id, f"Cluster{i}")
+        resource = f"/groups/{self._project_id}/clusters"
+        expected = [f"Cluster{i}" for i in range(25)]
+        self.assertEqual([c["name"] for c in self._api.get_resource_by_item(resource, page_workers=3)], expected)
+        self.assertEqual([c["name"] for c in self._api.get_resource_by_item(resource, stream=True)], expected)
+
+    def test_pause_resume_transitions(self):
+        self._atlas.add_cluster(self._project_id, "Cluster0")
+        cluster = self._api.get_one_cluster(self._project_id, "Cluster0")
+        self.assertEqual(cluster.state, "IDLE")
+
+        paused = self._api.pause_cluster(cluster)
+        self.assertEqual((paused.state, paused.is_paused()), ("REPAIRING", True))
+        self.assertEqual(self._api.get_one_cluster(self._project_id, "Cluster0").state, "REPAIRING")
+        self._clock.now = 10
+        cluster = self._api.get_one_cluster(self._project_id, "Cluster0")
+        self.assertEqual((cluster.state, cluster.is_paused()), ("IDLE", True))
+
+        self._api.resume_cluster(cluster)
+        self._clock.now = 20
+        cluster = self._api.get_one_cluster(self._project_id, "Cluster0")
+        self.assertEqual((cluster.state, cluster.is_paused()), ("IDLE", False))
+
+    def test_create_and_delete_cluster(self):
+        config = AtlasCluster.default_single_region_cluster()
+        created = self._api.create_cluster(self._project_id, "NewCluster", config)
+        self.assertEqual(created.state, "CREATING")
+        self._clock.now = 10
+        cluster = self._api.get_one_cluster(self._project_id, "NewCluster")
+        self.assertEqual(cluster.state, "IDLE")
+
+        self._api.delete_cluster(cluster)
+        self.assertEqual(self._atlas.cluster(self._project_id, "NewCluster")["stateName"], "DELETING")
+        self._clock.now = 20
+        self.assertIsNone(self._atlas.cluster(self._project_id, "NewCluster"))
+        self.assertEqual(list(self._api.get_clusters(self._project_id)), [])
+
+    def test_injected_state(self):
+        self._atlas.add_cluster(self._project_id, "Cluster0")
+        self._atlas.set_state(self._project_id, "Cluster0", "REPAIRING", duration=5)
+        self.assertEqual(self._api.get_one_cluster(self._project_id, "Cluster0").state, "REPAIRING")
+        self._clock.now = 5
+        self.assertEqual(self._api.get_one_cluster(self._project_id, "Cluster0").state, "IDLE")
+
+    def test_not_found(self):
+        with self.assertRaises(AtlasGetError):
+            self._api.get_one_cluster(self._project_id, "Missing")
+        with self.assertRaises(AtlasDeleteError):
+            self._api.atlas_delete(f"/groups/{self._project_id}/clusters/Missing")
+
+    def test_throttled(self):
+        self._atlas.throttle(2, retry_after=0)
+        self.assertEqual(self._api.get_one_project(self._project_id).name, "demo")
+        self.assertEqual(self._atlas.request_count, 3)
+        self.assertEqual(self._api.rate_limiter.metrics()["throttled"], 2)
+
+    def test_server_error_retried(self):
+        self._atlas.fail(2, status=503)
+        self.assertEqual(self._api.get_one_project(self._project_id).name, "demo")
+        self.assertEqual(self._atlas.request_count, 3)
+
+    def test_latency_timeout(self):
+        atlas = FakeAtlas(latency=5, sleep=lambda s: None)
+        atlas.seed()
+        api = make_api(atlas, timeout=(1, 2), retry_policy=RetryPolicy(max_retries=1, sleep=lambda s: None))
+        with self.assertRaises(requests.exceptions.ReadTimeout):
+            list(api.get_projects())
+        self.assertEqual(atlas.request_count, 2)
+
+    def test_seed(self):
+        atlas = FakeAtlas()
+        projects = atlas.seed(orgs=2, projects=3, clusters=4)
+        api = make_api(atlas)
+        self.assertEqual(len(list(api.get_projects())), 6)
+        self.assertEqual(len(list(api.get_clusters(projects[-1]["id"]))), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import unittest
+
+import requests
+
+from atlascli.atlasapi import AtlasAPI
+from atlascli.errors import AtlasGetError
+from atlascli.fakeatlas import FakeAtlas
+from atlascli.instrumentation import HistogramCollector, LatencyHistogram, RequestHook, endpoint_template
+from atlascli.retrypolicy import RetryPolicy
+
+from test.helpers import make_api
+
+
+class RecordingHook(RequestHook):
+
+    def __init__(self):
+        self.before = []
+        self.after = []
+
+    def before_request(self, event):
+        self.before.append((event.method, event.endpoint))
+
+    def after_request(self, event):
+        self.after.append(event)
+
+
+class BrokenHook(RequestHook):
+
+    def after_request(self, event):
+        raise ValueError("broken")
+
+
+class TestEndpointTemplate(unittest.TestCase):
+
+    def test_templates(self):
+        base = AtlasAPI.ATLAS_BASE_URL
+        self.assertEqual(endpoint_template(f"{base}/groups?itemsPerPage=100&pageNum=1", base), "/groups")
+        self.assertEqual(endpoint_template(f"{base}/groups/5a141a774e65811a132a8010/clusters", base),
+                         "/groups/{id}/clusters")
+        self.assertEqual(endpoint_template(f"{base}/groups/5a141a774e65811a132a8010/clusters/Demo?x=1", base),
+                         "/groups/{id}/clusters/{name}")
+        self.assertEqual(endpoint_template("http://localhost/api/atlas/v1.0/orgs/5a141a774e65811a132a8010"),
+                         "/api/atlas/v1.0/orgs/{id}")
+
+
+class TestLatencyHistogram(unittest.TestCase):
+
+    def test_percentiles(self):
+        histogram = LatencyHistogram()
+        for ms in range(1, 101):
+            histogram.record(ms / 1000)
+        self.assertEqual(histogram.count, 100)
+        self.assertAlmostEqual(histogram.mean, 0.0505)
+        for p, expected in ((50, 0.050), (95, 0.095), (99, 0.099)):
+            self.assertLessEqual(abs(histogram.percentile(p) - expected), expected * 0.05)
+        self.assertEqual(histogram.percentile(100), 0.1)
+
+    def test_empty(self):
+        self.assertEqual(LatencyHistogram().percentile(99), 0.0)
+
+
+class TestHooks(unittest.TestCase):
+
+    def setUp(self):
+        self._atlas = FakeAtlas()
+        self._project = self._atlas.seed(clusters=3)[0]
+        self._hook = RecordingHook()
+        self._collector = HistogramCollector()
+        self._api = make_api(self._atlas, page_size=2, hooks=[self._hook, BrokenHook()])
+        self._api.add_hook(self._collector)
+
+    def test_events(self):
+        list(self._api.get_clusters(self._project["id"]))
+        self.assertEqual(self._hook.before, [("GET", "/groups/{id}/clusters")] * 2)
+        event = self._hook.after[0]
+        self.assertEqual((event.status, event.retries, event.throttled, event.error), (200, 0, 0, None))
+        self.assertGreater(event.bytes, 0)
+        self.assertGreaterEqual(event.latency, 0)
+
+    def test_retries_counted(self):
+        self._atlas.throttle(1, retry_after=0)
+        self._atlas.fail(1, status=503)
+        self._api.get_one_cluster(self._project["id"], "Cluster0")
+        event = self._hook.after[0]
+        self.assertEqual((event.status, event.retries, event.throttled), (200, 1, 1))
+
+    def test_error_event(self):
+        api = make_api(FakeAtlas(latency=5, sleep=lambda s: None), timeout=1, hooks=[self._hook],
+                       retry_policy=RetryPolicy(max_retries=0))
+        with self.assertRaises(requests.exceptions.ReadTimeout):
+            api.atlas_get("/groups")
+        self.assertIsInstance(self._hook.after[0].error, requests.exceptions.ReadTimeout)
+        self.assertIsNone(self._hook.after[0].status)
+
+    def test_collector(self):
+        list(self._api.get_clusters(self._project["id"]))
+        self._api.get_one_cluster(self._project["id"], "Cluster0")
+        with self.assertRaises(AtlasGetError):
+            self._api.get_one_cluster(self._project["id"], "Missing")
+        stats = self._collector.stats()
+        self.assertEqual(stats["GET /groups/{id}/clusters"]["count"], 2)
+        self.assertEqual(stats["GET /groups/{id}/clusters/{name}"]["count"], 2)
+        self.assertEqual(stats["GET /groups/{id}/clusters/{name}"]["errors"], 1)
+        report = self._collector.report()
+        self.assertIn("GET /groups/{id}/clusters/{name}", report)
+        self.assertIn("p99 ms", report)
+        self._collector.reset()
+        self.assertEqual(self._collector.stats(), {})
+
+    def test_remove_hook(self):
+        self._api.remove_hook(self._hook)
+        self._api.atlas_get("/groups")
+        self.assertEqual(self._hook.after, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
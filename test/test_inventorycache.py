@@ -0,0 +1,294 @@
+import multiprocessing
+import os
+import tempfile
+import threading
+import unittest
+from datetime import datetime
+
+from atlascli.atlascluster import AtlasCluster
+from atlascli.atlasmap import AtlasMap
+from atlascli.atlasorganization import AtlasOrganization
+from atlascli.atlasproject import AtlasProject
+from atlascli.commands import Commands
+from atlascli.fakeatlas import FakeAtlas
+from atlascli.inventorycache import InventoryCache
+from atlascli.inventoryindex import InventoryIndex
+
+from test.helpers import FakeClock, make_api
+
+
+def make_index(projects: int, clusters: int, tag: str = "") -> InventoryIndex:
+    project_map = {}
+    project_clusters = {}
+    for p in range(projects):
+        project = AtlasProject({"id": f"{p:024x}", "name": f"project{p}", "created": "2020-01-02T03:04:05Z"})
+        project_map[project.id] = project
+        project_clusters[project.id] = {f"C{c}{tag}": AtlasCluster(project.id, f"C{c}{tag}", {"name": f"C{c}{tag}"})
+                                        for c in reversed(range(clusters))}
+    return InventoryIndex(project_map, project_clusters)
+
+
+def writer(filename, tag, rounds):
+    cache = InventoryCache(filename)
+    for _ in range(rounds):
+        cache.put_inventory("org", make_index(10, 10, tag))
+
+
+class TestInventoryCache(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self._filename = os.path.join(self._dir.name, "sub", "inventory.db")
+        self._clock = FakeClock(now=1000.0)
+        self._cache = InventoryCache(self._filename, clock=self._clock)
+
+    def tearDown(self):
+        self._dir.cleanup()
+
+    def test_round_trip(self):
+        self.assertIsNone(self._cache.get_inventory("org"))
+        index = make_index(3, 4)
+        self._cache.put_inventory("org", index)
+        self._clock.now += 30
+        loaded, age = self._cache.get_inventory("org")
+        self.assertEqual(age, 30)
+        self.assertEqual(list(loaded.projects), list(index.projects))
+        self.assertEqual([(c.project_id, c.name) for c in loaded.clusters],
+                         [(c.project_id, c.name) for c in index.clusters])
+        self.assertIsInstance(loaded.projects[f"{0:024x}"]["created"], datetime)
+        self.assertIsNone(self._cache.get_inventory("other"))
+
+    def test_replace_and_put_cluster(self):
+        self._cache.put_inventory("org", make_index(3, 4))
+        self._cache.put_inventory("org", make_index(2, 1))
+        project_id = f"{1:024x}"
+        self._clock.now += 10
+        self._cache.put_cluster(AtlasCluster(project_id, "New", {"name": "New"}))
+        self._cache.put_cluster(AtlasCluster(project_id, "C0", {"name": "C0", "paused": True}))
+        loaded, age = self._cache.get_inventory("org")
+        self.assertEqual(age, 10)  # the oldest entity
+        self.assertEqual(len(loaded.projects), 2)
+        self.assertEqual(list(loaded.project_clusters[project_id]), ["C0", "New"])
+        self.assertTrue(loaded.cluster(project_id, "C0").is_paused())
+
+    def test_put_projects(self):
+        self._cache.put_inventory("org", make_index(3, 4))
+        index = make_index(2, 1)
+        self._clock.now += 10
+        for project_id, clusters in index.project_clusters.items():
+            self._cache.put_clusters(project_id, clusters)
+        self._cache.put_projects("org", index.projects.values())
+        loaded, age = self._cache.get_inventory("org")
+        self.assertEqual(age, 0)
+        self.assertEqual(list(loaded.projects), list(index.projects))
+        self.assertEqual([c.name for c in loaded.clusters], ["C0", "C0"])
+        self.assertIsNone(self._cache.get_cluster(f"{2:024x}", "C0"))  # its project is gone
+
+    def test_organization(self):
+        org = AtlasOrganization({"id": "org", "name": "Acme"})
+        self.assertIsNone(self._cache.get_organization("public"))
+        self._cache.put_organization("public", org)
+        self._clock.now += 5
+        cached, age = self._cache.get_organization("public")
+        self.assertEqual((cached.id, cached.name, age), ("org", "Acme", 5))
+        self.assertIsNone(self._cache.get_organization("other"))
+        with open(self._filename, "rb") as f:
+            self.assertNotIn(b"public", f.read())
+
+    def test_reopen_and_clear(self):
+        self._cache.put_inventory("org", make_index(1, 1))
+        self.assertIsNotNone(InventoryCache(self._filename).get_inventory("org"))
+        self._cache.clear()
+        self.assertIsNone(self._cache.get_inventory("org"))
+
+    def test_concurrent_processes(self):
+        context = multiprocessing.get_context("spawn")
+        writers = [context.Process(target=writer, args=(self._filename, tag, 10)) for tag in "ab"]
+        for w in writers:
+            w.start()
+        reads = 0
+        while any(w.is_alive() for w in writers) or reads == 0:
+            cached = InventoryCache(self._filename).get_inventory("org")
+            if cached:
+                index = cached[0]
+                # never a mix of two writers' inventories
+                self.assertEqual(len(index.clusters), 100)
+                self.assertEqual(len({c.name[-1] for c in index.clusters}), 1)
+                reads += 1
+        for w in writers:
+            w.join()
+            self.assertEqual(w.exitcode, 0)
+
+
+class TestAtlasMapCache(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self._clock = FakeClock(now=1000.0)
+        self._cache = InventoryCache(os.path.join(self._dir.name, "inventory.db"), clock=self._clock)
+        self._atlas = FakeAtlas()
+        self._projects = self._atlas.seed(projects=3, clusters=2)
+        self._org = AtlasOrganization({"id": self._projects[0]["orgId"], "name": "org0"})
+        self._api = make_api(self._atlas)
+
+    def tearDown(self):
+        self._dir.cleanup()
+
+    def make_map(self, **kwargs):
+        return AtlasMap(self._org, self._api, cache=self._cache, **kwargs)
+
+    def test_served_from_cache(self):
+        first = self.make_map()
+        self.assertEqual(len(first.clusters), 6)
+        requests = self._atlas.request_count
+
+        self._clock.now += 60
+        second = self.make_map(max_age=120)
+        self.assertEqual(second.get_cluster_project_ids("Cluster1"), first.get_cluster_project_ids("Cluster1"))
+        self.assertTrue(second.is_project_id(self._projects[2]["id"]))
+        self.assertEqual(self._atlas.request_count, requests)
+
+        self._clock.now += 120
+        third = self.make_map(max_age=120)
+        self.assertEqual(len(third.clusters), 6)
+        self.assertGreater(self._atlas.request_count, requests)
+
+    def test_cache_read_once(self):
+        reads = []
+        get_inventory = self._cache.get_inventory
+        self._cache.get_inventory = lambda org_id: reads.append(org_id) or get_inventory(org_id)
+        atlas_map = self.make_map()  # nothing cached yet
+        for project in self._projects:
+            for _ in range(3):
+                self.assertEqual(len(atlas_map.get_cluster("Cluster0", project["id"])), 1)
+        self.assertFalse(atlas_map.is_populated())
+        self.assertEqual(reads, [self._org.id])
+
+    def test_create_cluster_saved(self):
+        first = self.make_map()
+        first.populate_cluster_map()
+        first.create_cluster(self._projects[0]["id"], "New")
+        self.assertEqual(self.make_map().get_cluster_project_ids("New"), [self._projects[0]["id"]])
+
+    def test_unreadable_cache(self):
+        self.make_map().populate_cluster_map()
+        with open(self._cache.filename, "wb") as f:
+            f.write(b"not a database" * 100)
+        with self.assertLogs("atlascli.atlasmap", level="WARNING"):
+            self.assertEqual(len(self.make_map().clusters), 6)
+
+
+class GatedAtlas(FakeAtlas):
+    #
+    # Hold each response listing the clusters of a project until the gate
+    # is opened. The response is built first so it shows the clusters as
+    # they were when the request arrived.
+    #
+
+    def __init__(self):
+        super().__init__()
+        self.gate = threading.Event()
+        self.gate.set()
+        self.listing = threading.Event()
+
+    def request(self, method, url, *args, **kwargs):
+        response = super().request(method, url, *args, **kwargs)
+        if method == "GET" and "/groups/" in url and url.split("?")[0].endswith("/clusters"):
+            self.listing.set()
+            self.gate.wait(5)
+        return response
+
+
+class TestStaleWhileRevalidate(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self._clock = FakeClock(now=1000.0)
+        self._cache = InventoryCache(os.path.join(self._dir.name, "inventory.db"), clock=self._clock)
+        self._atlas = GatedAtlas()
+        self._projects = self._atlas.seed(projects=3, clusters=2)
+        self._project_id = self._projects[0]["id"]
+        self._org = AtlasOrganization({"id": self._projects[0]["orgId"], "name": "org0"})
+        self._api = make_api(self._atlas)
+        AtlasMap(self._org, self._api, cache=self._cache).populate_cluster_map()
+        self._clock.now += 600
+
+    def tearDown(self):
+        self._atlas.gate.set()
+        self._dir.cleanup()
+
+    def make_map(self, **kwargs):
+        return AtlasMap(self._org, self._api, cache=self._cache, max_age=120, **kwargs)
+
+    def test_stale_answered_then_revalidated(self):
+        self._atlas.add_cluster(self._project_id, "New")
+        self._atlas.gate.clear()
+        atlas_map = self.make_map(max_stale=3600)
+        self.assertEqual(len(atlas_map.clusters), 6)
+        self.assertFalse(atlas_map.is_cluster_name("New"))
+        self.assertFalse(atlas_map.wait_for_revalidation(0.01))
+
+        self._atlas.gate.set()
+        self.assertTrue(atlas_map.wait_for_revalidation(5))
+        self.assertEqual(atlas_map.get_cluster_project_ids("New"), [self._project_id])
+        requests = self._atlas.request_count
+        self.assertEqual(len(self.make_map().clusters), 7)
+        self.assertEqual(self._atlas.request_count, requests)
+
+    def test_too_stale(self):
+        self._atlas.add_cluster(self._project_id, "New")
+        atlas_map = self.make_map(max_stale=300)
+        self.assertEqual(len(atlas_map.clusters), 7)
+        self.assertFalse(atlas_map.wait_for_revalidation())
+
+    def test_failed_revalidation(self):
+        self._atlas.fail(count=100, status=400)
+        atlas_map = self.make_map(max_stale=3600)
+        self.assertEqual(len(atlas_map.clusters), 6)
+        with self.assertLogs("atlascli.atlasmap", level="WARNING"):
+            self.assertFalse(atlas_map.wait_for_revalidation(5))
+        self.assertEqual(len(atlas_map.clusters), 6)
+
+    def test_refreshed_cluster_survives_revalidation(self):
+        self._atlas.gate.clear()
+        self._atlas.listing.clear()
+        atlas_map = self.make_map(max_stale=3600)
+        self.assertEqual(len(atlas_map.clusters), 6)
+        self.assertTrue(self._atlas.listing.wait(5))  # the revalidation has read the running clusters
+
+        cluster = atlas_map.refresh_cluster(self._project_id, "Cluster0")
+        self._api.pause_cluster(cluster)
+        self.assertTrue(atlas_map.refresh_cluster(self._project_id, "Cluster0").is_paused())
+        self.assertTrue(atlas_map.get_one_cluster(self._project_id, "Cluster0").is_paused())
+
+        self._atlas.gate.set()
+        self.assertTrue(atlas_map.wait_for_revalidation(5))
+        self.assertTrue(atlas_map.get_one_cluster(self._project_id, "Cluster0").is_paused())
+
+    def test_name_resolved_after_revalidation(self):
+        self._atlas.add_cluster(self._project_id, "New")
+        commands = Commands(self.make_map(max_stale=3600))
+        cluster_id = commands.preflight_cluster_arg("New")
+        self.assertEqual((cluster_id.project_id, cluster_id.name), (self._project_id, "New"))
+        with self.assertRaises(SystemExit):
+            commands.preflight_cluster_arg("Missing")
+
+    def test_on_stale(self):
+        stale = []
+        self._atlas.add_cluster(self._project_id, "New")
+        self._atlas.reset_requests()
+        atlas_map = self.make_map(max_stale=3600, on_stale=stale.append)
+        self.assertEqual(len(atlas_map.clusters), 6)
+        self.assertEqual(stale, [atlas_map])
+        self.assertTrue(atlas_map.is_stale())
+        self.assertFalse(atlas_map.wait_for_revalidation())
+        self.assertEqual(self._atlas.request_count, 0)  # nothing is revalidated in this process
+
+        cluster_id = Commands(atlas_map).preflight_cluster_arg("New")  # unless a lookup misses
+        self.assertEqual((cluster_id.project_id, cluster_id.name), (self._project_id, "New"))
+        self.assertFalse(atlas_map.is_stale())
+        self.assertFalse(atlas_map.revalidate())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import unittest
+
+from atlascli.atlascluster import AtlasCluster
+from atlascli.atlasmap import AtlasMap
+from atlascli.atlasproject import AtlasProject
+from atlascli.fakeatlas import FakeAtlas
+from atlascli.inventoryindex import InventoryIndex
+
+from test.helpers import make_api
+
+
+def make_index():
+    projects = {pid: AtlasProject({"id": pid, "name": name})
+                for pid, name in (("p1", "dev"), ("p2", "prod"), ("p3", "dev"))}
+    clusters = {"p1": {"A": AtlasCluster("p1", "A", {"name": "A"}), "B": AtlasCluster("p1", "B", {"name": "B"})},
+                "p2": {"A": AtlasCluster("p2", "A", {"name": "A"})},
+                "p3": {}}
+    return InventoryIndex(projects, clusters)
+
+
+class TestInventoryIndex(unittest.TestCase):
+
+    def test_lookups(self):
+        index = make_index()
+        self.assertTrue(index.has_clusters)
+        self.assertEqual(index.project_id("dev"), "p1")
+        self.assertEqual(index.project_ids_by_name["dev"], ["p1", "p3"])
+        self.assertIsNone(index.project_id("test"))
+        self.assertEqual(index.project_name("p2"), "prod")
+        self.assertIsNone(index.project_name("p4"))
+        self.assertEqual(index.cluster_project_ids("A"), ["p1", "p2"])
+        self.assertEqual(index.cluster("p2", "A").project_id, "p2")
+        self.assertIsNone(index.cluster("p2", "B"))
+        self.assertIsNone(index.cluster("p4", "A"))
+        self.assertEqual(index.clusters_named("C"), [])
+        self.assertEqual([(c.project_id, c.name) for c in index.clusters], [("p1", "A"), ("p1", "B"), ("p2", "A")])
+
+    def test_projects_only(self):
+        index = InventoryIndex({"p1": AtlasProject({"id": "p1", "name": "dev"})})
+        self.assertFalse(index.has_clusters)
+        self.assertEqual(index.project_id("dev"), "p1")
+
+    def test_with_cluster(self):
+        index = make_index()
+        updated = index.with_cluster(AtlasCluster("p3", "A", {"name": "A"}))
+        updated = updated.with_cluster(AtlasCluster("p1", "B", {"name": "B", "paused": True}))
+        self.assertEqual(updated.cluster_project_ids("A"), ["p1", "p2", "p3"])
+        self.assertTrue(updated.cluster("p1", "B").is_paused())
+        self.assertEqual(len(updated.clusters), 4)
+        # the original is unchanged
+        self.assertEqual(index.cluster_project_ids("A"), ["p1", "p2"])
+        self.assertIsNone(index.cluster("p3", "A"))
+        self.assertEqual(len(index.clusters), 3)
+        self.assertEqual(updated.with_clusters("p1", {}).cluster_project_ids("B"), [])
+
+
+class TestAtlasMapLookups(unittest.TestCase):
+
+    def setUp(self):
+        self._atlas = FakeAtlas()
+        self._projects = self._atlas.seed(projects=3, clusters=2)
+        self._api = make_api(self._atlas)
+        self._map = AtlasMap(api=self._api)
+
+    def test_project_lookups_do_not_fetch_clusters(self):
+        project = self._projects[1]
+        self.assertTrue(self._map.is_project_id(project["id"]))
+        self.assertFalse(self._map.is_project_id("nope"))
+        self.assertEqual(self._map.get_project_id(project["name"]), project["id"])
+        self.assertEqual(self._map.get_project_name(project["id"]), project["name"])
+        self.assertFalse(self._map.is_populated())
+        self.assertEqual(self._atlas.request_count, 1)
+
+    def test_cluster_lookups(self):
+        ids = [p["id"] for p in self._projects]
+        self.assertEqual(self._map.get_cluster_project_ids("Cluster1"), ids)
+        self.assertTrue(self._map.is_cluster_name("Cluster0"))
+        self.assertFalse(self._map.is_cluster_name("Cluster2"))
+        self.assertEqual(len(self._map.get_cluster("Cluster0")), 3)
+        self.assertEqual(self._map.get_one_cluster(ids[2], "Cluster1").project_id, ids[2])
+        with self.assertRaises(ValueError):
+            self._map.get_one_cluster(ids[2], "Cluster2")
+        self.assertEqual([c.name for c in self._map.get_clusters(ids[0])], ["Cluster0", "Cluster1"])
+        self.assertEqual(len(list(self._map.get_clusters())), 6)
+
+    def test_repopulate_replaces_index(self):
+        self._map.populate_cluster_map()
+        self._atlas.add_cluster(self._projects[0]["id"], "Cluster9")
+        self.assertFalse(self._map.is_cluster_name("Cluster9"))
+        self._map.populate_cluster_map()
+        self.assertEqual(self._map.get_cluster_project_ids("Cluster9"), [self._projects[0]["id"]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+import gzip
+import json
+import os
+import unittest
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+from atlascli.atlasapi import AtlasAPI
+from atlascli.atlaskey import AtlasKey
+from atlascli.errors import AtlasError
+from atlascli.jsonstream import iter_results
+
+from test.helpers import LocalServer
+
+DEMO_DATA = os.path.join(os.path.dirname(__file__), "stripped_demodata.json")
+
+
+def chunked(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+class PagedHandler(BaseHTTPRequestHandler):
+    #
+    # Serves /groups from `items`, gzipped when the client asks for it
+    #
+    items = []
+    accept_encoding = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        PagedHandler.accept_encoding.append(self.headers.get("Accept-Encoding", ""))
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        per_page = int(query["itemsPerPage"][0])
+        page_num = int(query["pageNum"][0])
+        start = (page_num - 1) * per_page
+        doc = {"links": [], "results": PagedHandler.items[start:start + per_page],
+               "totalCount": len(PagedHandler.items)}
+        if start + per_page < len(PagedHandler.items):
+            host = f"http://{self.headers['Host']}"
+            doc["links"] = [{"href": f"{host}{url.path}?itemsPerPage={per_page}&pageNum={page_num + 1}",
+                             "rel": "next"}]
+        body = json.dumps(doc).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body)
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class TestIterResults(unittest.TestCase):
+
+    def setUp(self):
+        with open(DEMO_DATA) as f:
+            self._cluster = json.load(f)
+        self._doc = {"links": [{"href": "http://x/groups?pageNum=2", "rel": "next"}],
+                     "results": [dict(self._cluster, name=f"cluster{i}", size=i * 1.5) for i in range(5)],
+                     "totalCount": 12345}
+
+    def test_every_chunk_size(self):
+        data = json.dumps(self._doc, indent=1).encode()
+        for size in (1, 2, 7, 100, len(data)):
+            envelope = {}
+            results = list(iter_results(chunked(data, size), envelope))
+            self.assertEqual(results, self._doc["results"], size)
+            self.assertEqual(envelope, {"links": self._doc["links"], "totalCount": 12345})
+
+    def test_split_number_and_unicode(self):
+        data = '{"results": [123456, "café ☃", 1.5e10], "totalCount": 42}'.encode()
+        for size in range(1, 8):
+            envelope = {}
+            self.assertEqual(list(iter_results(chunked(data, size), envelope)),
+                             [123456, "café ☃", 1.5e10])
+            self.assertEqual(envelope, {"totalCount": 42})
+
+    def test_deep_indent(self):
+        data = json.dumps({"results": [1, {"a": [2]}]}, indent=100).encode()
+        self.assertEqual(list(iter_results(chunked(data, 50))), [1, {"a": [2]}])
+
+    def test_empty_results(self):
+        self.assertEqual(list(iter_results([b'{"results": [], "links": []}'])), [])
+
+    def test_missing_results(self):
+        with self.assertRaises(KeyError):
+            list(iter_results([b'{"links": []}']))
+        with self.assertRaises(KeyError):
+            list(iter_results([b'{}']))
+
+    def test_malformed(self):
+        for data in (b'[1, 2]', b'{"results": [1, 2}', b'{"results": [1, 2]', b''):
+            with self.assertRaises(json.JSONDecodeError):
+                list(iter_results(chunked(data, 3)))
+
+    def test_lazy(self):
+        def chunks():
+            yield b'{"results": [1, '
+            yield b'2, '
+            raise AssertionError("read too far")
+
+        results = iter_results(chunks())
+        self.assertEqual(next(results), 1)
+
+
+class TestStreamedListing(unittest.TestCase):
+
+    def setUp(self):
+        PagedHandler.items = [{"id": i, "name": f"project{i}"} for i in range(25)]
+        PagedHandler.accept_encoding = []
+        self._server = LocalServer(PagedHandler)
+        self._api = AtlasAPI(page_size=10, stream_pages=True, site_url=self._server.url)
+        self._api.authenticate(AtlasKey("public", "private"))
+
+    def tearDown(self):
+        self._api.close()
+        self._server.close()
+
+    def test_streamed_listing(self):
+        self.assertEqual(list(self._api.get_resource_by_item("/groups")), PagedHandler.items)
+        self.assertEqual(self._api.listing_stats()["/groups"], {"listings": 1, "round_trips": 3, "items": 25,
+                                                                   "max_round_trips": 3, "mean_round_trips": 3.0})
+        self.assertTrue(all("gzip" in e for e in PagedHandler.accept_encoding))
+
+    def test_streamed_matches_buffered(self):
+        streamed = list(self._api.get_resource_by_item("/groups"))
+        buffered = list(self._api.get_resource_by_item("/groups", stream=False))
+        self.assertEqual(streamed, buffered)
+
+    def test_envelope(self):
+        envelope = {}
+        url = f"{self._api.ATLAS_BASE_URL}/groups"
+        items = list(self._api.get_streamed(url, envelope, include_count=True))
+        self.assertEqual(len(items), 10)
+        self.assertEqual(envelope["totalCount"], 25)
+        self.assertEqual(AtlasAPI.next_link(envelope), f"{url}?itemsPerPage=10&pageNum=2")
+
+    def test_no_results(self):
+        PagedHandler.items = []
+        self.assertEqual(list(self._api.get_resource_by_item("/groups")), [])
+
+    def test_not_authenticated(self):
+        api = AtlasAPI()
+        with self.assertRaises(AtlasError):
+            list(api.get_streamed(f"{self._api.ATLAS_BASE_URL}/groups"))
+
+
+if __name__ == '__main__':
+    unittest.main()
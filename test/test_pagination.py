@@ -0,0 +1,102 @@
+import random
+import threading
+import time
+import unittest
+from urllib.parse import urlparse, parse_qs
+
+from atlascli.atlasapi import AtlasAPI
+from atlascli.errors import AtlasInitialisationError
+
+
+class PagedAtlasAPI(AtlasAPI):
+    #
+    # Answers get() from an in memory list of items, pausing a random
+    # interval per page so that concurrent pages complete out of order
+    #
+
+    def __init__(self, item_count, **kwargs):
+        super().__init__(**kwargs)
+        self._items = [{"id": i} for i in range(item_count)]
+        self._lock = threading.Lock()
+        self.requested_pages = []
+
+    def is_authenticated(self):
+        return True
+
+    def get(self, resource, headers=None, page_num=1, items_per_page=100, include_count=False, deadline=None):
+        query = parse_qs(urlparse(resource).query)
+        page_num = int(query.get("pageNum", [page_num])[0])
+        items_per_page = int(query.get("itemsPerPage", [items_per_page])[0])
+        with self._lock:
+            self.requested_pages.append(page_num)
+        time.sleep(random.uniform(0, 0.01))
+        start = (page_num - 1) * items_per_page
+        doc = {"results": self._items[start:start + items_per_page], "links": []}
+        if start + items_per_page < len(self._items):
+            doc["links"].append({"rel": "next",
+                                 "href": f"{self.ATLAS_BASE_URL}/groups?itemsPerPage={items_per_page}"
+                                         f"&pageNum={page_num + 1}"})
+        if include_count:
+            doc["totalCount"] = len(self._items)
+        return doc
+
+
+class TestPagination(unittest.TestCase):
+
+    def test_sequential(self):
+        api = PagedAtlasAPI(250)
+        ids = [x["id"] for x in api.get_resource_by_item("/groups")]
+        self.assertEqual(ids, list(range(250)))
+        self.assertEqual(api.requested_pages, [1, 2, 3])
+
+    def test_parallel(self):
+        api = PagedAtlasAPI(1005)
+        ids = [x["id"] for x in api.get_resource_by_item("/groups", page_workers=4, items_per_page=10)]
+        self.assertEqual(ids, list(range(1005)))
+        self.assertEqual(sorted(api.requested_pages), list(range(1, 102)))
+
+    def test_parallel_default(self):
+        api = PagedAtlasAPI(30, page_workers=3)
+        ids = [x["id"] for x in api.get_resource_by_item("/groups", items_per_page=10)]
+        self.assertEqual(ids, list(range(30)))
+
+    def test_parallel_single_page(self):
+        api = PagedAtlasAPI(5)
+        ids = [x["id"] for x in api.get_resource_by_item("/groups", page_workers=4)]
+        self.assertEqual(ids, list(range(5)))
+        self.assertEqual(api.requested_pages, [1])
+
+    def test_parallel_early_exit(self):
+        api = PagedAtlasAPI(1000)
+        items = api.get_resource_by_item("/groups", page_workers=2, items_per_page=10)
+        first = [next(items)["id"] for _ in range(15)]
+        items.close()
+        self.assertEqual(first, list(range(15)))
+        # only a bounded window of pages is ever requested ahead
+        self.assertLessEqual(len(api.requested_pages), 1 + 2 * 2 + 1)
+
+    def test_page_size(self):
+        api = PagedAtlasAPI(250, page_size=50)
+        ids = [x["id"] for x in api.get_resource_by_item("/groups")]
+        self.assertEqual(ids, list(range(250)))
+        self.assertEqual(api.listing_stats()["/groups"], {"listings": 1, "round_trips": 5, "items": 250,
+                                                           "max_round_trips": 5, "mean_round_trips": 5.0})
+
+    def test_auto_page_size(self):
+        api = PagedAtlasAPI(1200, page_size=AtlasAPI.AUTO_PAGE_SIZE)
+        self.assertEqual(api.page_size_for(), AtlasAPI.MAX_PAGE_SIZE)
+        self.assertEqual(api.page_size_for(bulk=False), AtlasAPI.MIN_PAGE_SIZE)
+        self.assertEqual(len(list(api.get_resource_by_item("/groups"))), 1200)
+        self.assertEqual(api.listing_stats()["/groups"]["round_trips"], 3)
+        api.get_this_organization()
+        self.assertEqual(api.listing_stats()["/orgs"], {"listings": 1, "round_trips": 1, "items": 1,
+                                                         "max_round_trips": 1, "mean_round_trips": 1.0})
+
+    def test_bad_page_size(self):
+        for page_size in (0, 501, "big"):
+            with self.assertRaises(AtlasInitialisationError):
+                AtlasAPI(page_size=page_size)
+
+
+if __name__ == '__main__':
+    unittest.main()
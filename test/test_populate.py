@@ -0,0 +1,193 @@
+import threading
+import time
+import unittest
+
+from atlascli.atlasapi import AtlasAPI
+from atlascli.atlasmap import AtlasMap
+from atlascli.commands import Commands
+from atlascli.errors import AtlasGetError
+from atlascli.fakeatlas import FakeAtlas
+from atlascli.instrumentation import RequestHook
+from atlascli.retrypolicy import RetryPolicy
+from atlascli.transport import build_response
+
+from test.helpers import make_api
+
+
+class ConcurrencyHook(RequestHook):
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def before_request(self, event):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def after_request(self, event):
+        with self._lock:
+            self.in_flight -= 1
+
+
+class FlakyAtlas(FakeAtlas):
+    #
+    # The first listing of the clusters of each project in `flaky` fails
+    #
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.flaky = set()
+
+    def request(self, method, url, **kwargs):
+        with self._lock:
+            for project_id in self.flaky:
+                if f"/groups/{project_id}/clusters" in url:
+                    self.flaky.discard(project_id)
+                    self.requests.append((method, url))
+                    return build_response(url, 500, b'{"detail": "flaky"}', {})
+        return super().request(method, url, **kwargs)
+
+
+def snapshot(atlas_map):
+    return [(project_id, list(clusters)) for project_id, clusters in atlas_map.project_cluster_map.items()]
+
+
+class TestConcurrentPopulate(unittest.TestCase):
+
+    def setUp(self):
+        self._atlas = FlakyAtlas(latency=0.02)
+        self._projects = self._atlas.seed(projects=16, clusters=3)
+        self._hook = ConcurrencyHook()
+        self._api = make_api(self._atlas, hooks=[self._hook],
+                             retry_policy=RetryPolicy(max_retries=0))
+
+    def test_same_as_serial(self):
+        serial = AtlasMap(api=self._api)
+        start = time.monotonic()
+        serial.populate_cluster_map()
+        serial_time = time.monotonic() - start
+        self.assertEqual(self._hook.max_in_flight, 1)
+
+        parallel = AtlasMap(api=self._api, workers=8)
+        start = time.monotonic()
+        parallel.populate_cluster_map()
+        parallel_time = time.monotonic() - start
+        self.assertEqual(self._hook.max_in_flight, 8)
+
+        self.assertEqual(snapshot(parallel), snapshot(serial))
+        self.assertEqual([p["id"] for p in self._projects], list(parallel.project_cluster_map))
+        self.assertEqual(len(parallel.clusters), 48)
+        self.assertLess(parallel_time, serial_time / 2)
+
+    def test_progress(self):
+        calls = []
+        atlas_map = AtlasMap(api=self._api, workers=4,
+                             progress=lambda project, done, total: calls.append((project.id, done, total)))
+        atlas_map.populate_cluster_map()
+        self.assertEqual([done for _, done, _ in calls], list(range(1, 17)))
+        self.assertTrue(all(total == 16 for _, _, total in calls))
+        self.assertEqual(sorted(p for p, _, _ in calls), sorted(p["id"] for p in self._projects))
+
+    def test_partial_failure(self):
+        atlas_map = AtlasMap(api=self._api, workers=4)
+        failed = [p["id"] for p in self._projects[3:5]]
+        self._atlas.flaky.update(failed)
+        with self.assertRaises(AtlasGetError):
+            atlas_map.populate_cluster_map()
+        # every other project was still fetched
+        self.assertFalse(atlas_map.is_populated())
+        self.assertEqual(self._atlas.request_count, 17)
+        self._atlas.reset_requests()
+        atlas_map.populate_cluster_map()
+        self.assertEqual(sorted(path for _, path in self._atlas.requests),
+                         sorted(["/api/atlas/v1.0/groups"] + [f"/api/atlas/v1.0/groups/{p}/clusters" for p in failed]))
+        self.assertEqual(len(atlas_map.clusters), 48)
+
+    def test_org_wide(self):
+        org_id = self._projects[0]["orgId"]
+        empty = [self._atlas.add_project(org_id, f"empty{i}")["id"] for i in range(20)]
+        serial = AtlasMap(api=self._api)
+        serial.populate_cluster_map()
+        self._atlas.reset_requests()
+
+        calls = []
+        atlas_map = AtlasMap(api=self._api, workers=8, org_wide=True,
+                             progress=lambda project, done, total: calls.append(done))
+        atlas_map.populate_cluster_map()
+        self.assertEqual(snapshot(atlas_map), snapshot(serial))
+        self.assertEqual(atlas_map.get_cluster_project_ids("Cluster1"), serial.get_cluster_project_ids("Cluster1"))
+        self.assertEqual(sorted(calls), list(range(1, 37)))
+        paths = [path for _, path in self._atlas.requests]
+        self.assertIn("/api/atlas/v1.0/clusters", paths)
+        # the projects, the summary and only the projects that have clusters
+        self.assertEqual(len(paths), 2 + 16)
+        self.assertFalse(any(project_id in path for path in paths for project_id in empty))
+
+    def test_org_wide_unavailable(self):
+        self._atlas.all_clusters = False
+        atlas_map = AtlasMap(api=self._api, org_wide=True)
+        atlas_map.populate_cluster_map()
+        self.assertEqual(len(atlas_map.clusters), 48)
+        self.assertEqual(self._atlas.request_count, 2 + 16)
+        # the summary is not asked for again
+        self._atlas.reset_requests()
+        atlas_map.populate_cluster_map()
+        self.assertEqual(self._atlas.request_count, 1 + 16)
+
+    def test_bad_workers(self):
+        with self.assertRaises(ValueError):
+            AtlasMap(api=self._api, workers=0)
+
+
+class TestLazyLoad(unittest.TestCase):
+
+    def setUp(self):
+        self._atlas = FakeAtlas()
+        self._projects = [p["id"] for p in self._atlas.seed(projects=5, clusters=2)]
+        self._api = make_api(self._atlas)
+        self._map = AtlasMap(api=self._api)
+
+    def cluster_requests(self, project_id):
+        return self._atlas.requests.count(("GET", f"{AtlasAPI.API_URL}/groups/{project_id}/clusters"))
+
+    def test_one_project(self):
+        project_id = self._projects[2]
+        self.assertEqual([c.name for c in self._map.get_clusters(project_id)], ["Cluster0", "Cluster1"])
+        self.assertEqual(self._map.get_one_cluster(project_id, "Cluster1").project_id, project_id)
+        self.assertEqual(self._map.get_cluster("Missing", project_id), [])
+        self.assertFalse(self._map.is_populated())
+        self.assertEqual(self._atlas.request_count, 2)  # the projects, then the clusters of one of them
+
+    def test_unknown_project(self):
+        self.assertEqual(list(self._map.get_clusters("0" * 24)), [])
+        with self.assertRaises(ValueError):
+            self._map.get_one_cluster("0" * 24, "Cluster0")
+        self.assertEqual(self._atlas.request_count, 1)
+
+    def test_populate_fetches_loaded_projects_again(self):
+        self.assertFalse(self._map.get_one_cluster(self._projects[0], "Cluster0").is_paused())
+        other = make_api(self._atlas)  # another client pauses it
+        other.pause_cluster(other.get_one_cluster(self._projects[0], "Cluster0"))
+
+        self.assertEqual(len(self._map.clusters), 10)
+        self.assertTrue(self._map.is_populated())
+        self.assertTrue(self._map.get_one_cluster(self._projects[0], "Cluster0").is_paused())
+        self.assertEqual([self.cluster_requests(p) for p in self._projects], [2, 1, 1, 1, 1])
+
+    def test_updated_before_populated(self):
+        cluster = self._map.get_one_cluster(self._projects[1], "Cluster0")
+        self._map.update_cluster(self._api.pause_cluster(cluster))
+        self.assertTrue(self._map.get_one_cluster(self._projects[1], "Cluster0").is_paused())
+        self.assertFalse(cluster.is_paused())
+
+    def test_preflight_project_and_name(self):
+        cluster_id = Commands(self._map).preflight_cluster_arg(f"{self._projects[3]}:Cluster1")
+        self.assertEqual((cluster_id.project_id, cluster_id.name), (self._projects[3], "Cluster1"))
+        self.assertFalse(self._map.is_populated())
+        self.assertEqual([self.cluster_requests(p) for p in self._projects], [0, 0, 0, 1, 0])
+
+
+if __name__ == '__main__':
+    unittest.main()
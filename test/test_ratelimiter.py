@@ -0,0 +1,123 @@
+import json
+import unittest
+from http.server import BaseHTTPRequestHandler
+
+from atlascli.atlasapi import AtlasAPI
+from atlascli.atlaskey import AtlasKey
+from atlascli.errors import AtlasGetError
+from atlascli.ratelimiter import RateLimiter, TokenBucket
+
+from test.helpers import FakeClock, LocalServer
+
+
+class ThrottlingHandler(BaseHTTPRequestHandler):
+    #
+    # Answers 429 with Retry-After: 0 for the first `throttle` requests
+    #
+    throttle = 0
+    requests = 0
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        ThrottlingHandler.requests += 1
+        if ThrottlingHandler.requests <= ThrottlingHandler.throttle:
+            body = json.dumps({"detail": "Too many requests"}).encode()
+            self.send_response(429)
+            self.send_header("Retry-After", "0")
+        else:
+            body = json.dumps({"results": [], "links": []}).encode()
+            self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def test_burst_then_rate(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=2, burst=3, clock=clock)
+        self.assertEqual([bucket.try_acquire() for _ in range(3)], [0, 0, 0])
+        self.assertAlmostEqual(bucket.try_acquire(), 0.5)
+        clock.now += 0.5
+        self.assertEqual(bucket.try_acquire(), 0)
+
+    def test_block(self):
+        clock = FakeClock()
+        bucket = TokenBucket(clock=clock)
+        self.assertEqual(bucket.try_acquire(), 0)
+        bucket.block(10)
+        self.assertAlmostEqual(bucket.try_acquire(), 10)
+        clock.now += 10
+        self.assertEqual(bucket.try_acquire(), 0)
+
+
+class TestRateLimiter(unittest.TestCase):
+
+    def test_global_rate(self):
+        clock = FakeClock()
+        limiter = RateLimiter(rate=10, burst=1, clock=clock, sleep=clock.sleep)
+        for _ in range(11):
+            limiter.acquire()
+        self.assertAlmostEqual(clock.now, 1.0)
+        metrics = limiter.metrics()
+        self.assertEqual(metrics["acquired"], 11)
+        self.assertEqual(metrics["delayed"], 10)
+        self.assertAlmostEqual(metrics["total_wait"], 1.0)
+        self.assertEqual(metrics["waiting"], 0)
+
+    def test_project_rates(self):
+        clock = FakeClock()
+        limiter = RateLimiter(project_rate=1, project_burst=1, project_rates={"b": 2},
+                              clock=clock, sleep=clock.sleep)
+        limiter.acquire("a")
+        limiter.acquire("b")
+        self.assertEqual(clock.now, 0)
+        self.assertAlmostEqual(limiter.acquire("b"), 0.5)
+        self.assertAlmostEqual(limiter.acquire("a"), 0.5)
+
+    def test_retry_after(self):
+        clock = FakeClock()
+        limiter = RateLimiter(clock=clock, sleep=clock.sleep)
+        limiter.retry_after(3, "a")
+        self.assertEqual(limiter.acquire("b"), 0)
+        self.assertAlmostEqual(limiter.acquire("a"), 3)
+        self.assertEqual(limiter.metrics()["throttled"], 1)
+
+
+class TestThrottledRequests(unittest.TestCase):
+
+    def setUp(self):
+        ThrottlingHandler.requests = 0
+        self._server = LocalServer(ThrottlingHandler)
+        self._url = f"{self._server.url}/api/atlas/v1.0/groups/5a141a774e65811a132a8010"
+
+    def tearDown(self):
+        self._server.close()
+
+    def test_retry_429(self):
+        ThrottlingHandler.throttle = 2
+        with AtlasAPI() as api:
+            api.authenticate(AtlasKey("public", "private"))
+            self.assertEqual(api.get(self._url), {"results": [], "links": []})
+            self.assertEqual(ThrottlingHandler.requests, 3)
+            self.assertEqual(api.rate_limiter.metrics()["throttled"], 2)
+
+    def test_give_up(self):
+        ThrottlingHandler.throttle = 10
+        with AtlasAPI(max_throttle_retries=1) as api:
+            api.authenticate(AtlasKey("public", "private"))
+            with self.assertRaises(AtlasGetError):
+                api.get(self._url)
+            self.assertEqual(ThrottlingHandler.requests, 2)
+
+    def test_project_id_from_url(self):
+        self.assertEqual(AtlasAPI.project_id_from_url(self._url), "5a141a774e65811a132a8010")
+        self.assertIsNone(AtlasAPI.project_id_from_url("https://cloud.mongodb.com/api/atlas/v1.0/orgs"))
+
+
+if __name__ == '__main__':
+    unittest.main()
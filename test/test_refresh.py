@@ -0,0 +1,120 @@
+import os
+import tempfile
+import unittest
+
+from atlascli.atlasmap import AtlasMap
+from atlascli.atlasorganization import AtlasOrganization
+from atlascli.commands import Commands
+from atlascli.deadline import Deadline
+from atlascli.fakeatlas import FakeAtlas
+from atlascli.inventorycache import InventoryCache
+
+from test.helpers import FakeClock, make_api
+
+
+class TestRefresh(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self._clock = FakeClock(now=1000.0)
+        self._cache = InventoryCache(os.path.join(self._dir.name, "inventory.db"), clock=self._clock)
+        self._atlas = FakeAtlas()
+        projects = self._atlas.seed(projects=4, clusters=3)
+        self._projects = [p["id"] for p in projects]
+        self._org = AtlasOrganization({"id": projects[0]["orgId"], "name": "org0"})
+        self._api = make_api(self._atlas)
+        self._map = self.make_map()
+        self._map.populate_cluster_map()
+        self._atlas.reset_requests()
+
+    def tearDown(self):
+        self._dir.cleanup()
+
+    def make_map(self, **kwargs):
+        return AtlasMap(self._org, self._api, cache=self._cache, **kwargs)
+
+    def test_refresh_cluster(self):
+        before = self._map.project_cluster_map
+        cluster = self._map.get_one_cluster(self._projects[1], "Cluster1")
+        self._api.pause_cluster(cluster)
+        self.assertFalse(cluster.is_paused())
+
+        self.assertTrue(self._map.refresh_cluster(self._projects[1], "Cluster1").is_paused())
+        self.assertEqual(self._atlas.request_count, 2)
+        self.assertTrue(self._map.get_one_cluster(self._projects[1], "Cluster1").is_paused())
+        after = self._map.project_cluster_map
+        for project_id in self._projects:
+            if project_id != self._projects[1]:
+                self.assertIs(after[project_id], before[project_id])
+        self.assertIs(after[self._projects[1]]["Cluster0"], before[self._projects[1]]["Cluster0"])
+
+    def test_refresh_project(self):
+        before = self._map.project_cluster_map
+        self._atlas.add_cluster(self._projects[2], "New")
+        self._api.delete_cluster(self._map.get_one_cluster(self._projects[2], "Cluster0"))
+
+        clusters = self._map.refresh_project(self._projects[2])
+        self.assertEqual(list(clusters), ["Cluster1", "Cluster2", "New"])
+        self.assertEqual(self._map.get_cluster_project_ids("New"), [self._projects[2]])
+        self.assertEqual(self._map.get_cluster_project_ids("Cluster0"),
+                         [p for p in self._projects if p != self._projects[2]])
+        self.assertIs(self._map.project_cluster_map[self._projects[0]], before[self._projects[0]])
+
+        self._clock.now += 10
+        self.assertEqual(list(self.make_map(max_age=60).project_cluster_map[self._projects[2]]),
+                         ["Cluster1", "Cluster2", "New"])
+
+    def test_refresh_changed(self):
+        before = self._map.project_cluster_map
+        self._atlas.set_state(self._projects[0], "Cluster2", "UPDATING")
+        self._atlas.add_cluster(self._projects[3], "New")
+        self._api.delete_cluster(self._map.get_one_cluster(self._projects[1], "Cluster1"))
+
+        changed = self._map.refresh_changed()
+        self.assertEqual(sorted((c.project_id, c.name) for c in changed),
+                         sorted([(self._projects[0], "Cluster2"), (self._projects[3], "New")]))
+        self.assertEqual(self._map.get_one_cluster(self._projects[0], "Cluster2").state, "UPDATING")
+        self.assertEqual(self._map.get_cluster(cluster_name="Cluster1", project_id=self._projects[1]), [])
+        self.assertIs(self._map.project_cluster_map[self._projects[2]], before[self._projects[2]])
+        self.assertIs(self._map.get_one_cluster(self._projects[0], "Cluster0"), before[self._projects[0]]["Cluster0"])
+        self.assertEqual(len(self._map.clusters), 12)
+
+        self.assertEqual(self._map.refresh_changed(), [])
+
+    def test_refresh_changed_saved(self):
+        self._atlas.set_state(self._projects[0], "Cluster2", "UPDATING")
+        self._clock.now += 100
+        self._map.refresh_changed()
+        requests = self._atlas.request_count
+
+        self._clock.now += 10
+        cached = self.make_map(max_age=60)
+        self.assertEqual(cached.get_one_cluster(self._projects[0], "Cluster2").state, "UPDATING")
+        self.assertEqual(len(cached.clusters), 12)
+        self.assertEqual(self._atlas.request_count, requests)
+
+    def test_refresh_changed_new_project(self):
+        project = self._api.create_project(self._org.id, "extra")
+        self._atlas.add_cluster(project.id, "Cluster0")
+        changed = self._map.refresh_changed()
+        self.assertEqual([(c.project_id, c.name) for c in changed], [(project.id, "Cluster0")])
+        self.assertEqual(self._map.get_project_id("extra"), project.id)
+
+        self._clock.now += 10
+        self.assertTrue(self.make_map(max_age=60).is_project_id(project.id))
+
+    def test_pause_updates_map(self):
+        Commands(self._map).pause_cmd([f"{self._projects[3]}:Cluster0"])
+        self.assertTrue(self._map.get_one_cluster(self._projects[3], "Cluster0").is_paused())
+        self.assertEqual([method for method, _ in self._atlas.requests], ["GET", "PATCH"])
+
+    def test_pause_with_deadline_uses_cache(self):
+        # a deadline must not make the command populate the map from Atlas
+        self._clock.now += 10
+        cached = self.make_map(max_age=60)
+        Commands(cached).pause_cmd([f"{self._projects[2]}:Cluster1"], deadline=Deadline(60))
+        self.assertEqual([method for method, _ in self._atlas.requests], ["GET", "PATCH"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,232 @@
+import json
+import unittest
+from http.server import BaseHTTPRequestHandler
+
+from atlascli.atlasapi import AtlasAPI
+from atlascli.atlascluster import AtlasCluster
+from atlascli.atlaskey import AtlasKey
+from atlascli.atlasmap import AtlasMap
+from atlascli.atlasproject import AtlasProject
+from atlascli.deadline import Deadline
+from atlascli.errors import AtlasCircuitOpenError, AtlasDeadlineExceededError, AtlasGetError, AtlasPatchError
+from atlascli.fakeatlas import FakeAtlas
+from atlascli.ratelimiter import RateLimiter
+from atlascli.retrypolicy import RetryPolicy, CircuitBreaker, CircuitState
+
+from test.helpers import FakeClock, LocalServer, make_api
+
+
+class FailingHandler(BaseHTTPRequestHandler):
+    #
+    # Answers 503 for the first `failures` requests
+    #
+    failures = 0
+    requests = 0
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self):
+        FailingHandler.requests += 1
+        if FailingHandler.requests <= FailingHandler.failures:
+            status, body = 503, {"detail": "Service Unavailable"}
+        else:
+            status, body = 200, {"name": "MOT", "paused": True}
+        body = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self.reply()
+
+    def do_PATCH(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.reply()
+
+
+class TestRetryPolicy(unittest.TestCase):
+
+    def test_should_retry(self):
+        policy = RetryPolicy(max_retries=2)
+        self.assertTrue(policy.should_retry("GET", 0, status=503))
+        self.assertTrue(policy.should_retry("GET", 1))
+        self.assertFalse(policy.should_retry("GET", 2, status=503))
+        self.assertFalse(policy.should_retry("GET", 0, status=404))
+        self.assertFalse(policy.should_retry("PATCH", 0, status=503))
+        self.assertTrue(policy.should_retry("PATCH", 0, status=503, idempotent=True))
+        self.assertFalse(policy.should_retry("POST", 0))
+
+    def test_backoff(self):
+        policy = RetryPolicy(backoff=1, max_backoff=5, rand=lambda: 0.5)
+        self.assertEqual([policy.delay(i) for i in range(4)], [0.5, 1, 2, 2.5])
+        policy = RetryPolicy(backoff=1, jitter=False)
+        self.assertEqual(policy.delay(3), 8)
+
+    def test_budget(self):
+        policy = RetryPolicy(max_retries=10, budget_ratio=0.5, budget_min=1)
+        for _ in range(4):
+            policy.record_request()
+        retries = [policy.should_retry("GET", 0) for _ in range(4)]
+        self.assertEqual(retries, [True, True, True, False])
+        self.assertEqual(policy.metrics()["budget_exhausted"], 1)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def test_open_half_open_close(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=clock)
+        breaker.before_request()
+        breaker.record_failure()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitState.OPEN)
+        with self.assertRaises(AtlasCircuitOpenError):
+            breaker.before_request()
+
+        clock.now = 10
+        self.assertEqual(breaker.state, CircuitState.HALF_OPEN)
+        breaker.before_request()  # the trial request
+        with self.assertRaises(AtlasCircuitOpenError):
+            breaker.before_request()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitState.OPEN)
+
+        clock.now = 20
+        breaker.before_request()
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitState.CLOSED)
+
+    def test_release_trial(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=clock)
+        breaker.record_failure()
+        clock.now = 10
+        breaker.before_request()
+        breaker.release_trial()
+        breaker.before_request()  # another trial
+        self.assertEqual(breaker.state, CircuitState.HALF_OPEN)
+
+
+class BrokenAtlas(FakeAtlas):
+    #
+    # Raises `error` from the next request, as a transport bug would
+    #
+    error = None
+
+    def request(self, method, url, **kwargs):
+        error, self.error = self.error, None
+        if error:
+            raise error
+        return super().request(method, url, **kwargs)
+
+
+class TestTrialRequest(unittest.TestCase):
+    #
+    # A trial request that ends without an outcome must not leave the
+    # circuit waiting for it for good
+    #
+
+    def setUp(self):
+        self._clock = FakeClock()
+        self._atlas = BrokenAtlas()
+        self._limiter = RateLimiter(rate=1, burst=1, clock=self._clock, sleep=self._clock.sleep)
+        self._api = make_api(self._atlas, rate_limiter=self._limiter, retry_policy=RetryPolicy(max_retries=0),
+                             circuit_breaker=CircuitBreaker(failure_threshold=1, reset_timeout=10,
+                                                            clock=self._clock))
+        self._atlas.fail(status=503)
+        with self.assertRaises(AtlasGetError):
+            self._api.atlas_get("/groups")
+        self._clock.now += 10
+
+    def test_rate_limited_past_deadline(self):
+        self._limiter.acquire()  # the next request waits a second for the rate limiter
+        with self.assertRaises(AtlasDeadlineExceededError):
+            self._api.atlas_get("/groups", deadline=Deadline(1, clock=self._clock))
+        self._clock.now += 1
+        self.assertEqual(self._api.atlas_get("/groups")["results"], [])
+        self.assertEqual(self._api.circuit_breaker.state, CircuitState.CLOSED)
+
+    def test_transport_error(self):
+        self._atlas.error = ValueError("bug")
+        with self.assertRaises(ValueError):
+            self._api.atlas_get("/groups")
+        self.assertEqual(self._api.atlas_get("/groups")["results"], [])
+        self.assertEqual(self._api.circuit_breaker.state, CircuitState.CLOSED)
+
+
+class TestRetries(unittest.TestCase):
+
+    def setUp(self):
+        FailingHandler.requests = 0
+        self._server = LocalServer(FailingHandler)
+        self._url = f"{self._server.url}/api/atlas/v1.0/groups/5a141a774e65811a132a8010/clusters/MOT"
+        self._api = AtlasAPI(retry_policy=RetryPolicy(max_retries=2, sleep=lambda s: None),
+                             circuit_breaker=CircuitBreaker(failure_threshold=3))
+        self._api.authenticate(AtlasKey("public", "private"))
+
+    def tearDown(self):
+        self._api.close()
+        self._server.close()
+
+    def test_get_retried(self):
+        FailingHandler.failures = 2
+        self.assertEqual(self._api.get(self._url)["name"], "MOT")
+        self.assertEqual(FailingHandler.requests, 3)
+
+    def test_patch_not_retried(self):
+        FailingHandler.failures = 1
+        with self.assertRaises(AtlasPatchError):
+            self._api.patch(self._url, {"biConnector": {"enabled": True}})
+        self.assertEqual(FailingHandler.requests, 1)
+
+    def test_idempotent_patch_retried(self):
+        FailingHandler.failures = 1
+        self.assertTrue(self._api.patch(self._url, {"paused": True}, idempotent=True)["paused"])
+        self.assertEqual(FailingHandler.requests, 2)
+
+    def test_circuit_opens(self):
+        FailingHandler.failures = 100
+        with self.assertRaises(AtlasGetError):
+            self._api.get(self._url)
+        with self.assertRaises(AtlasCircuitOpenError):
+            self._api.get(self._url)
+        self.assertEqual(FailingHandler.requests, 3)
+
+
+class FlakyClusterAPI(AtlasAPI):
+    #
+    # Fails the first time the clusters of project "2" are listed
+    #
+
+    def __init__(self):
+        super().__init__()
+        self.cluster_calls = []
+
+    def get_projects(self, deadline=None):
+        for i in range(3):
+            yield AtlasProject({"id": str(i), "name": f"project-{i}"})
+
+    def get_clusters(self, project_id, deadline=None):
+        self.cluster_calls.append(project_id)
+        if project_id == "2" and self.cluster_calls.count("2") == 1:
+            raise AtlasGetError("Service Unavailable")
+        yield AtlasCluster(project_id, f"cluster-{project_id}", {"name": f"cluster-{project_id}"})
+
+
+class TestPartialResults(unittest.TestCase):
+
+    def test_populate_resumes(self):
+        api = FlakyClusterAPI()
+        atlas_map = AtlasMap(api=api)
+        with self.assertRaises(AtlasGetError):
+            atlas_map.populate_cluster_map()
+        atlas_map.populate_cluster_map()
+        self.assertEqual(api.cluster_calls, ["0", "1", "2", "2"])
+        self.assertEqual(sorted(c.name for c in atlas_map.clusters), ["cluster-0", "cluster-1", "cluster-2"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import io
+import json
+import unittest
+from datetime import datetime, timezone
+from unittest import mock
+
+from atlascli import serializer
+from atlascli.atlasresource import AtlasResource
+
+
+class TestSerializer(unittest.TestCase):
+
+    DOC = {"name": "Cluster0",
+           "created": datetime(2020, 1, 2, 3, 4, 5, tzinfo=timezone.utc),
+           "labels": ["Zürich"],
+           "diskSizeGB": 10.5,
+           "paused": False,
+           "mongoURI": None}
+
+    def check(self):
+        compact = serializer.dumps(self.DOC)
+        self.assertIn('"created":"2020-01-02T03:04:05+00:00"', compact)
+        self.assertIn("Zürich", compact)
+        self.assertEqual(serializer.dumpb(self.DOC), compact.encode("utf-8"))
+        indented = serializer.dumps(self.DOC, indent=2)
+        self.assertTrue(indented.startswith('{\n  "name": "Cluster0",'))
+        doc = serializer.loads(compact.encode("utf-8"))
+        self.assertEqual(doc, serializer.loads(indented))
+        self.assertEqual(doc["created"], "2020-01-02T03:04:05+00:00")
+        self.assertEqual(list(serializer.loads(serializer.dumps({"b": 1, "a": 2}, sort_keys=True))), ["a", "b"])
+        return compact, indented
+
+    def test_backends_agree(self):
+        fast = self.check()
+        with mock.patch.object(serializer, "orjson", None):
+            self.assertEqual(self.check(), fast)
+
+    def test_other_indent(self):
+        self.assertEqual(serializer.dumps([1], indent=4), "[\n    1\n]")
+
+    def test_unknown_types(self):
+        self.assertEqual(serializer.dumps({"id": ValueError("x")}), '{"id":"x"}')
+        self.assertEqual(serializer.dumps(2 ** 70), str(2 ** 70))
+
+    def test_bad_json(self):
+        with self.assertRaises(ValueError):
+            serializer.loads(b"{")
+        with mock.patch.object(serializer, "orjson", None):
+            with self.assertRaises(ValueError):
+                serializer.loads(b"{")
+
+    def test_files(self):
+        output_file = io.StringIO()
+        serializer.dump(self.DOC, output_file)
+        self.assertEqual(serializer.load(io.StringIO(output_file.getvalue()))["name"], "Cluster0")
+
+    def test_resource(self):
+        cluster = AtlasResource({"name": "Cluster0", "created": "2020-01-02T03:04:05Z"})
+        self.assertEqual(json.loads(cluster.json())["created"], "2020-01-02T03:04:05+00:00")
+        self.assertIn("2020-01-02T03:04:05+00:00", AtlasResource.pretty_dict(cluster.resource))
+
+
+if __name__ == '__main__':
+    unittest.main()
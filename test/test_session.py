@@ -0,0 +1,38 @@
+import unittest
+
+from requests.adapters import HTTPAdapter
+
+from atlascli.atlasapi import AtlasAPI
+from atlascli.errors import AtlasInitialisationError
+
+
+class TestSession(unittest.TestCase):
+
+    def test_pool_config(self):
+        api = AtlasAPI(pool_connections=2, pool_maxsize=20)
+        adapter = api._session.get_adapter(AtlasAPI.ATLAS_BASE_URL)
+        self.assertTrue(isinstance(adapter, HTTPAdapter))
+        self.assertEqual(adapter._pool_connections, 2)
+        self.assertEqual(adapter._pool_maxsize, 20)
+        self.assertEqual(api._session.headers["Connection"], "keep-alive")
+        api.close()
+
+    def test_no_keep_alive(self):
+        api = AtlasAPI(keep_alive=False)
+        self.assertEqual(api._session.headers["Connection"], "close")
+        api.close()
+
+    def test_bad_pool_size(self):
+        with self.assertRaises(AtlasInitialisationError):
+            AtlasAPI(pool_maxsize=0)
+
+    def test_context_manager(self):
+        with AtlasAPI() as api:
+            adapter = api._session.get_adapter(AtlasAPI.ATLAS_BASE_URL)
+            adapter.poolmanager.connection_from_url(AtlasAPI.ATLAS_BASE_URL)
+            self.assertEqual(len(adapter.poolmanager.pools), 1)
+        self.assertEqual(len(adapter.poolmanager.pools), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,230 @@
+import asyncio
+import json
+import threading
+import time
+import unittest
+
+import requests
+
+from atlascli.atlasapi import AtlasAPI
+from atlascli.asyncatlasapi import AsyncAtlasAPI
+from atlascli.errors import AtlasGetError
+from atlascli.fakeatlas import FakeAtlas
+from atlascli.singleflight import SingleFlight, AsyncSingleFlight
+
+from test.helpers import make_api
+
+
+class SlowAtlasAPI(AtlasAPI):
+    #
+    # Every GET takes a moment so concurrent callers overlap
+    #
+
+    def __init__(self, status=200, **kwargs):
+        super().__init__(**kwargs)
+        self.sends = 0
+        self.status = status
+        self._lock = threading.Lock()
+
+    def is_authenticated(self):
+        return True
+
+    def _send(self, method, url, idempotent=False, deadline=None, **kwargs):
+        with self._lock:
+            self.sends += 1
+        time.sleep(0.2)
+        r = requests.Response()
+        r.status_code = self.status
+        r._content = json.dumps({"url": url, "results": []}).encode()
+        return r
+
+
+def run_threads(n, target):
+    results = [None] * n
+    errors = [None] * n
+
+    def worker(i):
+        try:
+            results[i] = target()
+        except Exception as e:
+            errors[i] = e
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results, errors
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def test_concurrent_calls_share_one_call(self):
+        sf = SingleFlight()
+        calls = []
+
+        def fn():
+            calls.append(1)
+            time.sleep(0.2)
+            return "value"
+
+        results, errors = run_threads(5, lambda: sf.do("k", fn))
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(errors, [None] * 5)
+        self.assertEqual([r[0] for r in results], ["value"] * 5)
+        self.assertEqual(sorted(r[1] for r in results), [False] + [True] * 4)
+        self.assertEqual(sf.stats(), {"calls": 1, "coalesced": 4, "in_flight": 0})
+
+    def test_exception_shared(self):
+        sf = SingleFlight()
+
+        def fn():
+            time.sleep(0.2)
+            raise ValueError("boom")
+
+        _, errors = run_threads(3, lambda: sf.do("k", fn))
+        self.assertTrue(all(isinstance(e, ValueError) for e in errors))
+        self.assertEqual(sf.in_flight(), 0)
+
+    def test_sequential_calls_not_coalesced(self):
+        sf = SingleFlight()
+        self.assertEqual(sf.do("k", lambda: 1), (1, False))
+        self.assertEqual(sf.do("k", lambda: 2), (2, False))
+
+    def test_follower_timeout(self):
+        sf = SingleFlight()
+        started = threading.Event()
+
+        def slow():
+            started.set()
+            time.sleep(0.5)
+            return 1
+
+        t = threading.Thread(target=sf.do, args=("k", slow))
+        t.start()
+        started.wait()
+        with self.assertRaises(TimeoutError):
+            sf.do("k", lambda: 2, timeout=0.05)
+        t.join()
+
+
+class TestAtlasAPICoalescing(unittest.TestCase):
+
+    def test_identical_gets_coalesced(self):
+        api = SlowAtlasAPI()
+        results, errors = run_threads(5, lambda: api.atlas_get("/groups"))
+        self.assertEqual(errors, [None] * 5)
+        self.assertEqual(api.sends, 1)
+        # every caller gets its own document
+        self.assertEqual(len({id(r) for r in results}), 5)
+        self.assertEqual(api.coalesce_stats()["coalesced"], 4)
+
+    def test_different_gets_not_coalesced(self):
+        api = SlowAtlasAPI()
+        threads = [threading.Thread(target=api.atlas_get, args=(f"/groups/{i}",)) for i in range(3)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(api.sends, 3)
+
+    def test_coalesce_disabled(self):
+        api = SlowAtlasAPI(coalesce=False)
+        run_threads(3, lambda: api.atlas_get("/groups"))
+        self.assertEqual(api.sends, 3)
+
+    def test_error_shared(self):
+        api = SlowAtlasAPI(status=404)
+        _, errors = run_threads(3, lambda: api.atlas_get("/groups"))
+        self.assertEqual(api.sends, 1)
+        self.assertTrue(all(isinstance(e, AtlasGetError) for e in errors))
+
+    def test_concurrent_listings(self):
+        # each caller wraps its projects in models, which parse "created" in place
+        atlas = FakeAtlas(latency=0.02)
+        atlas.seed(projects=300, clusters=0)
+        api = make_api(atlas)
+        results, errors = run_threads(8, lambda: list(api.get_projects()))
+        self.assertEqual(errors, [None] * 8)
+        self.assertEqual([len(r) for r in results], [300] * 8)
+        self.assertGreater(api.coalesce_stats()["coalesced"], 0)
+
+
+class TestAsyncSingleFlight(unittest.TestCase):
+
+    def test_coroutines_share_one_call(self):
+        sf = AsyncSingleFlight()
+        calls = []
+
+        async def fn():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "value"
+
+        async def main():
+            return await asyncio.gather(*[sf.do("k", fn) for _ in range(4)])
+
+        results = asyncio.run(main())
+        self.assertEqual(len(calls), 1)
+        self.assertEqual([r[0] for r in results], ["value"] * 4)
+        self.assertEqual(sf.stats()["coalesced"], 3)
+
+    def test_exception_shared(self):
+        sf = AsyncSingleFlight()
+
+        async def fn():
+            await asyncio.sleep(0.05)
+            raise ValueError("boom")
+
+        async def main():
+            return await asyncio.gather(*[sf.do("k", fn) for _ in range(3)], return_exceptions=True)
+
+        results = asyncio.run(main())
+        self.assertTrue(all(isinstance(r, ValueError) for r in results))
+        self.assertEqual(sf.in_flight(), 0)
+
+    def test_async_api_coalesces(self):
+        api = SlowAtlasAPI()
+
+        async def main():
+            async with AsyncAtlasAPI(api) as aapi:
+                return await asyncio.gather(*[aapi.atlas_get("/groups") for _ in range(4)])
+
+        results = asyncio.run(main())
+        self.assertEqual(api.sends, 1)
+        self.assertEqual(len({id(r) for r in results}), 4)
+
+    def test_share_snapshots_before_the_leader_returns(self):
+        sf = AsyncSingleFlight()
+
+        async def fn():
+            await asyncio.sleep(0.05)
+            return {"created": "2020-01-02"}
+
+        async def leader():
+            result, _ = await sf.do("k", fn, share=dict)
+            result["created"] = 2020  # the leader's caller modifies its result
+            return result
+
+        async def main():
+            return await asyncio.gather(leader(), *[sf.do("k", fn, share=dict) for _ in range(3)])
+
+        first, *followers = asyncio.run(main())
+        self.assertEqual(first, {"created": 2020})
+        self.assertEqual([r for r, shared in followers], [{"created": "2020-01-02"}] * 3)
+
+    def test_async_concurrent_listings(self):
+        atlas = FakeAtlas(latency=0.02)
+        atlas.seed(projects=300, clusters=0)
+
+        async def main():
+            async with AsyncAtlasAPI(make_api(atlas)) as aapi:
+                async def listing():
+                    return len([p async for p in aapi.get_projects()])
+                return await asyncio.gather(*[listing() for _ in range(4)], return_exceptions=True)
+
+        self.assertEqual(asyncio.run(main()), [300] * 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+import random
+import threading
+import unittest
+
+from atlascli.atlasmap import AtlasMap
+from atlascli.fakeatlas import FakeAtlas
+from atlascli.instrumentation import HistogramCollector, RequestHook
+
+from test.helpers import make_api
+
+THREADS = 16
+ROUNDS = 25
+
+
+def run_threads(target, count=THREADS):
+    errors = []
+
+    def run(n):
+        try:
+            target(n)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(n,)) for n in range(count)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return errors
+
+
+class TestThreadSafety(unittest.TestCase):
+
+    def setUp(self):
+        self._atlas = FakeAtlas(latency=0.001)
+        self._projects = [p["id"] for p in self._atlas.seed(projects=4, clusters=5)]
+        self._collector = HistogramCollector()
+        self._api = make_api(self._atlas, page_size=2, hooks=[self._collector])
+
+    def test_api_stress(self):
+        #
+        # Enough latency that identical GETs overlap and are coalesced, and
+        # every thread lists the projects and the first project's clusters
+        # alongside each other.
+        #
+        self._atlas.latency = 0.005
+        shared_project_id = self._projects[0]
+        project_listings = [0] * THREADS
+        cluster_listings = [0] * THREADS
+
+        def worker(n):
+            rng = random.Random(n)
+            for _ in range(ROUNDS):
+                project_id = rng.choice(self._projects)
+                name = f"Cluster{rng.randrange(5)}"
+                action = rng.randrange(7)
+                if action == 0:
+                    self.assertEqual(len(list(self._api.get_clusters(project_id))), 5)
+                    cluster_listings[n] += 1
+                elif action == 1:
+                    self.assertEqual(self._api.get_one_cluster(project_id, name).name, name)
+                elif action == 2:
+                    cluster = self._api.get_one_cached_cluster(project_id, name)
+                    self._api.pause_cluster(cluster)
+                elif action == 3:
+                    cluster = self._api.get_one_cluster(project_id, name)
+                    self._api.resume_cluster(cluster)
+                elif action == 4:
+                    hook = RequestHook()
+                    self._api.add_hook(hook)
+                    self._api.atlas_get(f"/groups/{project_id}")
+                    self._api.remove_hook(hook)
+                elif action == 5:
+                    self.assertEqual(sorted(p.id for p in self._api.get_projects()), sorted(self._projects))
+                    project_listings[n] += 1
+                else:
+                    clusters = list(self._api.get_clusters(shared_project_id))
+                    self.assertEqual(sorted(c.name for c in clusters), [f"Cluster{i}" for i in range(5)])
+                    cluster_listings[n] += 1
+
+        self.assertEqual(run_threads(worker), [])
+        self.assertGreater(self._api.coalesce_stats()["coalesced"], 0)
+        requests = sum(s["count"] for s in self._collector.stats().values())
+        self.assertEqual(requests, self._atlas.request_count)
+        stats = self._api.listing_stats()
+        projects, clusters = stats["/groups"], stats["/groups/{id}/clusters"]
+        self.assertEqual(projects["listings"], sum(project_listings))
+        self.assertEqual(projects["round_trips"], sum(project_listings) * 2)
+        self.assertEqual(projects["items"], sum(project_listings) * 4)
+        self.assertEqual(clusters["listings"], sum(cluster_listings))
+        self.assertEqual(clusters["round_trips"], sum(cluster_listings) * 3)
+        self.assertEqual(clusters["items"], sum(cluster_listings) * 5)
+
+    def test_map_stress(self):
+        atlas_map = AtlasMap(api=self._api)
+        lock = threading.Lock()
+        created = []
+
+        def worker(n):
+            for i in range(ROUNDS):
+                if n == 0 and i % 5 == 0:
+                    atlas_map.populate_cluster_map()
+                elif n == 1 and i % 5 == 0:
+                    name = f"New{i}"
+                    atlas_map.create_cluster(self._projects[0], name)
+                    with lock:
+                        created.append(name)
+                # the inventory only ever grows so every reader sees at least the seeded clusters
+                self.assertGreaterEqual(len(atlas_map.clusters), 20)
+                self.assertEqual(len(atlas_map.get_cluster("Cluster3")), 4)
+                project_ids = atlas_map.get_cluster_project_ids("Cluster0")
+                self.assertEqual(sorted(project_ids), sorted(self._projects))
+
+        self.assertEqual(run_threads(worker), [])
+        atlas_map.populate_cluster_map()
+        self.assertEqual(len(atlas_map.clusters), 20 + len(created))
+        self.assertEqual(len(atlas_map.project_cluster_map[self._projects[0]]), 5 + len(created))
+
+    def test_populate_once(self):
+        atlas_map = AtlasMap(api=self._api)
+        self.assertEqual(run_threads(lambda n: self.assertEqual(len(atlas_map.clusters), 20)), [])
+        # one listing of the projects and one of each project's clusters
+        self.assertEqual(sum(s["listings"] for s in self._api.listing_stats().values()), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
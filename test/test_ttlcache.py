@@ -0,0 +1,145 @@
+import json
+import threading
+import unittest
+
+import requests
+
+from atlascli.atlasapi import AtlasAPI
+from atlascli.atlascluster import AtlasCluster
+from atlascli.ttlcache import TTLCache
+
+from test.helpers import FakeClock
+
+PROJECT_ID = "5a141a774e65811a132a8010"
+
+
+class CountingAtlasAPI(AtlasAPI):
+    #
+    # Counts GETs and answers every PATCH and DELETE with an empty document
+    #
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.gets = 0
+
+    def is_authenticated(self):
+        return True
+
+    def atlas_get(self, resource=None, page_num=1, items_per_page=None, include_count=False, deadline=None):
+        self.gets += 1
+        return {"name": resource.rsplit("/", 1)[-1], "paused": False}
+
+    def _send(self, method, url, idempotent=False, deadline=None, **kwargs):
+        r = requests.Response()
+        r.status_code = 200
+        r._content = json.dumps({"name": url.rsplit("/", 1)[-1], "paused": True}).encode()
+        return r
+
+
+class TestTTLCache(unittest.TestCase):
+
+    def test_expiry(self):
+        clock = FakeClock()
+        cache = TTLCache(ttl=10, clock=clock)
+        cache.put("a", 1)
+        self.assertEqual(cache.get("a"), 1)
+        clock.now = 10
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats()["expirations"], 1)
+
+    def test_lru_eviction(self):
+        cache = TTLCache(maxsize=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["evictions"]), (2, 1, 1))
+
+    def test_invalidate_prefix(self):
+        cache = TTLCache()
+        for k in ("/groups/X", "/groups/X/clusters/A", "/groups/XY", "/orgs/X"):
+            cache.put(k, k)
+        self.assertEqual(cache.invalidate_prefix("/groups/X"), 2)
+        self.assertEqual(cache.get("/groups/XY"), "/groups/XY")
+        self.assertEqual(cache.get("/orgs/X"), "/orgs/X")
+
+    def test_loader_errors_not_cached(self):
+        cache = TTLCache()
+
+        def fail():
+            raise ValueError("boom")
+
+        with self.assertRaises(ValueError):
+            cache.get_or_load("a", fail)
+        self.assertEqual(cache.get_or_load("a", lambda: 1), 1)
+
+    def test_invalidated_while_loading(self):
+        #
+        # A load that started before a mutation invalidated its key must not
+        # cache the document it read before the mutation
+        #
+        cache = TTLCache()
+        loading = threading.Event()
+        proceed = threading.Event()
+        results = []
+
+        def stale():
+            loading.set()
+            proceed.wait(5)
+            return "before"
+
+        loader = threading.Thread(target=lambda: results.append(cache.get_or_load("/groups/X/clusters/A", stale)))
+        loader.start()
+        self.assertTrue(loading.wait(5))
+        cache.invalidate_prefix("/groups/X")
+        proceed.set()
+        loader.join(5)
+        self.assertEqual(results, ["before"])
+        self.assertIsNone(cache.get("/groups/X/clusters/A"))
+        self.assertEqual(cache.get_or_load("/groups/X/clusters/A", lambda: "after"), "after")
+        self.assertEqual(cache.get("/groups/X/clusters/A"), "after")
+
+
+class TestCachedAPI(unittest.TestCase):
+
+    def test_cached_cluster(self):
+        api = CountingAtlasAPI()
+        first = api.get_one_cached_cluster(PROJECT_ID, "MOT")
+        self.assertIs(api.get_one_cached_cluster(PROJECT_ID, "MOT"), first)
+        self.assertEqual(api.gets, 1)
+        self.assertEqual(api.cache_stats()["hits"], 1)
+
+    def test_pause_invalidates(self):
+        api = CountingAtlasAPI()
+        cluster = api.get_one_cached_cluster(PROJECT_ID, "MOT")
+        other = api.get_one_cached_cluster(PROJECT_ID, "MOT2")
+        api.pause_cluster(cluster)
+        api.get_one_cached_cluster(PROJECT_ID, "MOT")
+        self.assertIs(api.get_one_cached_cluster(PROJECT_ID, "MOT2"), other)
+        self.assertEqual(api.gets, 3)
+
+    def test_delete_project_invalidates(self):
+        api = CountingAtlasAPI()
+        api.get_one_cached_project(PROJECT_ID)
+        api.get_one_cached_cluster(PROJECT_ID, "MOT")
+        api.delete_project(PROJECT_ID)
+        self.assertEqual(len(api.cache), 0)
+
+    def test_organization_url(self):
+        api = CountingAtlasAPI()
+        org = api.get_one_cached_organization("599eeced9f78f769464d175c")
+        self.assertEqual(org.name, "599eeced9f78f769464d175c")
+
+    def test_ttl(self):
+        api = CountingAtlasAPI(cache_ttl=0.01)
+        api.get_one_cached_cluster(PROJECT_ID, "MOT")
+        api.cache._clock = lambda: float("inf")
+        api.get_one_cached_cluster(PROJECT_ID, "MOT")
+        self.assertEqual(api.gets, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()